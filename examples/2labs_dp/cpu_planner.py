@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Pianificatore del posizionamento dei container sulle CPU dell'host
+
+Tutti i laboratori sono fissati su cpuset "0,1": con più laboratori sullo stesso
+host compute node e VILLASnode si contendono due core con SCHED_RR. Il
+pianificatore legge la topologia delle CPU da sysfs (core fisici, thread SMT,
+nodi NUMA, CPU isolate con isolcpus) e assegna a ogni container un core fisico
+dedicato, con compute node e VILLASnode dello stesso laboratorio sullo stesso
+nodo NUMA. Il compute node riceve l'intero core nel cpuset ma l'affinità
+(CPU_AFFINITY) solo sul primo thread, così il thread fratello resta inattivo.
+Il piano viene scritto come file compose di override.
+
+Utilizzo: python3 cpu_planner.py [--workbench-dir .] [--dry-run]
+          docker compose -f docker-compose.yaml -f docker-compose.cpus.yaml up
+"""
+
+import os
+import sys
+import glob
+import json
+import argparse
+import logging
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('cpu_planner')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+OVERRIDE_NAME = 'docker-compose.cpus.yaml'
+PLAN_NAME = 'cpu_plan.json'
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Assegna core dedicati ai container dei laboratori')
+    parser.add_argument('--workbench-dir', '-w', default=BASE_DIR,
+                        help='Directory del workbench (default: questo esempio)')
+    parser.add_argument('--labs',
+                        help='Laboratori separati da virgola (default: sottodirectory con docker-compose.yaml e config/)')
+    parser.add_argument('--housekeeping', type=int, default=1,
+                        help='Core fisici lasciati a sistema, Docker e supervisore se non ci sono CPU isolate (default: 1)')
+    parser.add_argument('--sysfs', default='/sys',
+                        help='Radice di sysfs da cui leggere la topologia (default: /sys)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Mostra il piano senza scrivere file')
+    return parser.parse_args()
+
+def parse_cpulist(spec):
+    """
+    Converte una cpulist del kernel ("0-3,8,10-11") in una lista ordinata di CPU.
+
+    Raises:
+        ValueError: Se la cpulist non è valida
+    """
+    cpus = set()
+    for part in spec.strip().split(','):
+        if not part:
+            continue
+        first, _, last = part.partition('-')
+        cpus.update(range(int(first), int(last or first) + 1))
+    return sorted(cpus)
+
+def format_cpulist(cpus):
+    """
+    Converte una lista di CPU nella sintassi cpulist, usata anche dal cpuset di Docker.
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(str(first) if first == last else f"{first}-{last}" for first, last in ranges)
+
+def read_sysfs(sysfs, path, default=None):
+    """
+    Legge un attributo di sysfs, default se non esiste.
+    """
+    try:
+        with open(os.path.join(sysfs, path)) as f:
+            return f.read().strip()
+    except OSError:
+        return default
+
+def read_topology(sysfs):
+    """
+    Legge la topologia delle CPU online.
+
+    Returns:
+        dict: 'cores' (liste dei thread di ogni core fisico, per nodo NUMA) e
+              'isolated' (CPU escluse dallo scheduler con isolcpus)
+
+    Raises:
+        OSError: Se l'elenco delle CPU online non è disponibile
+    """
+    online = read_sysfs(sysfs, 'devices/system/cpu/online')
+    if online is None:
+        raise OSError(f"Topologia delle CPU non disponibile in {sysfs}")
+    numa = {}
+    for path in glob.glob(os.path.join(sysfs, 'devices/system/node/node[0-9]*/cpulist')):
+        node = int(os.path.basename(os.path.dirname(path))[4:])
+        for cpu in parse_cpulist(read_sysfs(sysfs, os.path.relpath(path, sysfs), '')):
+            numa[cpu] = node
+
+    cores = {}
+    for cpu in parse_cpulist(online):
+        topology = f"devices/system/cpu/cpu{cpu}/topology"
+        package = int(read_sysfs(sysfs, f"{topology}/physical_package_id", '0'))
+        core_id = int(read_sysfs(sysfs, f"{topology}/core_id", str(cpu)))
+        cores.setdefault((numa.get(cpu, 0), package, core_id), []).append(cpu)
+
+    by_node = {}
+    for (node, _, _), threads in sorted(cores.items(), key=lambda item: min(item[1])):
+        by_node.setdefault(node, []).append(sorted(threads))
+    return {
+        'cores': by_node,
+        'isolated': set(parse_cpulist(read_sysfs(sysfs, 'devices/system/cpu/isolated', '')))
+    }
+
+def discover_labs(workbench_dir):
+    """
+    Laboratori del workbench: sottodirectory con docker-compose.yaml e config/,
+    come lab_a e lab_b o quelle scritte da topology_generator.py.
+    """
+    return sorted(
+        name for name in os.listdir(workbench_dir)
+        if os.path.isfile(os.path.join(workbench_dir, name, 'docker-compose.yaml'))
+        and os.path.isdir(os.path.join(workbench_dir, name, 'config'))
+    )
+
+def plan_placement(topology, labs, housekeeping=1):
+    """
+    Assegna i core ai container dei laboratori.
+
+    Se l'host ha CPU isolate vengono usati solo i core interamente isolati e il
+    resto va a sistema e supervisore; altrimenti i primi `housekeeping` core
+    restano a sistema e supervisore. Ogni compute node riceve un core dedicato sul
+    nodo NUMA più libero, poi ogni VILLASnode un core dedicato sullo stesso nodo.
+    Quando i core non bastano, la VILLASnode viene spostata su un altro nodo NUMA,
+    poi sul thread fratello del proprio compute node, infine sui core di sistema.
+
+    Args:
+        topology: Topologia letta da read_topology
+        labs: Nomi dei laboratori (servizi dpsim_<lab> e villas_<lab>)
+        housekeeping: Core fisici lasciati a sistema e supervisore
+
+    Returns:
+        dict: Piano {'services': {servizio: {'cpuset', 'affinity', 'node', 'note'}}, 'warnings': [...]}
+
+    Raises:
+        ValueError: Se non ci sono abbastanza core per un compute node dedicato per laboratorio
+    """
+    free = {}
+    system = []
+    isolated = topology['isolated']
+    for node, cores in topology['cores'].items():
+        for threads in cores:
+            if isolated:
+                usable = all(cpu in isolated for cpu in threads)
+            else:
+                usable = len(system) >= housekeeping
+            if usable:
+                free.setdefault(node, []).append(threads)
+            else:
+                system.append(threads)
+    available = sum(len(cores) for cores in free.values())
+    if available < len(labs):
+        raise ValueError(
+            f"{len(labs)} laboratori richiedono almeno {len(labs)} core dedicati ai compute node, "
+            f"disponibili {available} (ridurre --housekeeping o i laboratori sullo stesso host)"
+        )
+    system_cpus = [cpu for threads in system for cpu in threads] or [cpu for cores in free.values() for threads in cores for cpu in threads]
+
+    services = {}
+    warnings = []
+    compute_cores = {}
+    for lab in labs:
+        node = max(free, key=lambda n: (len(free[n]), -n))
+        threads = free[node].pop(0)
+        compute_cores[lab] = (node, threads)
+        services[f"dpsim_{lab}"] = {'cpuset': threads, 'affinity': threads[:1], 'node': node, 'note': 'core dedicato'}
+
+    for lab in labs:
+        node, compute_threads = compute_cores[lab]
+        service = f"villas_{lab}"
+        if free.get(node):
+            services[service] = {'cpuset': free[node].pop(0), 'affinity': None, 'node': node, 'note': 'core dedicato'}
+        elif any(free.values()):
+            other = next(n for n in free if free[n])
+            services[service] = {'cpuset': free[other].pop(0), 'affinity': None, 'node': other, 'note': 'core dedicato'}
+            warnings.append(f"{service} sul nodo NUMA {other}, il compute node è sul nodo {node}")
+        elif len(compute_threads) > 1:
+            # Il compute node cede il thread fratello: i due container condividono il core fisico
+            services[f"dpsim_{lab}"].update(cpuset=compute_threads[:1], note='core condiviso via SMT')
+            services[service] = {'cpuset': compute_threads[1:], 'affinity': None, 'node': node, 'note': 'thread SMT del compute node'}
+            warnings.append(f"{service} sul thread fratello del compute node {format_cpulist(compute_threads)}")
+        else:
+            services[service] = {'cpuset': system_cpus, 'affinity': None, 'node': None, 'note': 'core di sistema'}
+            warnings.append(f"{service} condivide i core di sistema {format_cpulist(system_cpus)}")
+
+    services['supervisor'] = {'cpuset': system_cpus, 'affinity': None, 'node': None, 'note': 'core di sistema'}
+    return {'services': services, 'warnings': warnings}
+
+def render_override(plan):
+    """
+    File compose di override con cpuset e CPU_AFFINITY di ogni servizio.
+    """
+    lines = [
+        "# Generato da cpu_planner.py",
+        f"# docker compose -f docker-compose.yaml -f {OVERRIDE_NAME} up",
+        "services:"
+    ]
+    for service, placement in plan['services'].items():
+        lines += [f"  {service}:", f"    cpuset: \"{format_cpulist(placement['cpuset'])}\""]
+        if placement['affinity']:
+            lines += ["    environment:", f"      - CPU_AFFINITY={format_cpulist(placement['affinity'])}"]
+    return '\n'.join(lines) + '\n'
+
+def log_plan(topology, plan):
+    """
+    Riporta topologia e piano di posizionamento.
+    """
+    cores = sum(len(node_cores) for node_cores in topology['cores'].values())
+    threads = sum(len(core) for node_cores in topology['cores'].values() for core in node_cores)
+    isolated = format_cpulist(topology['isolated']) or 'nessuna'
+    logger.info(f"Host: {len(topology['cores'])} nodi NUMA, {cores} core fisici, {threads} CPU logiche, CPU isolate: {isolated}")
+    for service, placement in plan['services'].items():
+        affinity = format_cpulist(placement['affinity']) if placement['affinity'] else '-'
+        node = '-' if placement['node'] is None else placement['node']
+        logger.info(
+            f"{service:<16} cpuset={format_cpulist(placement['cpuset']):<10} affinity={affinity:<6} "
+            f"numa={node} | {placement['note']}"
+        )
+    for warning in plan['warnings']:
+        logger.warning(warning)
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    labs = [lab.strip() for lab in args.labs.split(',') if lab.strip()] if args.labs else discover_labs(args.workbench_dir)
+    if not labs:
+        logger.error(f"Nessun laboratorio trovato in {args.workbench_dir}")
+        sys.exit(1)
+    try:
+        topology = read_topology(args.sysfs)
+        plan = plan_placement(topology, labs, args.housekeeping)
+    except (OSError, ValueError) as e:
+        logger.error(f"Piano non calcolabile: {str(e)}")
+        sys.exit(1)
+    log_plan(topology, plan)
+    if args.dry_run:
+        return
+
+    override_path = os.path.join(args.workbench_dir, OVERRIDE_NAME)
+    with open(override_path, 'w') as f:
+        f.write(render_override(plan))
+    with open(os.path.join(args.workbench_dir, PLAN_NAME), 'w') as f:
+        json.dump({
+            'labs': labs,
+            'isolated': sorted(topology['isolated']),
+            'services': {service: dict(placement, cpuset=format_cpulist(placement['cpuset']),
+                                       affinity=format_cpulist(placement['affinity'] or []) or None)
+                         for service, placement in plan['services'].items()},
+            'warnings': plan['warnings']
+        }, f, indent=2)
+    logger.info(f"Piano scritto in {override_path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Cache dei risultati della simulazione di riferimento DPSim
+
+Il CSV prodotto da rl_switch_dp.py dipende solo dallo script, dalle variabili
+di ambiente della simulazione e dall'immagine Docker. La chiave della cache è lo
+SHA-256 di questi tre elementi: se nulla è cambiato il CSV viene restituito
+subito, senza avviare il container. Le voci meno usate di recente vengono
+eliminate quando la cache supera DPSIM_CACHE_MAX_MB.
+
+Utilizzo: python3 reference_cache.py [--env-file ../.env] [--output-dir logs] [--force]
+"""
+
+import os
+import sys
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+import argparse
+import logging
+import subprocess
+from datetime import datetime, timezone
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('reference_cache')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REFERENCE_SCRIPT = os.path.join(BASE_DIR, 'rl_switch_dp.py')
+
+# Configurazione
+DPSIM_IMAGE = os.getenv('DPSIM_IMAGE', 'antoniopicone/dpsim-arm64-dev:1.0.3')
+DPSIM_CACHE_DIR = os.getenv('DPSIM_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+DPSIM_CACHE_MAX_MB = float(os.getenv('DPSIM_CACHE_MAX_MB', '500'))
+
+# Variabili di ambiente che determinano il risultato della simulazione di riferimento
+REFERENCE_ENV_VARS = [
+    'TIME_STOP',
+    'TIME_STEP_MILLIS',
+    'FREQUENZA',
+    'V_REF_VS',
+    'BOOTSTRAP_VOLTAGE_REAL',
+    'BOOTSTRAP_VOLTAGE_IMAG'
+]
+
+CSV_NAME = 'reference.csv'
+META_NAME = 'meta.json'
+
+def load_env_file(env_file_path):
+    """
+    Legge un file .env (KEY=valore, commenti con #) come fa docker run --env-file.
+
+    Returns:
+        dict: Variabili definite nel file
+    """
+    env = {}
+    with open(env_file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            env[key.strip()] = value
+    return env
+
+def resolve_image_id(image):
+    """
+    ID del contenuto dell'immagine, così un tag aggiornato invalida la cache.
+
+    Returns:
+        str: ID dell'immagine, None se Docker non è disponibile o l'immagine non è presente
+    """
+    try:
+        result = subprocess.run(['docker', 'image', 'inspect', '--format', '{{.Id}}', image],
+                                capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    if result.returncode != 0:
+        return None
+    return result.stdout.strip() or None
+
+def reference_key(env, image=DPSIM_IMAGE):
+    """
+    Calcola la chiave della cache per una configurazione.
+
+    Args:
+        env: Variabili di ambiente della simulazione
+        image: Immagine Docker che esegue la simulazione
+
+    Returns:
+        tuple: (chiave esadecimale, elementi che la compongono)
+
+    Raises:
+        KeyError: Se manca una variabile di REFERENCE_ENV_VARS
+    """
+    with open(REFERENCE_SCRIPT, 'rb') as f:
+        script_sha256 = hashlib.sha256(f.read()).hexdigest()
+    missing = [var for var in REFERENCE_ENV_VARS if var not in env]
+    if missing:
+        raise KeyError(f"Variabili mancanti per la simulazione di riferimento: {', '.join(missing)}")
+    inputs = {
+        'script_sha256': script_sha256,
+        'env': {var: env[var].strip() for var in REFERENCE_ENV_VARS},
+        'image': image,
+        'image_id': resolve_image_id(image)
+    }
+    key = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+    return key, inputs
+
+def read_meta(entry_dir):
+    """
+    Legge i metadati di una voce della cache, None se la voce è incompleta.
+    """
+    try:
+        with open(os.path.join(entry_dir, META_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_meta(entry_dir, meta):
+    """
+    Scrive i metadati di una voce in modo atomico.
+    """
+    tmp_path = os.path.join(entry_dir, f".{META_NAME}.{os.getpid()}")
+    with open(tmp_path, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_path, os.path.join(entry_dir, META_NAME))
+
+def list_entries():
+    """
+    Voci complete presenti nella cache.
+
+    Returns:
+        list: Coppie (directory, metadati)
+    """
+    if not os.path.isdir(DPSIM_CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(DPSIM_CACHE_DIR):
+        entry_dir = os.path.join(DPSIM_CACHE_DIR, name)
+        meta = read_meta(entry_dir) if os.path.isdir(entry_dir) else None
+        if meta is not None and os.path.isfile(os.path.join(entry_dir, CSV_NAME)):
+            entries.append((entry_dir, meta))
+    return entries
+
+def evict(keep):
+    """
+    Elimina le voci usate meno di recente finché la cache supera DPSIM_CACHE_MAX_MB.
+
+    Args:
+        keep: Chiave della voce appena usata, mai eliminata
+    """
+    limit = DPSIM_CACHE_MAX_MB*1024*1024
+    entries = sorted(list_entries(), key=lambda entry: entry[1].get('last_used', 0))
+    total = sum(meta['size'] for _, meta in entries)
+    for entry_dir, meta in entries:
+        if total <= limit:
+            break
+        if meta['key'] == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        try:
+            os.remove(os.path.join(DPSIM_CACHE_DIR, f".{meta['key']}.lock"))
+        except OSError:
+            pass
+        total -= meta['size']
+        logger.info(f"Voce {meta['key'][:12]} eliminata dalla cache ({meta['size']/1024:.0f} KiB)")
+
+def run_simulation(env, image, output_dir):
+    """
+    Esegue la simulazione di riferimento nel container DPSim.
+
+    Il risultato viene scritto in una directory dedicata, così più esecuzioni
+    con configurazioni diverse possono procedere in parallelo.
+
+    Returns:
+        str: Percorso del CSV prodotto
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    env_path = os.path.join(output_dir, 'reference.env')
+    with open(env_path, 'w') as f:
+        for key, value in env.items():
+            if key not in ('OUTPUT_DIR', 'OUTPUT_FILENAME'):
+                f.write(f"{key}={value}\n")
+        f.write("OUTPUT_DIR=/output\nOUTPUT_FILENAME=simulation_output\n")
+    command = [
+        'docker', 'run', '--rm',
+        '--env-file', env_path,
+        '-v', f"{BASE_DIR}:/app",
+        '-v', f"{output_dir}:/output",
+        image, 'python3', '/app/rl_switch_dp.py'
+    ]
+    logger.info(f"Esecuzione della simulazione di riferimento: {' '.join(command)}")
+    subprocess.run(command, check=True)
+    return os.path.join(output_dir, 'simulation_output.csv')
+
+def ensure_reference(env, force=False, image=DPSIM_IMAGE):
+    """
+    Restituisce il CSV di riferimento per una configurazione, eseguendo la
+    simulazione solo se non è già in cache.
+
+    Esecuzioni concorrenti della stessa configurazione si serializzano su un
+    lock: la seconda trova la voce appena creata dalla prima.
+
+    Args:
+        env: Variabili di ambiente della simulazione
+        force: Esegue comunque la simulazione e sostituisce la voce
+        image: Immagine Docker che esegue la simulazione
+
+    Returns:
+        dict: Percorso del CSV in cache, chiave, esito (hit) e durata della simulazione
+
+    Raises:
+        subprocess.CalledProcessError: Se la simulazione fallisce
+    """
+    key, inputs = reference_key(env, image)
+    entry_dir = os.path.join(DPSIM_CACHE_DIR, key)
+    csv_path = os.path.join(entry_dir, CSV_NAME)
+    os.makedirs(DPSIM_CACHE_DIR, exist_ok=True)
+
+    with open(os.path.join(DPSIM_CACHE_DIR, f".{key}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        meta = read_meta(entry_dir)
+        hit = meta is not None and os.path.isfile(csv_path) and not force
+        if hit:
+            meta['last_used'] = time.time()
+            meta['hits'] = meta.get('hits', 0) + 1
+            write_meta(entry_dir, meta)
+            logger.info(f"Cache hit {key[:12]}: simulazione di {meta['duration_s']:.1f} s evitata")
+        else:
+            tmp_dir = os.path.join(DPSIM_CACHE_DIR, f"tmp-{key[:12]}-{os.getpid()}")
+            inizio = time.monotonic()
+            try:
+                produced = run_simulation(env, image, tmp_dir)
+                duration = time.monotonic() - inizio
+                os.makedirs(entry_dir, exist_ok=True)
+                os.replace(produced, csv_path)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+            meta = {
+                'key': key,
+                'inputs': inputs,
+                'created': datetime.now(timezone.utc).isoformat(),
+                'last_used': time.time(),
+                'hits': 0,
+                'size': os.path.getsize(csv_path),
+                'duration_s': round(duration, 3)
+            }
+            write_meta(entry_dir, meta)
+            logger.info(f"Cache miss {key[:12]}: simulazione eseguita in {duration:.1f} s e salvata in cache")
+    evict(key)
+    return {'path': csv_path, 'key': key, 'hit': hit, 'duration_s': meta['duration_s']}
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Simulazione di riferimento DPSim con cache dei risultati')
+    parser.add_argument('--env-file', '-e', default=os.path.join(BASE_DIR, '..', '.env'),
+                        help='File .env della simulazione (default: ../.env)')
+    parser.add_argument('--output-dir', '-o', default=os.path.join(BASE_DIR, 'logs'),
+                        help='Directory in cui copiare il CSV (default: logs)')
+    parser.add_argument('--force', action='store_true',
+                        help='Esegue la simulazione anche in caso di hit e aggiorna la cache')
+    parser.add_argument('--stats', action='store_true',
+                        help='Mostra il contenuto della cache e termina')
+    parser.add_argument('--clear', action='store_true',
+                        help='Svuota la cache e termina')
+    return parser.parse_args()
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    if args.clear:
+        shutil.rmtree(DPSIM_CACHE_DIR, ignore_errors=True)
+        logger.info(f"Cache {DPSIM_CACHE_DIR} svuotata")
+        return
+    if args.stats:
+        entries = sorted(list_entries(), key=lambda entry: entry[1].get('last_used', 0), reverse=True)
+        for _, meta in entries:
+            logger.info(
+                f"{meta['key'][:12]} | {meta['size']/1024:.0f} KiB | hit={meta.get('hits', 0)} | "
+                f"durata={meta['duration_s']:.1f} s | {json.dumps(meta['inputs']['env'])}"
+            )
+        total = sum(meta['size'] for _, meta in entries)
+        logger.info(f"{len(entries)} voci, {total/1024/1024:.1f} MiB su {DPSIM_CACHE_MAX_MB:.0f} MiB")
+        return
+
+    try:
+        env = load_env_file(args.env_file)
+        result = ensure_reference(env, force=args.force)
+    except (OSError, KeyError) as e:
+        logger.error(f"Simulazione di riferimento non disponibile: {str(e)}")
+        sys.exit(1)
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Simulazione di riferimento fallita (exit code {e.returncode})")
+        sys.exit(e.returncode or 1)
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    output = os.path.join(args.output_dir, f"{env.get('OUTPUT_FILENAME', 'simulation_output')}.csv")
+    shutil.copyfile(result['path'], output)
+    print(f"\nFile di log: {output}")
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,18 @@
 import socket
 import json
 import math
+import cmath
 import os
+import struct
+import copy
 import dpsimpy
 import time as time_module
 import sys
 import logging
 from io import StringIO
+from array import array
+from collections import deque
+from datetime import datetime
 
 # Configurazione logging
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
@@ -71,10 +77,250 @@ FREQUENZA = float(os.getenv('FREQUENZA', '50'))
 TIME_STOP = float(os.getenv('TIME_STOP', '1'))
 ITERATIONS = int(float(os.getenv('TIME_STOP', '1'))*1000/(TIME_STEP_MILLIS))
 
+# Modalità di esecuzione:
+#   realtime            -> scambio campione per campione tramite VILLASnode
+#   waveform_relaxation -> offline, scambio di intere finestre tra i compute node fino a convergenza
+RUN_MODE = os.getenv('RUN_MODE', 'realtime').lower()
+WR_HOST = os.getenv('WR_HOST', 'dpsim_lab_a')   # Il LAB A accetta la connessione, il LAB B si connette
+WR_PORT = int(os.getenv('WR_PORT', '12010'))
+WR_WINDOW_STEPS = max(1, int(os.getenv('WR_WINDOW_STEPS', '100')))
+WR_MAX_ITERATIONS = max(1, int(os.getenv('WR_MAX_ITERATIONS', '50')))
+WR_TOLERANCE = float(os.getenv('WR_TOLERANCE', '1e-6'))
 
-def start_simulation():
+# Algoritmo di interfaccia tra i lab
+#   itm      -> ideal transformer: vload impone la tensione ricevuta dal LAB B, si invia la corrente
+#   pcd      -> partial circuit duplication: resistenza di collegamento INTERFACE_R_LINK duplicata
+#               in entrambi i lab, con compensazione del termine aggiunto (smorzamento)
+#   thevenin -> scambio degli equivalenti: il LAB B è modellato come sorgente Thevenin in serie
+#               a INTERFACE_R_B, il LAB A invia la propria sorgente Thevenin con resistenza INTERFACE_R_A
+INTERFACE_ALGORITHMS = ('itm', 'pcd', 'thevenin')
+INTERFACE_ALGORITHM = os.getenv('INTERFACE_ALGORITHM', 'itm').lower()
+INTERFACE_R_LINK = float(os.getenv('INTERFACE_R_LINK', '5'))
+INTERFACE_R_A = float(os.getenv('INTERFACE_R_A', '6.4'))
+INTERFACE_R_B = float(os.getenv('INTERFACE_R_B', '5'))
 
-    name = 'VILLAS_test'
+# Timestamp di ricezione del kernel (SO_TIMESTAMPNS), registrati accanto a quelli applicativi
+KERNEL_TIMESTAMPS = os.getenv('KERNEL_TIMESTAMPS', 'false').lower() == 'true'
+SO_TIMESTAMPNS = getattr(socket, 'SO_TIMESTAMPNS', 35)  # Valore Linux se non esposto dal modulo socket
+TIMESPEC = struct.Struct('@qq')  # struct timespec: tv_sec, tv_nsec
+
+# Affinità del ciclo di simulazione (cpulist, es. "4"), scritta da cpu_planner.py: il cpuset
+# del container comprende l'intero core fisico, l'affinità ne usa solo il primo thread
+CPU_AFFINITY = os.getenv('CPU_AFFINITY', '')
+
+# Profiler per fase dello step: le durate (ns) sono accumulate in un array compatto,
+# PROFILE_PHASES valori per step, e riassunte solo a fine simulazione
+STEP_PROFILER = os.getenv('STEP_PROFILER', 'false').lower() == 'true'
+PROFILE_PHASES = ('recv', 'parse', 'log', 'set_parameters', 'sim_next', 'read_attr', 'encode', 'sendto')
+PROFILE_INDEX = {phase: index for index, phase in enumerate(PROFILE_PHASES)}
+profile_samples = array('q')
+profile_step = [0]*len(PROFILE_PHASES)
+profile_clock = [0]  # Istante dell'ultima marcatura
+
+# Heartbeat UDP verso il supervisore (disabilitato se HEARTBEAT_HOST non è impostato)
+HEARTBEAT_HOST = os.getenv('HEARTBEAT_HOST', '')
+HEARTBEAT_PORT = int(os.getenv('HEARTBEAT_PORT', '12100'))
+HEARTBEAT_INTERVAL_MILLIS = float(os.getenv('HEARTBEAT_INTERVAL_MILLIS', '10'))
+# Attesa massima perché il nome del supervisore sia risolvibile (il container può partire dopo la lab)
+HEARTBEAT_RESOLVE_TIMEOUT = float(os.getenv('HEARTBEAT_RESOLVE_TIMEOUT', '30'))
+# Barriera di partenza: la lab si dichiara pronta al supervisore e attende l'istante di partenza comune
+START_BARRIER = os.getenv('START_BARRIER', 'false').lower() == 'true'
+START_BARRIER_TIMEOUT = float(os.getenv('START_BARRIER_TIMEOUT', '60'))
+LAB_NAME = os.getenv('LAB_NAME', 'lab_a')
+heartbeat = {
+    'socket': None,
+    'address': None,
+    'seq': 0,
+    'last': 0.0
+}
+# Contatori degli scenari già conclusi (modalità pool): il heartbeat li somma a
+# quelli dello scenario in corso, così per il supervisore restano cumulativi
+heartbeat_totals = {'steps': 0, 'overruns': 0, 'timeouts': 0, 'received': 0, 'lost': 0, 'late': 0}
+
+# Metriche inviate con l'heartbeat: durata dello step e round trip dell'interfaccia
+# (invio del risultato -> ricezione del valore successivo) come istogrammi sparsi a
+# bucket logaritmici, unibili dal supervisore su tutta la simulazione
+METRIC_BUCKETS_PER_OCTAVE = 4
+metrics_window = {
+    'step_ms': {},
+    'rtt_ms': {},
+    'step_max_ms': 0.0,
+    'rtt_max_ms': 0.0
+}
+link_stats = {
+    'received': 0,
+    'lost': 0,
+    'late': 0,
+    'last_remote_seq': None,
+    'sent_at': None
+}
+
+# Watchdog sul superamento della deadline TAU
+# Politiche disponibili:
+#   catchup      -> salta il pacing finché il ritardo non è recuperato
+#   drop_stale   -> come catchup, scarta inoltre i campioni arretrati nel buffer del socket
+#   decimate_log -> come catchup, riduce i log per campione durante gli overrun
+#   abort        -> come catchup, interrompe la simulazione dopo OVERRUN_ABORT_LIMIT overrun consecutivi
+OVERRUN_POLICIES = ('catchup', 'drop_stale', 'decimate_log', 'abort')
+OVERRUN_POLICY = os.getenv('OVERRUN_POLICY', 'catchup').lower()
+OVERRUN_ABORT_LIMIT = int(os.getenv('OVERRUN_ABORT_LIMIT', '50'))
+OVERRUN_LOG_DECIMATION = max(1, int(os.getenv('OVERRUN_LOG_DECIMATION', '10')))
+
+if OVERRUN_POLICY not in OVERRUN_POLICIES:
+    logger.warning(f"OVERRUN_POLICY '{OVERRUN_POLICY}' non valida, uso 'catchup'")
+    OVERRUN_POLICY = 'catchup'
+
+# Contatori del watchdog: overrun rilevati e decisioni prese per ciascuna politica
+watchdog_stats = {
+    'steps': 0,
+    'overruns': 0,
+    'consecutive': 0,
+    'max_overrun_ms': 0.0,
+    'catchup': 0,
+    'drop_stale': 0,
+    'decimate_log': 0,
+    'abort': 0
+}
+
+# Predizione del valore di interfaccia in caso di timeout
+# Predittori disponibili:
+#   none   -> nessuna predizione (comportamento originale)
+#   hold   -> mantiene l'ultimo valore ricevuto
+#   linear -> estrapolazione lineare sugli ultimi due valori
+#   phasor -> estrapolazione separata di modulo e fase del fasore
+TIMEOUT_PREDICTORS = ('none', 'hold', 'linear', 'phasor')
+TIMEOUT_PREDICTOR = os.getenv('TIMEOUT_PREDICTOR', 'none').lower()
+# Timeout adattivo: media inter-arrivo + K * jitter, limitato tra MIN e MAX
+TIMEOUT_JITTER_K = float(os.getenv('TIMEOUT_JITTER_K', '4'))
+TIMEOUT_MIN_MILLIS = float(os.getenv('TIMEOUT_MIN_MILLIS', str(TAU_MILLIS)))
+TIMEOUT_MAX_MILLIS = float(os.getenv('TIMEOUT_MAX_MILLIS', '100'))
+
+if INTERFACE_ALGORITHM not in INTERFACE_ALGORITHMS:
+    logger.warning(f"INTERFACE_ALGORITHM '{INTERFACE_ALGORITHM}' non valido, uso 'itm'")
+    INTERFACE_ALGORITHM = 'itm'
+
+if TIMEOUT_PREDICTOR not in TIMEOUT_PREDICTORS:
+    logger.warning(f"TIMEOUT_PREDICTOR '{TIMEOUT_PREDICTOR}' non valido, uso 'none'")
+    TIMEOUT_PREDICTOR = 'none'
+
+# Stato del predittore: ultimi valori di interfaccia e statistiche di arrivo
+interface_history = deque(maxlen=2)
+interface_stats = {
+    'last_arrival': None,
+    'mean_ms': None,
+    'jitter_ms': 0.0,
+    'timeouts': 0,
+    'predicted': 0
+}
+
+# Stepping speculativo: lo step successivo viene calcolato su un'istanza ombra con
+# l'ingresso predetto mentre il campione reale è in transito, poi confermato o scartato.
+# È un'approssimazione a simulazione ombra: DPSim non permette di salvare e ripristinare
+# lo stato completo di una simulazione, quindi all'ombra viene copiato solo lo stato di
+# interfaccia e l'istanza primaria risolve comunque ogni step (dopo l'invio in caso di
+# commit). Si riduce la latenza del valore trasmesso, non il calcolo: il costo
+# aggiuntivo dell'ombra viene misurato e riportato a fine simulazione.
+SPECULATIVE_MODE = os.getenv('SPECULATIVE_MODE', 'false').lower() == 'true'
+SPECULATION_PREDICTOR = os.getenv('SPECULATION_PREDICTOR', 'linear').lower()
+SPECULATION_REL_TOL = float(os.getenv('SPECULATION_REL_TOL', '0.001'))
+SPECULATION_ABS_TOL = float(os.getenv('SPECULATION_ABS_TOL', '1e-6'))
+
+if SPECULATION_PREDICTOR not in TIMEOUT_PREDICTORS or SPECULATION_PREDICTOR == 'none':
+    logger.warning(f"SPECULATION_PREDICTOR '{SPECULATION_PREDICTOR}' non valido, uso 'linear'")
+    SPECULATION_PREDICTOR = 'linear'
+
+# Attributi che costituiscono lo stato dinamico dei componenti (snapshot per il rollback)
+STATE_ATTRIBUTES = ('i_intf', 'v_intf')
+
+speculation_stats = {
+    'commit': 0,
+    'rollback': 0,
+    'restore_mismatch': 0,  # step non speculati perché la copia dello stato non è riuscita
+    'shadow_ns': 0,         # tempo speso negli step dell'istanza ombra
+    'shadow_steps': 0,
+    'commit_solve_ns': 0    # tempo speso a risolvere l'istanza primaria dopo i commit
+}
+
+# Pool di container: la lab resta in esecuzione tra una simulazione e l'altra e riceve
+# gli scenari dal canale di controllo TCP (un oggetto JSON per riga). Per ogni scenario
+# applica i parametri, azzera lo stato, ricostruisce la simulazione e riporta l'esito
+POOL_MODE = os.getenv('POOL_MODE', 'false').lower() == 'true'
+POOL_CONTROL_PORT = int(os.getenv('POOL_CONTROL_PORT', '12020'))
+
+# Parametri modificabili da uno scenario: conversione o valori ammessi
+SCENARIO_PARAMETERS = {
+    'TIME_STOP': float,
+    'TIME_STEP_MILLIS': float,
+    'TAU_MILLIS': float,
+    'FREQUENZA': float,
+    'V_REF_VS': float,
+    'INTERFACE_ALGORITHM': INTERFACE_ALGORITHMS,
+    'INTERFACE_R_LINK': float,
+    'INTERFACE_R_A': float,
+    'INTERFACE_R_B': float,
+    'TIMEOUT_PREDICTOR': TIMEOUT_PREDICTORS,
+    'TIMEOUT_JITTER_K': float,
+    'TIMEOUT_MIN_MILLIS': float,
+    'TIMEOUT_MAX_MILLIS': float,
+    'OVERRUN_POLICY': OVERRUN_POLICIES,
+    'OVERRUN_ABORT_LIMIT': int,
+    'OVERRUN_LOG_DECIMATION': int
+}
+# Ogni scenario parte dalla configurazione di avvio del container, non dal precedente
+scenario_baseline = {name: globals()[name] for name in SCENARIO_PARAMETERS}
+# Stato iniziale dei contatori, ripristinato prima di ogni scenario
+initial_state = {
+    name: copy.deepcopy(globals()[name])
+    for name in ('watchdog_stats', 'interface_stats', 'speculation_stats', 'link_stats', 'metrics_window')
+}
+
+
+def itm_input(received, l1):
+    """
+    Ideal transformer: la tensione ricevuta viene applicata direttamente a vload.
+    """
+    return received
+
+def itm_output(i_value, v_applied):
+    """
+    Ideal transformer e PCD: si invia la corrente dell'induttore.
+    """
+    return i_value
+
+def pcd_input(received, l1):
+    """
+    PCD: vload è in serie alla resistenza di collegamento, si compensa la caduta
+    dovuta alla corrente dello step precedente.
+    """
+    return received - INTERFACE_R_LINK*l1.attr("i_intf").get()[0, 0]
+
+def thevenin_output(i_value, v_applied):
+    """
+    Thevenin: si invia la sorgente equivalente del LAB A vista dall'interfaccia,
+    e_A = v_n3 + R_A*i, con v_n3 = e_B + R_B*i.
+    """
+    return v_applied + (INTERFACE_R_B + INTERFACE_R_A)*i_value
+
+# Plug-in degli algoritmi di interfaccia:
+#   r_link -> resistenza in serie a vload (None: vload connesso direttamente a n3)
+#   input  -> converte il valore ricevuto dal LAB B nella tensione di vload
+#   output -> converte la corrente dell'induttore nel valore da inviare al LAB B
+INTERFACE_PLUGINS = {
+    'itm': {'r_link': None, 'input': itm_input, 'output': itm_output},
+    'pcd': {'r_link': INTERFACE_R_LINK, 'input': pcd_input, 'output': itm_output},
+    'thevenin': {'r_link': INTERFACE_R_B, 'input': itm_input, 'output': thevenin_output}
+}
+
+def start_simulation(name='VILLAS_test', time_stop=None, log_setup=True):
+    """
+    Costruisce e avvia la simulazione del LAB A.
+
+    Args:
+        name: Nome della simulazione DPSim
+        time_stop: Tempo finale dell'istanza (default TIME_STOP)
+        log_setup: Riporta il passo di simulazione (disattivato per le istanze
+                   delle finestre della waveform relaxation)
+    """
 
     # Nodes
     gnd = dpsimpy.dp.SimNode.gnd
@@ -101,38 +347,677 @@ def start_simulation():
     vs.connect([gnd, n1])
     r1.connect([n2, n1])
     l1.connect([n3, n2])
-    vload.connect([gnd, n3])
+    nodes = [gnd, n1, n2, n3]
+    components = [vs, r1, l1, vload]
+
+    # Con PCD e Thevenin il LAB B è modellato da vload in serie alla resistenza di collegamento
+    r_link_value = INTERFACE_PLUGINS[INTERFACE_ALGORITHM]['r_link']
+    if r_link_value is None:
+        vload.connect([gnd, n3])
+    else:
+        n4 = dpsimpy.dp.SimNode('n4')
+        n4.set_initial_voltage(complex(0,0))
+        r_link = dpsimpy.dp.ph1.Resistor('r_link')
+        r_link.set_parameters(R=r_link_value)
+        r_link.connect([n4, n3])
+        vload.connect([gnd, n4])
+        nodes.append(n4)
+        components.append(r_link)
     
-    system = dpsimpy.SystemTopology(FREQUENZA, [gnd, n1, n2, n3], [vs, r1, l1, vload])
+    system = dpsimpy.SystemTopology(FREQUENZA, nodes, components)
     
     sim = dpsimpy.Simulation(name)
     sim.set_domain(dpsimpy.Domain.DP)
     sim.set_system(system)
     
     _time_step = TIME_STEP_MILLIS/1000
-    logger.info(f'LAB A TIMESTEP = {TIME_STEP_MILLIS} ms')
+    if log_setup:
+        logger.info(f'LAB A TIMESTEP = {TIME_STEP_MILLIS} ms')
     sim.set_time_step(_time_step)
     
-    _time_stop = TIME_STOP
+    _time_stop = TIME_STOP if time_stop is None else time_stop
     sim.set_final_time(_time_stop)
     sim.start()
     
     return sim, l1, vload
 
-def next_simulation(sim,l1,vload,voltage_phasor,sequence,time_step):
+class WatchdogAbort(Exception):
+    """
+    Interruzione della simulazione decisa dal watchdog (OVERRUN_POLICY=abort).
 
-    inizio = time_module.perf_counter()
+    Attributes:
+        sequence: Campione dello step che ha raggiunto il limite di overrun
+    """
+
+    def __init__(self, sequence, message):
+        super().__init__(message)
+        self.sequence = sequence
+
+def watchdog_check(tempo_esecuzione, sequence=None):
+    """
+    Verifica se lo step ha superato la deadline TAU e applica la politica configurata.
+
+    Args:
+        tempo_esecuzione: Durata dello step in secondi
+        sequence: Campione dello step, riportato in caso di interruzione
+
+    Returns:
+        bool: True se lo step è rientrato nella deadline, False in caso di overrun
+
+    Raises:
+        WatchdogAbort: Se con OVERRUN_POLICY=abort gli overrun consecutivi raggiungono OVERRUN_ABORT_LIMIT
+    """
+    watchdog_stats['steps'] += 1
+    overrun_ms = tempo_esecuzione*1000 - TAU_MILLIS
+
+    if overrun_ms <= 0:
+        watchdog_stats['consecutive'] = 0
+        return True
+
+    watchdog_stats['overruns'] += 1
+    watchdog_stats['consecutive'] += 1
+    watchdog_stats['max_overrun_ms'] = max(watchdog_stats['max_overrun_ms'], overrun_ms)
+
+    # In overrun il pacing viene sempre saltato per recuperare il ritardo
+    watchdog_stats['catchup'] += 1
+    logger.debug(f"Overrun LAB A: {overrun_ms:.3f} ms oltre TAU ({watchdog_stats['consecutive']} consecutivi)")
+
+    if OVERRUN_POLICY == 'abort' and watchdog_stats['consecutive'] >= OVERRUN_ABORT_LIMIT:
+        watchdog_stats['abort'] += 1
+        message = f"Watchdog: {watchdog_stats['consecutive']} overrun consecutivi, simulazione interrotta"
+        logger.error(message)
+        raise WatchdogAbort(sequence, message)
+
+    return False
+
+def enable_kernel_timestamps(sock):
+    """
+    Abilita i timestamp di ricezione del kernel sul socket se richiesto da KERNEL_TIMESTAMPS.
+
+    Args:
+        sock: Socket UDP di ricezione
+    """
+    global KERNEL_TIMESTAMPS
+    if not KERNEL_TIMESTAMPS:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, SO_TIMESTAMPNS, 1)
+        logger.info("Timestamp di ricezione del kernel (SO_TIMESTAMPNS) abilitati")
+    except OSError as e:
+        logger.warning(f"SO_TIMESTAMPNS non supportato, timestamp del kernel disabilitati: {str(e)}")
+        KERNEL_TIMESTAMPS = False
+
+def receive_datagram(sock):
+    """
+    Riceve un datagramma insieme al timestamp di ricezione del kernel, se abilitato.
+
+    Args:
+        sock: Socket UDP di ricezione
+
+    Returns:
+        tuple: (dati, timestamp del kernel in ns dal 1970 o None)
+    """
+    if not KERNEL_TIMESTAMPS:
+        data, _ = sock.recvfrom(1024)
+        return data, None
+
+    data, ancdata, _, _ = sock.recvmsg(1024, socket.CMSG_SPACE(TIMESPEC.size))
+    kernel_ns = None
+    for level, ctype, cdata in ancdata:
+        if level == socket.SOL_SOCKET and ctype == SO_TIMESTAMPNS and len(cdata) >= TIMESPEC.size:
+            sec, nsec = TIMESPEC.unpack(cdata[:TIMESPEC.size])
+            kernel_ns = sec*1_000_000_000 + nsec
+    return data, kernel_ns
+
+def drop_stale_inputs(sock, data, kernel_ns):
+    """
+    Scarta i campioni arretrati nel buffer del socket mantenendo solo il più recente.
+    Attivo solo con politica drop_stale e se lo step precedente è andato in overrun.
+
+    Args:
+        sock: Socket UDP di ricezione
+        data: Ultimo datagramma ricevuto
+        kernel_ns: Timestamp del kernel dell'ultimo datagramma
+
+    Returns:
+        tuple: Il datagramma più recente disponibile e il suo timestamp del kernel
+    """
+    if OVERRUN_POLICY != 'drop_stale' or watchdog_stats['consecutive'] == 0:
+        return data, kernel_ns
+
+    timeout = sock.gettimeout()
+    sock.setblocking(False)
+    try:
+        while True:
+            try:
+                data, kernel_ns = receive_datagram(sock)
+            except (BlockingIOError, InterruptedError):
+                break
+            watchdog_stats['drop_stale'] += 1
+    finally:
+        sock.settimeout(timeout)
+
+    return data, kernel_ns
+
+def should_log_sample(sequence):
+    """
+    Indica se il log per campione deve essere emesso.
+    Con politica decimate_log, durante gli overrun viene emesso un log ogni OVERRUN_LOG_DECIMATION campioni.
+
+    Args:
+        sequence: Numero di sequenza del campione
+
+    Returns:
+        bool: True se il log deve essere emesso
+    """
+    if OVERRUN_POLICY != 'decimate_log' or watchdog_stats['consecutive'] == 0:
+        return True
+    if sequence % OVERRUN_LOG_DECIMATION == 0:
+        return True
+    watchdog_stats['decimate_log'] += 1
+    return False
+
+def log_watchdog_summary():
+    """
+    Riporta i contatori del watchdog a fine simulazione.
+    """
+    logger.info(
+        f"Watchdog LAB A | policy={OVERRUN_POLICY} | steps={watchdog_stats['steps']} | "
+        f"overruns={watchdog_stats['overruns']} | max_overrun_ms={watchdog_stats['max_overrun_ms']:.3f} | "
+        f"catchup={watchdog_stats['catchup']} | drop_stale={watchdog_stats['drop_stale']} | "
+        f"decimate_log={watchdog_stats['decimate_log']} | abort={watchdog_stats['abort']}"
+    )
+
+def record_interface_value(value):
+    """
+    Memorizza un valore di interfaccia (ricevuto o predetto) per l'estrapolazione.
+
+    Args:
+        value: Fasore complesso applicato allo step
+    """
+    interface_history.append(value)
+
+def update_arrival_jitter():
+    """
+    Aggiorna la stima EWMA dell'inter-arrivo e del suo jitter (come per l'RTO di RFC 6298).
+    """
+    now = time_module.perf_counter()
+    last = interface_stats['last_arrival']
+    interface_stats['last_arrival'] = now
+    if last is None:
+        return
+
+    interarrival_ms = (now - last)*1000
+    if interface_stats['mean_ms'] is None:
+        interface_stats['mean_ms'] = interarrival_ms
+        interface_stats['jitter_ms'] = interarrival_ms/2
+    else:
+        deviation = abs(interface_stats['mean_ms'] - interarrival_ms)
+        interface_stats['jitter_ms'] = 0.75*interface_stats['jitter_ms'] + 0.25*deviation
+        interface_stats['mean_ms'] = 0.875*interface_stats['mean_ms'] + 0.125*interarrival_ms
+
+def adaptive_timeout():
+    """
+    Calcola il timeout di ricezione a partire dal jitter misurato.
+
+    Returns:
+        float: Timeout in secondi
+    """
+    if interface_stats['mean_ms'] is None:
+        timeout_ms = TIMEOUT_MAX_MILLIS
+    else:
+        timeout_ms = interface_stats['mean_ms'] + TIMEOUT_JITTER_K*interface_stats['jitter_ms']
+    return min(max(timeout_ms, TIMEOUT_MIN_MILLIS), TIMEOUT_MAX_MILLIS)/1000
+
+def predict_interface_value():
+    """
+    Predice il valore di interfaccia mancante secondo TIMEOUT_PREDICTOR.
+
+    Returns:
+        complex: Fasore predetto
+    """
+    interface_stats['timeouts'] += 1
+    interface_stats['predicted'] += 1
+    # L'intervallo che contiene la perdita non va usato per la stima del jitter
+    interface_stats['last_arrival'] = None
+
+    return extrapolate_interface_value(TIMEOUT_PREDICTOR)
+
+def extrapolate_interface_value(predictor):
+    """
+    Estrapola il prossimo valore di interfaccia dagli ultimi valori applicati.
+
+    Args:
+        predictor: Uno tra hold, linear, phasor
+
+    Returns:
+        complex: Fasore estrapolato
+
+    Raises:
+        ValueError: Se il predittore non estrapola ('none' o sconosciuto)
+    """
+    if predictor not in ('hold', 'linear', 'phasor'):
+        raise ValueError(f"Predittore '{predictor}' non estrapolabile, usare uno tra: hold, linear, phasor")
+    if not interface_history:
+        return complex(0, 0)
+    last = interface_history[-1]
+    if predictor == 'hold' or len(interface_history) < 2:
+        return last
+
+    previous = interface_history[-2]
+    if predictor == 'linear':
+        return 2*last - previous
+
+    # phasor: modulo estrapolato linearmente, fase ruotata dell'ultimo incremento
+    magnitude = max(0.0, 2*abs(last) - abs(previous))
+    delta_phase = cmath.phase(last) - cmath.phase(previous)
+    delta_phase = (delta_phase + math.pi) % (2*math.pi) - math.pi
+    return cmath.rect(magnitude, cmath.phase(last) + delta_phase)
+
+def log_interface_summary():
+    """
+    Riporta le statistiche dei timeout e delle predizioni a fine simulazione.
+    """
+    mean_ms = interface_stats['mean_ms'] or 0.0
+    logger.info(
+        f"Interfaccia LAB A | predictor={TIMEOUT_PREDICTOR} | timeouts={interface_stats['timeouts']} | "
+        f"predicted={interface_stats['predicted']} | late={link_stats['late']} | interarrival_ms={mean_ms:.3f} | "
+        f"jitter_ms={interface_stats['jitter_ms']:.3f} | timeout_ms={adaptive_timeout()*1000:.3f}"
+    )
+
+def snapshot_state(components):
+    """
+    Cattura lo stato dinamico dei componenti.
+
+    Args:
+        components: Componenti con stato (es. induttori)
+
+    Returns:
+        list: Valori degli attributi STATE_ATTRIBUTES per ciascun componente
+    """
+    return [[comp.attr(name).get() for name in STATE_ATTRIBUTES] for comp in components]
+
+def restore_state(components, snapshot):
+    """
+    Ripristina lo stato dinamico catturato da snapshot_state.
+
+    Args:
+        components: Componenti con stato, nello stesso ordine dello snapshot
+        snapshot: Valori restituiti da snapshot_state
+
+    Returns:
+        bool: True se tutti gli attributi riletti coincidono con lo snapshot
+    """
+    restored = True
+    for comp, values in zip(components, snapshot):
+        for name, value in zip(STATE_ATTRIBUTES, values):
+            comp.attr(name).set(value)
+            restored = restored and bool((comp.attr(name).get() == value).all())
+    return restored
+
+def speculation_matches(predicted, actual):
+    """
+    Verifica se il valore reale rientra nella tolleranza rispetto a quello predetto.
+
+    Args:
+        predicted: Fasore usato per lo step speculativo
+        actual: Fasore ricevuto
+
+    Returns:
+        bool: True se lo step speculativo può essere confermato
+    """
+    return abs(actual - predicted) <= SPECULATION_ABS_TOL + SPECULATION_REL_TOL*abs(actual)
+
+def log_speculation_summary():
+    """
+    Riporta le statistiche dello stepping speculativo a fine simulazione e il costo
+    dell'istanza ombra: durata media di uno step ombra e della risoluzione primaria
+    dopo un commit, e calcolo aggiuntivo rispetto agli step eseguiti.
+    """
+    if not SPECULATIVE_MODE:
+        return
+    total = speculation_stats['commit'] + speculation_stats['rollback']
+    hit_rate = 100*speculation_stats['commit']/total if total else 0.0
+    shadow_us = speculation_stats['shadow_ns']/speculation_stats['shadow_steps']/1000 if speculation_stats['shadow_steps'] else 0.0
+    commit_solve_us = speculation_stats['commit_solve_ns']/speculation_stats['commit']/1000 if speculation_stats['commit'] else 0.0
+    overhead_us = speculation_stats['shadow_ns']/watchdog_stats['steps']/1000 if watchdog_stats['steps'] else 0.0
+    logger.info(
+        f"Speculazione LAB A | predictor={SPECULATION_PREDICTOR} | commit={speculation_stats['commit']} | "
+        f"rollback={speculation_stats['rollback']} | hit_rate={hit_rate:.1f}% | "
+        f"restore_mismatch={speculation_stats['restore_mismatch']}"
+    )
+    logger.info(
+        f"Speculazione LAB A | step ombra={shadow_us:.1f} us | risoluzione dopo commit={commit_solve_us:.1f} us | "
+        f"calcolo aggiuntivo={overhead_us:.1f} us/step"
+    )
+
+def profile_begin_step():
+    """
+    Azzera le durate dello step corrente e avvia il cronometro del profiler.
+    """
+    if not STEP_PROFILER:
+        return
+    for index in range(len(profile_step)):
+        profile_step[index] = 0
+    profile_clock[0] = time_module.perf_counter_ns()
+
+def profile_mark(phase):
+    """
+    Attribuisce alla fase indicata il tempo trascorso dall'ultima marcatura.
+    Le marcature ripetute nello stesso step (es. step speculativo + primario) si sommano.
+    """
+    if not STEP_PROFILER:
+        return
+    now = time_module.perf_counter_ns()
+    profile_step[PROFILE_INDEX[phase]] += now - profile_clock[0]
+    profile_clock[0] = now
+
+def profile_end_step():
+    """
+    Accoda le durate dello step corrente all'array del profiler.
+    """
+    if STEP_PROFILER:
+        profile_samples.extend(profile_step)
+
+def percentile(values, p):
+    """
+    Percentile (nearest-rank) di una lista già ordinata: il più piccolo valore
+    che ha almeno il p% dei campioni minori o uguali, di indice ceil(p/100*n) - 1.
+    """
+    if not values:
+        return 0
+    return values[min(len(values), max(1, math.ceil(p/100*len(values)))) - 1]
+
+def log_profile_report():
+    """
+    Riporta a fine simulazione la tabella dei percentili per fase e la ripartizione
+    del tempo di step, e salva gli stack collassati (formato flamegraph.pl) in OUTPUT_DIR.
+    """
+    if not STEP_PROFILER or not profile_samples:
+        return
+    phases = len(PROFILE_PHASES)
+    steps = len(profile_samples)//phases
+    totals = {}
+    logger.info(f"Profiler LAB A | steps={steps} | durate in us")
+    logger.info(f"{'fase':<15}{'p50':>10}{'p90':>10}{'p99':>10}{'max':>10}")
+    for index, phase in enumerate(PROFILE_PHASES):
+        values = sorted(profile_samples[index::phases])
+        totals[phase] = sum(values)
+        logger.info(
+            f"{phase:<15}{percentile(values, 50)/1000:>10.1f}{percentile(values, 90)/1000:>10.1f}"
+            f"{percentile(values, 99)/1000:>10.1f}{values[-1]/1000:>10.1f}"
+        )
+    grand_total = sum(totals.values()) or 1
+    for phase in sorted(PROFILE_PHASES, key=lambda phase: -totals[phase]):
+        share = 100*totals[phase]/grand_total
+        logger.info(f"{phase:<15}{'#'*int(round(share/2)):<50} {share:5.1f}%")
+    try:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = f"{OUTPUT_DIR}/profile_lab_a_{timestamp}.folded"
+        with open(path, 'w') as f:
+            for phase in PROFILE_PHASES:
+                if totals[phase]:
+                    f.write(f"lab_a;step;{phase} {totals[phase]//1000}\n")
+        logger.info(f"Profiler LAB A: stack collassati salvati in {path}")
+    except OSError as e:
+        logger.error(f"Errore nel salvataggio del profilo: {str(e)}")
+
+def resolve_heartbeat():
+    """
+    Tenta una volta di risolvere l'indirizzo del supervisore e, se ci riesce,
+    apre il socket del heartbeat.
+
+    Returns:
+        bool: True se il heartbeat è attivo
+    """
+    if heartbeat['socket'] is not None:
+        return True
+    try:
+        heartbeat['address'] = (socket.gethostbyname(HEARTBEAT_HOST), HEARTBEAT_PORT)
+    except OSError:
+        return False
+    heartbeat['socket'] = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    heartbeat['socket'].setblocking(False)
+    logger.info(f"Heartbeat LAB A verso {HEARTBEAT_HOST}:{HEARTBEAT_PORT} ogni {HEARTBEAT_INTERVAL_MILLIS} ms")
+    return True
+
+def start_heartbeat():
+    """
+    Apre il socket del heartbeat, ritentando la risoluzione del supervisore
+    fino a HEARTBEAT_RESOLVE_TIMEOUT: il suo container può non essere ancora
+    sulla rete quando la lab parte.
+    """
+    if not HEARTBEAT_HOST:
+        return
+    deadline = time_module.monotonic() + HEARTBEAT_RESOLVE_TIMEOUT
+    while not resolve_heartbeat():
+        if time_module.monotonic() >= deadline:
+            retry = ", nuovi tentativi durante la barriera di partenza" if START_BARRIER else ""
+            logger.warning(f"Heartbeat disabilitato: impossibile risolvere {HEARTBEAT_HOST} entro {HEARTBEAT_RESOLVE_TIMEOUT} s{retry}")
+            return
+        time_module.sleep(0.5)
+
+def wait_start_barrier():
+    """
+    Segnala al supervisore che la lab è pronta (socket aperti, simulazione
+    inizializzata) e attende l'istante di partenza comune a tutte le lab.
+
+    Il messaggio READY viene ripetuto finché il supervisore non risponde con
+    START; allo scadere di START_BARRIER_TIMEOUT la lab parte comunque. Se il
+    supervisore non era ancora risolvibile all'avvio del heartbeat, la
+    risoluzione viene ritentata nello stesso ciclo.
+    """
+    if not START_BARRIER:
+        return
+    if not HEARTBEAT_HOST:
+        logger.warning("Barriera di partenza non disponibile senza HEARTBEAT_HOST, attesa fissa di 2 s")
+        time_module.sleep(2)
+        return
+    barrier = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    barrier.settimeout(0.1)
+    ready = json.dumps({'type': 'ready', 'lab': LAB_NAME}).encode()
+    deadline = time_module.monotonic() + START_BARRIER_TIMEOUT
+    start_at = None
+    logger.info(f"LAB A pronta, in attesa della barriera di partenza")
+    while start_at is None and time_module.monotonic() < deadline:
+        if not resolve_heartbeat():
+            time_module.sleep(0.1)
+            continue
+        barrier.sendto(ready, heartbeat['address'])
+        try:
+            data, _ = barrier.recvfrom(1024)
+            reply = json.loads(data.decode())
+            if reply.get('type') == 'start':
+                start_at = float(reply['start_at'])
+        except socket.timeout:
+            continue
+        except (ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Risposta della barriera non valida: {str(e)}")
+    barrier.close()
+    if start_at is None:
+        logger.warning(f"Barriera di partenza non superata entro {START_BARRIER_TIMEOUT} s, partenza immediata")
+        return
+    delay = start_at - time_module.time()
+    logger.info(f"Barriera superata, partenza comune tra {delay*1000:.1f} ms")
+    if delay > 0:
+        time_module.sleep(delay)
+
+def record_metric(name, value_ms):
+    """
+    Aggiunge un campione all'istogramma della finestra corrente.
+
+    Il bucket b copre l'intervallo [2^(b/4), 2^((b+1)/4)) us.
+
+    Args:
+        name: 'step' o 'rtt'
+        value_ms: Valore in millisecondi
+    """
+    bucket = int(math.log2(max(value_ms*1000, 1.0))*METRIC_BUCKETS_PER_OCTAVE)
+    histogram = metrics_window[f"{name}_ms"]
+    histogram[bucket] = histogram.get(bucket, 0) + 1
+    if value_ms > metrics_window[f"{name}_max_ms"]:
+        metrics_window[f"{name}_max_ms"] = value_ms
 
-    #print(f"Applying voltage node n3 {str(Vn3)}")
-    vload.set_parameters(V_ref=voltage_phasor)
+def record_remote_sequence(remote_seq):
+    """
+    Conta i campioni ricevuti e quelli persi (buchi nella sequenza del mittente).
 
+    Con un predittore attivo, un campione con sequence non successiva all'ultima
+    consumata è arrivato dopo che il suo step è già stato risolto (timeout con
+    predizione) o è un duplicato: usarlo farebbe scorrere di un campione le due
+    lab, quindi va scartato e contato come 'late'. Con TIMEOUT_PREDICTOR=none
+    nessuno step viene predetto e ogni campione viene usato.
+
+    Returns:
+        bool: False se il campione è in ritardo e non deve essere usato
+    """
+    last = link_stats['last_remote_seq']
+    if TIMEOUT_PREDICTOR != 'none' and remote_seq is not None and last is not None and remote_seq <= last:
+        link_stats['late'] += 1
+        return False
+    link_stats['received'] += 1
+    if remote_seq is not None:
+        if last is not None and remote_seq > last + 1:
+            link_stats['lost'] += remote_seq - last - 1
+        link_stats['last_remote_seq'] = remote_seq
+    if link_stats['sent_at'] is not None:
+        record_metric('rtt', (time_module.perf_counter() - link_stats['sent_at'])*1000)
+    return True
+
+def skip_remote_sequence():
+    """
+    Segna come consumato il campione atteso per uno step risolto senza di esso
+    (timeout con predizione): se arriva in ritardo verrà scartato.
+    """
+    if link_stats['last_remote_seq'] is not None:
+        link_stats['last_remote_seq'] += 1
+
+def scenario_counters():
+    """
+    Contatori dello scenario in corso riportati nel heartbeat.
+    """
+    return {
+        'steps': watchdog_stats['steps'],
+        'overruns': watchdog_stats['overruns'],
+        'timeouts': interface_stats['timeouts'],
+        'received': link_stats['received'],
+        'lost': link_stats['lost'],
+        'late': link_stats['late']
+    }
+
+def send_heartbeat(sequence, state='running'):
+    """
+    Invia al supervisore lo stato di avanzamento della simulazione.
+
+    Durante la simulazione viene inviato al più un heartbeat ogni
+    HEARTBEAT_INTERVAL_MILLIS; gli stati finali vengono sempre inviati. I
+    contatori comprendono gli scenari del pool già conclusi.
+
+    Args:
+        sequence: Ultimo campione elaborato
+        state: 'running' durante la simulazione, 'completed' o 'aborted' alla fine
+    """
+    if heartbeat['socket'] is None:
+        return
+    now = time_module.perf_counter()
+    if state == 'running' and (now - heartbeat['last'])*1000 < HEARTBEAT_INTERVAL_MILLIS:
+        return
+    heartbeat['last'] = now
+    heartbeat['seq'] += 1
+    counters = {name: heartbeat_totals[name] + value for name, value in scenario_counters().items()}
+    payload = {
+        'lab': LAB_NAME,
+        'seq': heartbeat['seq'],
+        'state': state,
+        'sim_seq': sequence,
+        'sim_time': watchdog_stats['steps']*TIME_STEP_MILLIS/1000,
+        **counters,
+        'step_ms': metrics_window['step_ms'],
+        'rtt_ms': metrics_window['rtt_ms'],
+        'step_max_ms': metrics_window['step_max_ms'],
+        'rtt_max_ms': metrics_window['rtt_max_ms']
+    }
+    try:
+        heartbeat['socket'].sendto(json.dumps(payload).encode(), heartbeat['address'])
+    except OSError as e:
+        logger.debug(f"Heartbeat non inviato: {str(e)}")
+    # Nuova finestra di metriche
+    metrics_window['step_ms'] = {}
+    metrics_window['rtt_ms'] = {}
+    metrics_window['step_max_ms'] = 0.0
+    metrics_window['rtt_max_ms'] = 0.0
+
+def solve_step(sim, l1, vload, received):
+    """
+    Applica il valore ricevuto secondo l'algoritmo di interfaccia e avanza di uno step.
+
+    Args:
+        sim: Simulazione DPSim
+        l1: Induttore di interfaccia
+        vload: Sorgente di tensione che rappresenta il LAB B
+        received: Fasore ricevuto dal LAB B
+
+    Returns:
+        complex: Fasore da inviare al LAB B
+    """
+    plugin = INTERFACE_PLUGINS[INTERFACE_ALGORITHM]
+    v_applied = plugin['input'](received, l1)
+    vload.set_parameters(V_ref=v_applied)
+    profile_mark('set_parameters')
     sim.next()
-    sequence=sequence+1
+    profile_mark('sim_next')
+    i_value = plugin['output'](l1.attr("i_intf").get()[0, 0], v_applied)
+    profile_mark('read_attr')
+    return i_value
+
+def speculate_step(l1, spec):
+    """
+    Calcola lo step successivo sull'istanza ombra con la tensione predetta,
+    partendo dallo stato corrente dell'istanza primaria.
+
+    Args:
+        l1: Induttore dell'istanza primaria
+        spec: Tupla (sim, l1, vload) dell'istanza ombra
 
-    i_out = l1.attr("i_intf") 
+    Returns:
+        tuple: (tensione predetta, valore da inviare calcolato) o None se lo stato
+               dell'istanza primaria non è stato copiato nell'ombra
+    """
+    sim_spec, l1_spec, vload_spec = spec
+    inizio = time_module.perf_counter_ns()
+    if not restore_state([l1_spec], snapshot_state([l1])):
+        if not speculation_stats['restore_mismatch']:
+            logger.warning("Stato di interfaccia non copiato nell'istanza ombra, step risolto senza speculazione")
+        speculation_stats['restore_mismatch'] += 1
+        return None
+
+    predicted = extrapolate_interface_value(SPECULATION_PREDICTOR)
+    i_value = solve_step(sim_spec, l1_spec, vload_spec, predicted)
+    speculation_stats['shadow_ns'] += time_module.perf_counter_ns() - inizio
+    speculation_stats['shadow_steps'] += 1
+    return predicted, i_value
+
+def next_simulation(sim,l1,vload,voltage_phasor,sequence,time_step,speculation=None):
+
+    inizio = time_module.perf_counter()
+
+    committed = speculation is not None and speculation_matches(speculation[0], voltage_phasor)
+    if committed:
+        # Predizione confermata: si trasmette subito il valore calcolato in anticipo
+        speculation_stats['commit'] += 1
+        i_value = speculation[1]
+    else:
+        if speculation is not None:
+            # Predizione errata: lo step speculativo viene scartato e si risolve sull'istanza primaria
+            speculation_stats['rollback'] += 1
+
+        #print(f"Applying voltage node n3 {str(Vn3)}")
+        i_value = solve_step(sim, l1, vload, voltage_phasor)
+    sequence=sequence+1
     
-    real_part = i_out.get()[0, 0].real # Parte reale
-    imag_part = i_out.get()[0, 0].imag  # Parte immaginaria
+    real_part = i_value.real # Parte reale
+    imag_part = i_value.imag  # Parte immaginaria
     payload = [{
                 "sequence": sequence,
                 "data": [{
@@ -141,54 +1026,634 @@ def next_simulation(sim,l1,vload,voltage_phasor,sequence,time_step):
                 }]
             }]
     
+    message = json.dumps(payload).encode()
+    profile_mark('encode')
+    
     # Aggiunta timestamp_ns come intero (nanosecondi dal 1970)
     timestamp_ns = time_module.time_ns()
-    logger.info(f"Campione:{sequence} | trasmesso | timestamp_ns={timestamp_ns}")
+    if should_log_sample(sequence):
+        logger.info(f"Campione:{sequence} | trasmesso | timestamp_ns={timestamp_ns}")
+    profile_mark('log')
 
     # Invio risultato
     sock_tx = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock_tx.sendto(json.dumps(payload).encode(), (HOST_DEST, PORT_DEST))
+    sock_tx.sendto(message, (HOST_DEST, PORT_DEST))
+    link_stats['sent_at'] = time_module.perf_counter()
+    profile_mark('sendto')
     logger.debug(f"Sent current to {HOST_DEST}: {payload}")
 
+    if committed:
+        # Avanza l'istanza primaria con il valore reale, fuori dal percorso critico
+        inizio_commit = time_module.perf_counter_ns()
+        solve_step(sim, l1, vload, voltage_phasor)
+        speculation_stats['commit_solve_ns'] += time_module.perf_counter_ns() - inizio_commit
+    profile_end_step()
+
     fine = time_module.perf_counter()
     tempo_esecuzione = fine - inizio
+    record_metric('step', tempo_esecuzione*1000)
     
-    if tempo_esecuzione <= (time_step*1000):
+    if watchdog_check(tempo_esecuzione, sequence):
         logger.debug(f"Risolto LAB A in: {str(tempo_esecuzione*1000)} msec")
         time_module.sleep((TAU_MILLIS - TIME_STEP_MILLIS)/1000)
     
-def udp_receiver(sim,l1,vload):
+    send_heartbeat(sequence)
+    
+def udp_receiver(sim,l1,vload,spec=None):
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     sock.bind((HOST_SOURCE, PORT_SOURCE))
+    enable_kernel_timestamps(sock)
+    start_heartbeat()
+    wait_start_barrier()
+    try:
+        sequence = run_steps(sock, sim, l1, vload, spec)
+    except WatchdogAbort as e:
+        complete_run(e.sequence, 'aborted')
+        logger.info("Simulation aborted")
+        sys.exit(1)
+    complete_run(sequence)
+    logger.info("Simulation completed")
+    sys.exit()
+
+def run_steps(sock, sim, l1, vload, spec=None):
+    """
+    Ciclo di ricezione e simulazione fino a ITERATIONS campioni.
+
+    Returns:
+        int: Ultimo numero di sequenza elaborato
+
+    Raises:
+        WatchdogAbort: Se il watchdog interrompe la simulazione
+    """
     sequence=0
     _time_step = TIME_STEP_MILLIS/1000
+    first_value_received = False
     while (sequence <= ITERATIONS):
+        speculation = None
+        profile_begin_step()
         try:
-            data, _ = sock.recvfrom(1024)
+            if spec is not None and first_value_received:
+                # Lo step successivo viene calcolato mentre il campione è in transito
+                speculation = speculate_step(l1, spec)
+
+            data, kernel_ns = receive_datagram(sock)
+            data, kernel_ns = drop_stale_inputs(sock, data, kernel_ns)
+            profile_mark('recv')
             vs = json.loads(data.decode())
             v_real = vs[0]['data'][0]['real']
             v_imag = vs[0]['data'][0]['imag']
+            if not record_remote_sequence(vs[0].get('sequence')):
+                logger.debug(f"Campione remoto {vs[0].get('sequence')} in ritardo, scartato")
+                continue
+            profile_mark('parse')
             #sequence = vs[0]['sequence']
             sequence = sequence+1
+
+            if kernel_ns is not None and should_log_sample(sequence):
+                # Log di ricezione con timestamp applicativo e del kernel per analisi delay
+                logger.info(f"Campione:{sequence} | ricevuto | timestamp_ns={time_module.time_ns()} | kernel_ns={kernel_ns}")
             
             logger.debug(f"Received from {HOST_DEST}: {vs}")
-            next_simulation(sim,l1,vload,complex(v_real,v_imag),sequence,_time_step)
+            profile_mark('log')
+            voltage_phasor = complex(v_real,v_imag)
+            record_interface_value(voltage_phasor)
+            first_value_received = True
+            if TIMEOUT_PREDICTOR != 'none':
+                # Dopo il primo valore il receiver non blocca più oltre il timeout adattivo
+                update_arrival_jitter()
+                sock.settimeout(adaptive_timeout())
+            next_simulation(sim,l1,vload,voltage_phasor,sequence,_time_step,speculation)
+
+        except socket.timeout:
+            # Valore di tensione perso: si prosegue con il valore predetto
+            profile_mark('recv')
+            sequence = sequence+1
+            voltage_phasor = predict_interface_value()
+            record_interface_value(voltage_phasor)
+            skip_remote_sequence()
+            logger.warning(f"Timeout: no new voltage value received, using {TIMEOUT_PREDICTOR} prediction")
+            next_simulation(sim,l1,vload,voltage_phasor,sequence,_time_step)
 
         except (json.JSONDecodeError, KeyError, ValueError) as e:
             logger.error(f"Errore nel parsing JSON: {str(e)}")
+        except WatchdogAbort:
+            raise
         except Exception as e:
             logger.error(f"Errore receiver: {str(e)}")
+    return sequence
+
+def complete_run(sequence, state='completed'):
+    """
+    Invia l'heartbeat finale e riporta i riepiloghi della simulazione.
+
+    Args:
+        sequence: Ultimo campione elaborato
+        state: 'completed' o 'aborted' se interrotta dal watchdog
+    """
+    send_heartbeat(sequence, state)
+    log_watchdog_summary()
+    log_interface_summary()
+    log_speculation_summary()
+    log_profile_report()
+
+def apply_scenario(env):
+    """
+    Applica alla configurazione del modulo i parametri di uno scenario.
+
+    I parametri non presenti in SCENARIO_PARAMETERS (ad esempio quelli dell'altra
+    lab) vengono ignorati e restituiti al client.
+
+    Args:
+        env: Parametri dello scenario, es. {'TIME_STOP': 0.3, 'TAU_MILLIS': 2}
+
+    Returns:
+        list: Parametri ignorati
+
+    Raises:
+        ValueError: Se un valore non è valido
+    """
+    global ITERATIONS
+    values = dict(scenario_baseline)
+    ignored = []
+    for name, value in env.items():
+        kind = SCENARIO_PARAMETERS.get(name)
+        if kind is None:
+            ignored.append(name)
+            continue
+        if isinstance(kind, tuple):
+            value = str(value).lower()
+            if value not in kind:
+                raise ValueError(f"{name} '{value}' non valido, usare uno tra: {', '.join(kind)}")
+        else:
+            value = kind(value)
+        values[name] = value
+    if values['TIME_STEP_MILLIS'] <= 0 or values['TIME_STOP'] <= 0:
+        raise ValueError("TIME_STOP e TIME_STEP_MILLIS devono essere positivi")
+    if 'TIMEOUT_MIN_MILLIS' not in env and 'TIMEOUT_MIN_MILLIS' not in os.environ:
+        values['TIMEOUT_MIN_MILLIS'] = values['TAU_MILLIS']
+    globals().update(values)
+    ITERATIONS = int(TIME_STOP*1000/(TIME_STEP_MILLIS))
+    INTERFACE_PLUGINS['pcd']['r_link'] = INTERFACE_R_LINK
+    INTERFACE_PLUGINS['thevenin']['r_link'] = INTERFACE_R_B
+    return ignored
+
+def reset_state():
+    """
+    Azzera contatori, metriche e storico dell'interfaccia lasciati dallo scenario
+    precedente; i contatori passano nei totali del heartbeat.
+    """
+    for name, value in scenario_counters().items():
+        heartbeat_totals[name] += value
+    for name, initial in initial_state.items():
+        globals()[name].clear()
+        globals()[name].update(copy.deepcopy(initial))
+    interface_history.clear()
+    del profile_samples[:]
+
+def drain_socket(sock):
+    """
+    Scarta i campioni rimasti nel buffer del socket dallo scenario precedente
+    e riporta il socket in modalità bloccante.
+
+    Returns:
+        int: Numero di datagrammi scartati
+    """
+    sock.setblocking(False)
+    drained = 0
+    try:
+        while True:
+            sock.recv(65536)
+            drained += 1
+    except BlockingIOError:
+        pass
+    sock.settimeout(None)
+    return drained
+
+def send_control(stream, message):
+    """
+    Invia una risposta sul canale di controllo del pool.
+    """
+    stream.write(json.dumps(message).encode() + b'\n')
+    stream.flush()
+
+def prepare_scenario(command, sock):
+    """
+    Prepara uno scenario: parametri, stato, socket e simulazione ricostruita.
+
+    Args:
+        command: Comando 'scenario' del client ({'id': ..., 'env': {...}})
+        sock: Socket UDP di ricezione, aperto una sola volta per tutto il pool
+
+    Returns:
+        tuple: (scenario preparato, risposta 'ready' per il client)
+    """
+    inizio = time_module.perf_counter()
+    scenario_id = command.get('id')
+    ignored = apply_scenario(command.get('env') or {})
+    reset_state()
+    drained = drain_socket(sock)
+    scenario = {
+        'id': scenario_id,
+        'sim': start_simulation(),
+        'spec': start_simulation('VILLAS_test_spec') if SPECULATIVE_MODE else None
+    }
+    setup_ms = (time_module.perf_counter() - inizio)*1000
+    logger.info(
+        f"Scenario {scenario_id} pronto in {setup_ms:.1f} ms | TIME_STOP={TIME_STOP} s | "
+        f"TAU={TAU_MILLIS} ms | interfaccia={INTERFACE_ALGORITHM} | campioni scartati={drained}"
+    )
+    if ignored:
+        logger.info(f"Parametri ignorati dalla LAB A: {', '.join(ignored)}")
+    ready = {
+        'type': 'ready',
+        'id': scenario_id,
+        'lab': LAB_NAME,
+        'iterations': ITERATIONS,
+        'setup_ms': round(setup_ms, 3),
+        'ignored': ignored
+    }
+    return scenario, ready
+
+def run_scenario(scenario, sock, start_at):
+    """
+    Esegue uno scenario preparato a partire dall'istante comune indicato dal client.
+
+    Un'interruzione del watchdog chiude solo lo scenario: la risposta riporta
+    status 'aborted' e il pool resta disponibile per lo scenario successivo.
+
+    Returns:
+        dict: Risposta 'completed' con esito, durata e contatori dello scenario
+    """
+    if start_at is not None:
+        delay = float(start_at) - time_module.time()
+        if delay > 0:
+            time_module.sleep(delay)
+    inizio = time_module.perf_counter()
+    logger.info(f"Scenario {scenario['id']} avviato")
+    status = 'completed'
+    try:
+        sequence = run_steps(sock, *scenario['sim'], scenario['spec'])
+    except WatchdogAbort as e:
+        sequence = e.sequence
+        status = 'aborted'
+    duration = time_module.perf_counter() - inizio
+    complete_run(sequence, status)
+    if status == 'aborted':
+        logger.warning(f"Scenario {scenario['id']} interrotto dal watchdog dopo {duration:.3f} s")
+    else:
+        logger.info(f"Scenario {scenario['id']} completato in {duration:.3f} s")
+    response = {
+        'type': 'completed',
+        'status': status,
+        'id': scenario['id'],
+        'lab': LAB_NAME,
+        'duration_s': round(duration, 4),
+        'sequence': sequence,
+        'steps': watchdog_stats['steps'],
+        'overruns': watchdog_stats['overruns'],
+        'max_overrun_ms': round(watchdog_stats['max_overrun_ms'], 4),
+        'timeouts': interface_stats['timeouts'],
+        'predicted': interface_stats['predicted'],
+        'received': link_stats['received'],
+        'lost': link_stats['lost'],
+        'late': link_stats['late'],
+        'speculation_commit': speculation_stats['commit'],
+        'speculation_rollback': speculation_stats['rollback']
+    }
+    if status == 'aborted':
+        # Lo scenario si è fermato a metà: stato e campioni in arrivo non devono restare al successivo
+        reset_state()
+        drain_socket(sock)
+    return response
+
+def serve_pool_client(stream, sock):
+    """
+    Gestisce i comandi di un client del pool finché non si disconnette.
+
+    Comandi: {'type': 'scenario', 'id', 'env'} -> 'ready' | 'error',
+             {'type': 'start', 'start_at'}     -> 'completed' (status 'completed' | 'aborted') | 'error',
+             {'type': 'shutdown'}              -> 'bye' e fine del pool.
+
+    Returns:
+        bool: False se il client ha chiesto la chiusura del pool
+    """
+    scenario = None
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            command = json.loads(line)
+            kind = command['type']
+        except (ValueError, KeyError, TypeError) as e:
+            send_control(stream, {'type': 'error', 'lab': LAB_NAME, 'message': f"Comando non valido: {str(e)}"})
+            continue
+        if kind == 'scenario':
+            try:
+                scenario, ready = prepare_scenario(command, sock)
+            except (ValueError, TypeError, AttributeError) as e:
+                scenario = None
+                logger.error(f"Scenario {command.get('id')} non valido: {str(e)}")
+                send_control(stream, {'type': 'error', 'id': command.get('id'), 'lab': LAB_NAME, 'message': str(e)})
+                continue
+            send_control(stream, ready)
+        elif kind == 'start':
+            if scenario is None:
+                send_control(stream, {'type': 'error', 'lab': LAB_NAME, 'message': "Nessuno scenario preparato"})
+                continue
+            send_control(stream, run_scenario(scenario, sock, command.get('start_at')))
+            scenario = None
+        elif kind == 'shutdown':
+            send_control(stream, {'type': 'bye', 'lab': LAB_NAME})
+            return False
+        else:
+            send_control(stream, {'type': 'error', 'lab': LAB_NAME, 'message': f"Comando '{kind}' non supportato"})
+    return True
+
+def run_pool():
+    """
+    Modalità pool: socket UDP, heartbeat e processo restano attivi tra gli scenari,
+    che vengono ricevuti uno alla volta dal canale di controllo TCP.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind((HOST_SOURCE, PORT_SOURCE))
+    enable_kernel_timestamps(sock)
+    start_heartbeat()
+
+    control = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    control.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    control.bind(('0.0.0.0', POOL_CONTROL_PORT))
+    control.listen(1)
+    logger.info(f"LAB A in modalità pool, canale di controllo sulla porta TCP {POOL_CONTROL_PORT}")
+    serving = True
+    while serving:
+        conn, addr = control.accept()
+        logger.info(f"Client del pool connesso da {addr[0]}")
+        with conn, conn.makefile('rwb') as stream:
+            try:
+                serving = serve_pool_client(stream, sock)
+            except OSError as e:
+                logger.warning(f"Canale di controllo interrotto: {str(e)}")
+        logger.info("Client del pool disconnesso")
+    control.close()
+    sock.close()
+    logger.info("Pool terminato")
+    sys.exit()
+
+def encode_waveform(values):
+    """
+    Converte una forma d'onda di fasori in una lista piatta [re0, im0, re1, im1, ...].
+    """
+    flat = []
+    for value in values:
+        flat.append(value.real)
+        flat.append(value.imag)
+    return flat
+
+def decode_waveform(flat):
+    """
+    Ricostruisce una forma d'onda di fasori da una lista piatta [re0, im0, re1, im1, ...].
+    """
+    return [complex(flat[i], flat[i+1]) for i in range(0, len(flat), 2)]
+
+def waveform_delta(values, previous):
+    """
+    Calcola la variazione relativa massima tra due iterazioni della stessa finestra.
+
+    Returns:
+        float: Variazione relativa, None alla prima iterazione
+    """
+    if previous is None:
+        return None
+    scale = max(max((abs(v) for v in values), default=0.0), 1e-12)
+    return max((abs(v - p) for v, p in zip(values, previous)), default=0.0)/scale
+
+def wr_exchange(stream, message, send_first, stats):
+    """
+    Scambia una finestra con il lab partner (JSON delimitato da newline su TCP).
+    I due lab usano ordini opposti (invio/ricezione) per evitare che entrambi
+    restino bloccati in scrittura con forme d'onda più grandi dei buffer TCP.
+
+    Args:
+        stream: File-like della connessione TCP
+        message: Dizionario da inviare
+        send_first: True se il lab invia prima di ricevere
+        stats: Dizionario con i contatori di messaggi e byte
+
+    Returns:
+        dict: Messaggio del lab partner
+    """
+    line = None
+    if not send_first:
+        line = stream.readline()
+    encoded = json.dumps(message) + '\n'
+    stream.write(encoded)
+    stream.flush()
+    if send_first:
+        line = stream.readline()
+    if not line:
+        raise ConnectionError("Connessione waveform relaxation chiusa dal lab partner")
+
+    stats['messages'] += 2
+    stats['bytes'] += len(encoded) + len(line)
+    return json.loads(line)
+
+def write_waveform_log(signal, values):
+    """
+    Scrive una forma d'onda convergente nello stesso formato JSON dei log dei file node VILLAS.
+
+    Args:
+        signal: Nome del segnale (current o voltage)
+        values: Fasori per step
+    """
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    filepath = os.path.join(OUTPUT_DIR, f"log_{signal}_labA_wr_{timestamp}.log")
+    _time_step = TIME_STEP_MILLIS/1000
+    with open(filepath, 'w') as file:
+        for index, value in enumerate(values):
+            sim_time_ns = int(round((index + 1)*_time_step*1e9))
+            file.write(json.dumps({
+                "ts": {"origin": [sim_time_ns // 1_000_000_000, sim_time_ns % 1_000_000_000]},
+                "sequence": index + 1,
+                "data": [{"real": value.real, "imag": value.imag}]
+            }) + '\n')
+    logger.info(f"Forma d'onda {signal} scritta in: {filepath}")
+
+def write_wr_stats(stats):
+    """
+    Riporta e salva le statistiche di convergenza della waveform relaxation.
+    """
+    logger.info(
+        f"Waveform relaxation LAB A | windows={len(stats['windows'])} | iterations={stats['iterations']} | "
+        f"converged={all(w['converged'] for w in stats['windows'])} | messages={stats['messages']} | "
+        f"bytes={stats['bytes']} | elapsed_s={stats['elapsed_s']:.3f}"
+    )
+    try:
+        os.makedirs(OUTPUT_DIR, exist_ok=True)
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filepath = os.path.join(OUTPUT_DIR, f"wr_stats_lab_a_{timestamp}.json")
+        with open(filepath, 'w') as file:
+            json.dump(stats, file, indent=2)
+        logger.info(f"Statistiche di convergenza salvate in: {filepath}")
+    except OSError as e:
+        logger.error(f"Errore nel salvataggio delle statistiche: {str(e)}")
+
+def start_window_simulation(steps, checkpoint):
+    """
+    Costruisce l'istanza usata da tutte le iterazioni di una finestra. La rete
+    del LAB A non ha eventi, quindi l'istanza può partire da t=0: il suo tempo
+    finale copre WR_MAX_ITERATIONS passaggi sulla finestra.
+
+    Args:
+        steps: Step della finestra
+        checkpoint: Stato a fine della finestra precedente, None per la prima finestra
+
+    Returns:
+        tuple: (sim, l1, vload, checkpoint di inizio finestra)
+    """
+    sim, l1, vload = start_simulation(time_stop=WR_MAX_ITERATIONS*steps*TIME_STEP_MILLIS/1000, log_setup=False)
+    if checkpoint is None:
+        # Prima finestra: le iterazioni ripartono dallo stato iniziale dell'istanza
+        checkpoint = snapshot_state([l1])
+    return sim, l1, vload, checkpoint
+
+def simulate_window(window, window_inputs):
+    """
+    Simula una iterazione della finestra sulla sua istanza, ripartendo dal
+    checkpoint di inizio finestra (stato dell'induttore di interfaccia), quindi
+    ogni iterazione costa quanto la finestra e non quanto l'intera simulazione
+    fino a quel punto.
+
+    Args:
+        window: Tupla (sim, l1, vload, checkpoint) di start_window_simulation
+        window_inputs: Tensioni da applicare nella finestra corrente
+
+    Returns:
+        tuple: (valori da inviare al LAB B per ogni step della finestra, checkpoint di fine finestra)
+
+    Raises:
+        RuntimeError: Se lo stato dell'induttore non viene ripristinato
+    """
+    sim, l1, vload, checkpoint = window
+    if not restore_state([l1], checkpoint):
+        raise RuntimeError("Checkpoint della finestra non ripristinato: stato dell'induttore non impostabile")
+    outputs = [solve_step(sim, l1, vload, voltage_phasor) for voltage_phasor in window_inputs]
+    return outputs, snapshot_state([l1])
+
+def run_waveform_relaxation():
+    """
+    Esegue la simulazione offline con waveform relaxation di Jacobi a finestre.
+    Per ogni finestra il LAB A simula l'intera finestra con la forma d'onda di tensione
+    dell'iterazione precedente del LAB B, scambia la forma d'onda di corrente completa
+    e itera finché la variazione relativa di entrambi i lab scende sotto WR_TOLERANCE.
+    """
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    server.bind((HOST_SOURCE, WR_PORT))
+    server.listen(1)
+    logger.info(f"Waveform relaxation: in attesa del LAB B sulla porta {WR_PORT}")
+    conn, addr = server.accept()
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    stream = conn.makefile('rw')
+    logger.info(f"Waveform relaxation: LAB B connesso da {addr[0]}")
+
+    inizio = time_module.perf_counter()
+    logger.info(f'LAB A TIMESTEP = {TIME_STEP_MILLIS} ms')
+    stats = {'windows': [], 'iterations': 0, 'messages': 0, 'bytes': 0, 'steps': ITERATIONS}
+    committed_inputs = []
+    committed_outputs = []
+    checkpoint = None
+
+    for start in range(0, ITERATIONS, WR_WINDOW_STEPS):
+        steps = min(WR_WINDOW_STEPS, ITERATIONS - start)
+        window = start_window_simulation(steps, checkpoint)
+        # Stima iniziale: mantiene l'ultima tensione consolidata
+        inputs = [committed_inputs[-1] if committed_inputs else complex(0, 0)]*steps
+        outputs = None
+        converged = False
+
+        for iteration in range(1, WR_MAX_ITERATIONS + 1):
+            previous_outputs = outputs
+            applied_inputs = inputs
+            try:
+                outputs, window_end = simulate_window(window, applied_inputs)
+            except RuntimeError as e:
+                logger.error(f"Waveform relaxation interrotta alla finestra {start}: {str(e)}")
+                stream.close()
+                conn.close()
+                server.close()
+                sys.exit(1)
+            delta = waveform_delta(outputs, previous_outputs)
+
+            reply = wr_exchange(stream, {
+                "window": start,
+                "iteration": iteration,
+                "delta": delta,
+                "values": encode_waveform(outputs)
+            }, send_first=False, stats=stats)
+            inputs = decode_waveform(reply['values'])
+
+            partner_delta = reply['delta']
+            if delta is not None and partner_delta is not None and max(delta, partner_delta) <= WR_TOLERANCE:
+                converged = True
+                break
+
+        stats['iterations'] += iteration
+        stats['windows'].append({
+            'start': start,
+            'steps': steps,
+            'iterations': iteration,
+            'delta': delta,
+            'partner_delta': partner_delta,
+            'converged': converged
+        })
+        logger.info(f"Finestra {start}-{start + steps}: {iteration} iterazioni, delta={delta}, convergente={converged}")
+        committed_inputs.extend(applied_inputs)
+        committed_outputs.extend(outputs)
+        checkpoint = window_end
+
+    stream.close()
+    conn.close()
+    server.close()
+
+    stats['elapsed_s'] = time_module.perf_counter() - inizio
+    write_wr_stats(stats)
+    write_waveform_log('current', committed_outputs)
+    write_waveform_log('voltage', committed_inputs)
     logger.info("Simulation completed")
     sys.exit()
 
+def parse_cpulist(spec):
+    """
+    Converte una cpulist ("4", "2-3,8") nell'insieme delle CPU.
+    """
+    cpus = set()
+    for part in spec.split(','):
+        if part.strip():
+            first, _, last = part.strip().partition('-')
+            cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
 def setup_realtime_scheduling():
+    if CPU_AFFINITY:
+        try:
+            os.sched_setaffinity(0, parse_cpulist(CPU_AFFINITY))
+            logger.info(f"Affinità CPU: {sorted(os.sched_getaffinity(0))}")
+        except (OSError, ValueError) as e:
+            logger.warning(f"Affinità CPU {CPU_AFFINITY} non applicata: {str(e)}")
     param = os.sched_param(os.sched_get_priority_max(os.SCHED_RR))
     os.sched_setscheduler(0, os.SCHED_RR, param)
     logger.info(f"Scheduling configurato: {os.sched_getscheduler(0)}")
 
 if __name__ == "__main__":
     logger.info(f"Iterations: {ITERATIONS}")
-    time_module.sleep(2)
+    if RUN_MODE == 'waveform_relaxation':
+        run_waveform_relaxation()
+    if POOL_MODE:
+        setup_realtime_scheduling()
+        run_pool()
+    if not START_BARRIER:
+        time_module.sleep(2)
     setup_realtime_scheduling()
     sim, l1, vload = start_simulation()
-    udp_receiver(sim, l1, vload)
+    spec = start_simulation('VILLAS_test_spec') if SPECULATIVE_MODE else None
+    udp_receiver(sim, l1, vload, spec)
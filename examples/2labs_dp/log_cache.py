@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+Cache colonnare dei log di simulazione
+
+Gli script di analisi leggono gli stessi log (JSON di VILLASnode, log dei compute
+node, CSV di DPSim) a ogni esecuzione. Qui ogni file viene analizzato una sola
+volta e convertito in colonne NumPy (un file .npy per colonna); le chiamate
+successive le aprono in memory-map, senza rileggere il testo. La voce è
+identificata da percorso, dimensione e mtime del file: un log riscritto viene
+analizzato di nuovo e la voce precedente eliminata.
+
+Utilizzo: from log_cache import load_columns
+          python3 log_cache.py [--stats] [--clear]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import logging
+import numpy as np
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('log_cache')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Configurazione
+LOG_CACHE_DIR = os.getenv('LOG_CACHE_DIR', os.path.join(BASE_DIR, '.log_cache'))
+LOG_CACHE_MAX_MB = float(os.getenv('LOG_CACHE_MAX_MB', '1000'))
+# Da incrementare quando cambia il formato delle colonne prodotte da un parser
+CACHE_VERSION = 2
+
+META_NAME = 'meta.json'
+MISSING = -1  # Valore delle colonne intere assenti in un campione
+
+# I log vengono letti a blocchi di CHUNK_BYTES (troncati all'ultima riga completa) e
+# analizzati con una sola regex per blocco: i valori finiscono direttamente in array NumPy
+CHUNK_BYTES = 16 * 1024 * 1024
+# lab_a: sequence, timestamp_ns di trasmissione
+PATTERN_TX = re.compile(rb"Campione:? ?(\d+)[ -]*\| trasmesso \| timestamp_ns=(\d+)")
+# lab_b: sequence, timestamp_ns di ricezione, kernel_ns (solo con KERNEL_TIMESTAMPS=true), ts origin [s, ns]
+# (i campi seguono l'ordine in cui li scrive il lab_b: la regex non deve cercarli nel resto della riga)
+PATTERN_RX = re.compile(rb"Campione:? ?(\d+)[ -]*\| ricevuto \| timestamp_ns=(\d+)"
+                        rb"(?: \| kernel_ns=(\d+))?(?: \| ts=\{[^\n]*?'origin': \[(\d+), (\d+)\])?")
+# Righe del formato json di VILLASnode, nell'ordine in cui le scrive il nodo file:
+# {"ts": {"origin": [s, ns], "received": [s, ns]}, "sequence": n, "data": [valore, ...]}
+# dove il primo valore è {"real": x, "imag": y} oppure un numero. Gruppi: origin s/ns,
+# received s/ns, sequence, real, imag, valore reale. Le righe con un'altra struttura
+# corrispondono all'ultima alternativa, che cattura solo il primo carattere (così la
+# matrice dei valori non si allarga): vengono poi decodificate una a una con json.loads
+_INT = rb'\s*(\d+)\s*'
+_NUMBER = rb'\s*(-?\d+(?:\.\d*)?(?:[eE][+-]?\d+)?)\s*'
+PATTERN_VILLAS = re.compile((
+    rb'^(?:\{\s*(?:"ts"\s*:\s*\{\s*'
+    rb'(?:"origin"\s*:\s*\[' + _INT + rb',' + _INT + rb'\]\s*,?\s*)?'
+    rb'(?:"received"\s*:\s*\[' + _INT + rb',' + _INT + rb'\]\s*)?'
+    rb'\}\s*,\s*)?'
+    rb'(?:"sequence"\s*:' + _INT + rb',\s*)?'
+    rb'"data"\s*:\s*\[\s*(?:\{\s*"real"\s*:' + _NUMBER + rb',\s*"imag"\s*:' + _NUMBER + rb'\}|' + _NUMBER + rb')'
+    rb'[^\n]*\]\s*\}\s*|(?=([^\n]?))[^\n]*)$'
+    # Tra i token al più uno spazio, come scrive jansson (compatto o con ", " e ": "):
+    # le righe formattate diversamente passano da json.loads
+).replace(rb'\s*', rb' ?'), re.MULTILINE)
+
+def read_blocks(path):
+    """
+    Legge il file a blocchi di circa CHUNK_BYTES che terminano sempre a fine riga.
+    """
+    tail = b''
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            data = tail + chunk
+            # L'ultima riga del blocco può essere incompleta: passa al blocco successivo
+            cut = data.rfind(b'\n') + 1
+            data, tail = data[:cut], data[cut:]
+            if data:
+                yield data
+    if tail:
+        yield tail
+
+def scan_log(path, pattern):
+    """
+    Estrae i gruppi della regex da tutto il file in un unico passaggio a blocchi.
+
+    Returns:
+        np.ndarray: Matrice int64 (righe, gruppi), MISSING dove un gruppo opzionale manca
+    """
+    blocks = []
+    for data in read_blocks(path):
+        matches = pattern.findall(data)
+        if matches:
+            values = np.array(matches, dtype=bytes).reshape(len(matches), -1)
+            values[values == b''] = str(MISSING).encode()
+            blocks.append(values.astype(np.int64))
+    if not blocks:
+        return np.empty((0, pattern.groups), dtype=np.int64)
+    return np.concatenate(blocks)
+
+def last_per_sequence(rows):
+    """
+    Tiene una sola riga per sequence (l'ultima, come un dizionario indicizzato per
+    sequence) e ordina per sequence.
+    """
+    if not len(rows):
+        return rows
+    order = np.argsort(rows[:, 0], kind='stable')
+    rows = rows[order]
+    last = np.append(rows[1:, 0] != rows[:-1, 0], True)
+    return rows[last]
+
+def parse_dpsim_tx(path):
+    """
+    Campioni trasmessi dal log di un compute node, ordinati per sequence.
+    """
+    rows = last_per_sequence(scan_log(path, PATTERN_TX))
+    return {'sequence': rows[:, 0], 'timestamp_ns': rows[:, 1]}
+
+def parse_dpsim_rx(path):
+    """
+    Campioni ricevuti dal log di un compute node, ordinati per sequence.
+    origin_ns è il ts origin di VILLASnode in nanosecondi.
+    """
+    rows = last_per_sequence(scan_log(path, PATTERN_RX))
+    origin = np.where(rows[:, 3] != MISSING, rows[:, 3]*1_000_000_000 + rows[:, 4], MISSING)
+    return {'sequence': rows[:, 0], 'timestamp_ns': rows[:, 1], 'kernel_ns': rows[:, 2], 'origin_ns': origin}
+
+def decode_villas_line(line):
+    """
+    Decodifica con json.loads una riga VILLAS che la regex non riconosce.
+
+    Returns:
+        tuple: Valori come bytes nell'ordine dei gruppi di PATTERN_VILLAS (b'' se
+               assenti), None se la riga non è valida
+    """
+    try:
+        data = json.loads(line)
+        value = data['data'][0]
+        ts = data.get('ts', {})
+        fields = []
+        for name in ('origin', 'received'):
+            fields += [int(part) for part in ts[name][:2]] if name in ts else [b'', b'']
+        fields.append(int(data['sequence']) if 'sequence' in data else b'')
+        if isinstance(value, dict):
+            fields += [float(value['real']), float(value['imag']), b'']
+        else:
+            fields += [b'', b'', float(value)]
+    except (json.JSONDecodeError, UnicodeDecodeError, KeyError, IndexError, TypeError, ValueError):
+        return None
+    return tuple(field if isinstance(field, bytes) else repr(field).encode() for field in fields)
+
+def parse_villas(path):
+    """
+    Log JSON di un nodo file di VILLASnode: una riga per campione, primo valore di data.
+
+    Tutto il file viene decodificato con una regex per blocco e convertito in
+    array in un'unica operazione; solo le righe con una struttura diversa passano
+    da json.loads. Le righe non valide vengono saltate e riportate.
+
+    Returns:
+        dict: sequence, origin_ns, received_ns (MISSING se assenti), real, imag e
+              complex (False se il valore non è complesso: imag vale 0)
+    """
+    blocks = []
+    skipped = 0
+    for data in read_blocks(path):
+        values = np.array(PATTERN_VILLAS.findall(data), dtype=bytes).reshape(-1, PATTERN_VILLAS.groups)
+        other = np.flatnonzero(values[:, -1] != b'')
+        if other.size:
+            # Ogni riga del blocco corrisponde a una riga della matrice
+            lines = data.split(b'\n')
+            values = values.astype(f"S{max(values.dtype.itemsize, 32)}")
+            for index in other:
+                decoded = decode_villas_line(lines[index])
+                if decoded is None:
+                    skipped += 1
+                else:
+                    values[index, :-1] = decoded
+        # Le righe vuote (e quelle saltate) non hanno né un valore complesso né uno reale
+        blocks.append(values[(values[:, 5] != b'') | (values[:, 7] != b''), :-1])
+    values = np.concatenate(blocks) if blocks else np.empty((0, PATTERN_VILLAS.groups - 1), dtype=bytes)
+    if skipped:
+        logger.warning(f"{skipped} righe non valide saltate in {path}")
+
+    integers = values[:, :5]
+    integers[integers == b''] = str(MISSING).encode()
+    integers = integers.astype(np.int64)
+    is_complex = values[:, 5] != b''
+    real = np.where(is_complex, values[:, 5], values[:, 7]).astype(np.float64)
+    imag = values[:, 6]
+    imag[~is_complex] = b'0'
+    imag = imag.astype(np.float64)
+
+    def nanoseconds(seconds, nanos):
+        return np.where(seconds != MISSING, seconds*1_000_000_000 + nanos, MISSING)
+
+    return {
+        'sequence': integers[:, 4],
+        'origin_ns': nanoseconds(integers[:, 0], integers[:, 1]),
+        'received_ns': nanoseconds(integers[:, 2], integers[:, 3]),
+        'real': real,
+        'imag': imag,
+        'complex': is_complex
+    }
+
+def parse_csv(path):
+    """
+    CSV di DPSim: una colonna float64 per colonna del file, nomi senza spazi.
+    """
+    import pandas as pd
+    data = pd.read_csv(path)
+    return {column.strip(): data[column].to_numpy(dtype=np.float64) for column in data.columns}
+
+# Tipi di file gestiti dalla cache
+PARSERS = {
+    'dpsim_tx': parse_dpsim_tx,
+    'dpsim_rx': parse_dpsim_rx,
+    'villas': parse_villas,
+    'csv': parse_csv
+}
+
+def entry_name(path, kind):
+    """
+    Nome della voce di cache: prefisso per file e tipo, suffisso per il contenuto.
+
+    Returns:
+        tuple: (prefisso comune alle versioni dello stesso file, nome completo)
+    """
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    prefix = f"{hashlib.sha256(real_path.encode()).hexdigest()[:16]}-{kind}"
+    content = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}:{CACHE_VERSION}".encode()).hexdigest()[:16]
+    return prefix, f"{prefix}-{content}"
+
+def read_meta(entry_dir):
+    """
+    Legge i metadati di una voce della cache, None se la voce è incompleta.
+    """
+    try:
+        with open(os.path.join(entry_dir, META_NAME)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def open_columns(entry_dir, meta):
+    """
+    Apre le colonne di una voce in memory-map (in sola lettura).
+    """
+    columns = {}
+    for name, length in meta['columns'].items():
+        path = os.path.join(entry_dir, f"{name}.npy")
+        # Un file vuoto non si può mappare in memoria
+        columns[name] = np.load(path, mmap_mode='r' if length else None)
+    return columns
+
+def store_columns(entry_dir, path, kind, columns, duration):
+    """
+    Scrive le colonne in una directory temporanea e la rinomina nella voce finale,
+    così un lettore concorrente non vede mai una voce parziale.
+    """
+    tmp_dir = f"{entry_dir}.tmp-{os.getpid()}-{time.monotonic_ns()}"
+    os.makedirs(tmp_dir)
+    try:
+        for name, values in columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), np.ascontiguousarray(values))
+        meta = {
+            'source': os.path.realpath(path),
+            'kind': kind,
+            'version': CACHE_VERSION,
+            'columns': {name: int(len(values)) for name, values in columns.items()},
+            'size': sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir)),
+            'parse_s': round(duration, 3),
+            'last_used': time.time()
+        }
+        with open(os.path.join(tmp_dir, META_NAME), 'w') as f:
+            json.dump(meta, f, indent=2)
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # Un altro processo ha scritto la stessa voce nel frattempo
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def list_entries():
+    """
+    Voci complete presenti nella cache.
+
+    Returns:
+        list: Coppie (directory, metadati)
+    """
+    if not os.path.isdir(LOG_CACHE_DIR):
+        return []
+    entries = []
+    for name in os.listdir(LOG_CACHE_DIR):
+        entry_dir = os.path.join(LOG_CACHE_DIR, name)
+        meta = read_meta(entry_dir) if '.tmp-' not in name else None
+        if meta is not None:
+            entries.append((entry_dir, meta))
+    return entries
+
+def evict(keep):
+    """
+    Elimina le voci usate meno di recente finché la cache supera LOG_CACHE_MAX_MB.
+
+    Args:
+        keep: Directory della voce appena usata, mai eliminata
+    """
+    limit = LOG_CACHE_MAX_MB*1024*1024
+    entries = sorted(list_entries(), key=lambda entry: entry[1].get('last_used', 0))
+    total = sum(meta['size'] for _, meta in entries)
+    for entry_dir, meta in entries:
+        if total <= limit:
+            break
+        if entry_dir == keep:
+            continue
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= meta['size']
+
+def load_columns(path, kind):
+    """
+    Colonne di un file di log, dalla cache se il file non è cambiato.
+
+    Args:
+        path: File da leggere
+        kind: Tipo del file, una chiave di PARSERS
+
+    Returns:
+        dict: Array NumPy per colonna (memory-map in sola lettura se dalla cache)
+    """
+    prefix, name = entry_name(path, kind)
+    entry_dir = os.path.join(LOG_CACHE_DIR, name)
+    meta = read_meta(entry_dir)
+    if meta is not None:
+        meta['last_used'] = time.time()
+        try:
+            with open(os.path.join(entry_dir, META_NAME), 'w') as f:
+                json.dump(meta, f, indent=2)
+        except OSError:
+            pass
+        return open_columns(entry_dir, meta)
+
+    inizio = time.monotonic()
+    columns = PARSERS[kind](path)
+    duration = time.monotonic() - inizio
+    os.makedirs(LOG_CACHE_DIR, exist_ok=True)
+    # Le versioni precedenti dello stesso file non verranno più lette
+    for other in os.listdir(LOG_CACHE_DIR):
+        if other.startswith(prefix) and other != name and '.tmp-' not in other:
+            shutil.rmtree(os.path.join(LOG_CACHE_DIR, other), ignore_errors=True)
+    store_columns(entry_dir, path, kind, columns, duration)
+    evict(entry_dir)
+    return columns
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Cache colonnare dei log di simulazione')
+    parser.add_argument('--stats', action='store_true',
+                        help='Mostra il contenuto della cache')
+    parser.add_argument('--clear', action='store_true',
+                        help='Svuota la cache')
+    return parser.parse_args()
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    if args.clear:
+        shutil.rmtree(LOG_CACHE_DIR, ignore_errors=True)
+        logger.info(f"Cache {LOG_CACHE_DIR} svuotata")
+        return
+    entries = sorted(list_entries(), key=lambda entry: entry[1].get('last_used', 0), reverse=True)
+    for _, meta in entries:
+        rows = max(meta['columns'].values(), default=0)
+        logger.info(
+            f"{meta['kind']:<9} | {rows} righe | {meta['size']/1024/1024:.1f} MiB | "
+            f"analisi {meta['parse_s']:.2f} s | {meta['source']}"
+        )
+    total = sum(meta['size'] for _, meta in entries)
+    logger.info(f"{len(entries)} voci, {total/1024/1024:.1f} MiB su {LOG_CACHE_MAX_MB:.0f} MiB in {LOG_CACHE_DIR}")
+
+if __name__ == "__main__":
+    main()
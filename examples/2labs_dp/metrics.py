@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Metriche di errore della simulazione distribuita rispetto al riferimento DPSim
+
+I log VILLAS possono contenere campioni persi, duplicati (le tensioni di
+bootstrap del LAB B) o iniziare in ritardo: confrontarli riga per riga con il
+CSV di riferimento sposta tutto il confronto. Ogni campione viene invece
+collocato nel tempo di simulazione, dal numero di sequenza oppure dal ts origin
+di VILLASnode, e confrontato con il riferimento interpolato in quell'istante.
+RMSE ed errore massimo di modulo e fase vengono calcolati per tutti i segnali
+con operazioni vettoriali.
+
+Utilizzo: python3 metrics.py --desf-dir lab_a/logs --dpsim-dir dpsim_local/logs [--align time]
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import argparse
+import logging
+import numpy as np
+
+from log_cache import load_columns, MISSING
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('metrics')
+
+# Configurazione
+# Sequence del primo passo accoppiato, collocato nel primo istante del riferimento
+METRICS_SEQUENCE_ORIGIN = int(os.getenv('METRICS_SEQUENCE_ORIGIN', '1'))
+# Durata reale di un passo, per l'allineamento sul ts origin (ritmo real-time dei compute node)
+TAU_MILLIS = float(os.getenv('TAU_MILLIS', '1'))
+
+# I fasori DP sono in valore di picco: i moduli vengono confrontati in valore efficace, come nei grafici
+RMS_SCALE = 1/math.sqrt(2)
+
+# Segnali del LAB A: prefisso del file di log VILLAS e colonne (.re/.im) del CSV di riferimento
+SIGNALS = {
+    'current': {'log': 'log_current', 'reference': 'r1.i_intf'},
+    'voltage': {'log': 'log_voltage', 'reference': 'n3.v'}
+}
+
+METRICS = ['samples', 'duplicates', 'lost', 'out_of_range',
+           'rmse_magnitude', 'max_error_magnitude', 'rmse_phase', 'max_error_phase']
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Errori della simulazione distribuita rispetto al riferimento DPSim')
+    parser.add_argument('--desf-dir', '-d', required=True,
+                        help='Directory contenente i file di log DESF')
+    parser.add_argument('--dpsim-dir', '-p', required=True,
+                        help='Directory contenente i file CSV di DPSim')
+    parser.add_argument('--align', choices=['sequence', 'time'], default='sequence',
+                        help='Collocazione dei campioni: numero di sequenza o ts origin (default: sequence)')
+    parser.add_argument('--sequence-origin', type=int, default=METRICS_SEQUENCE_ORIGIN,
+                        help=f'Sequence del primo istante del riferimento (default: {METRICS_SEQUENCE_ORIGIN})')
+    parser.add_argument('--tau-millis', type=float, default=TAU_MILLIS,
+                        help=f'Durata reale di un passo per --align time (default: {TAU_MILLIS})')
+    parser.add_argument('--output', '-o',
+                        help='File JSON in cui salvare le metriche')
+    return parser.parse_args()
+
+def most_recent(directory, pattern):
+    """
+    File più recente della directory il cui nome corrisponde alla regex, None se non ce ne sono.
+    """
+    if not os.path.isdir(directory):
+        return None
+    pattern_re = re.compile(pattern)
+    paths = [os.path.join(directory, name) for name in os.listdir(directory) if pattern_re.match(name)]
+    paths = [path for path in paths if os.path.isfile(path)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def reference_signals(reference, names):
+    """
+    Tempo e fasori complessi del riferimento.
+
+    Args:
+        reference: Colonne del CSV di DPSim (load_columns(..., 'csv'))
+        names: Prefissi delle colonne .re/.im dei segnali
+
+    Returns:
+        tuple: (tempi in secondi, matrice complessa righe x segnali)
+
+    Raises:
+        KeyError: Se manca una colonna
+    """
+    time = np.asarray(reference['time'], dtype=np.float64)
+    values = np.empty((len(time), len(names)), dtype=np.complex128)
+    for index, name in enumerate(names):
+        values[:, index].real = reference[f"{name}.re"]
+        values[:, index].imag = reference[f"{name}.im"]
+    return time, values
+
+def sample_times(samples, align, time_step, sequence_origin, tau):
+    """
+    Colloca i campioni di un log VILLAS nel tempo di simulazione.
+
+    Con 'sequence' il campione con sequence s cade in (s - sequence_origin)*time_step;
+    dei duplicati resta l'ultimo ricevuto. Con 'time' il tempo trascorso tra i ts
+    origin viene riportato al tempo di simulazione (un passo ogni tau secondi), a
+    partire dall'istante del primo campione dato dalla sua sequence (zero se assente).
+
+    Args:
+        samples: Colonne del log (load_columns(..., 'villas'))
+        align: 'sequence' o 'time'
+        time_step: Passo di simulazione in secondi
+        sequence_origin: Sequence del primo istante del riferimento
+        tau: Durata reale di un passo in secondi
+
+    Returns:
+        tuple: (tempi, valori complessi, duplicati scartati, sequence mancanti)
+
+    Raises:
+        ValueError: Se il log non ha i campi necessari all'allineamento
+    """
+    sequence = np.asarray(samples['sequence'])
+    values = np.asarray(samples['real']) + 1j*np.asarray(samples['imag'])
+    if align == 'sequence':
+        known = sequence != MISSING
+        if len(sequence) and not known.any():
+            raise ValueError("Il log non contiene numeri di sequenza: usare l'allineamento sul tempo")
+        sequence, values = sequence[known], values[known]
+        # Ultima occorrenza di ogni sequence, in ordine di sequence
+        order = np.argsort(sequence, kind='stable')
+        sequence, values = sequence[order], values[order]
+        last = np.append(sequence[1:] != sequence[:-1], True) if len(sequence) else np.empty(0, dtype=bool)
+        duplicates = int(len(sequence) - last.sum())
+        sequence, values = sequence[last], values[last]
+        lost = int(sequence[-1] - sequence[0] + 1 - len(sequence)) if len(sequence) else 0
+        return (sequence - sequence_origin)*time_step, values, duplicates, lost
+
+    origin = np.asarray(samples['origin_ns'])
+    known = origin != MISSING
+    if len(origin) and not known.any():
+        raise ValueError("Il log non contiene il ts origin: usare l'allineamento sulla sequence")
+    origin, values, sequence = origin[known], values[known], sequence[known]
+    if not len(origin):
+        return np.empty(0), values, 0, 0
+    order = np.argsort(origin, kind='stable')
+    origin, values, sequence = origin[order], values[order], sequence[order]
+    start = (sequence[0] - sequence_origin)*time_step if sequence[0] != MISSING else 0.0
+    return start + (origin - origin[0])/1e9*(time_step/tau), values, 0, 0
+
+def compare(signals, reference, align='sequence', time_step=None, sequence_origin=METRICS_SEQUENCE_ORIGIN, tau=TAU_MILLIS/1000):
+    """
+    Errori dei segnali distribuiti rispetto al riferimento DPSim.
+
+    Il riferimento viene interpolato linearmente (parte reale e immaginaria)
+    negli istanti dei campioni; i campioni fuori dall'intervallo simulato (oltre
+    mezzo passo) sono esclusi e contati. L'errore di fase è l'angolo tra i due
+    fasori, in gradi in (-180, 180], quindi non risente del salto a ±180.
+
+    Args:
+        signals: {nome: (colonne del log VILLAS, prefisso delle colonne del riferimento)}
+        reference: Colonne del CSV di riferimento
+        align: 'sequence' o 'time' (vedi sample_times)
+        time_step: Passo di simulazione in secondi (default: passo del riferimento)
+        sequence_origin: Sequence del primo istante del riferimento
+        tau: Durata reale di un passo in secondi, per align='time'
+
+    Returns:
+        dict: {nome: {metrica: valore}} con le metriche di METRICS (NaN senza campioni confrontabili)
+    """
+    names = list(signals)
+    time, expected_all = reference_signals(reference, [signals[name][1] for name in names])
+    if time_step is None:
+        time_step = float(time[1] - time[0]) if len(time) > 1 else 0.0
+
+    index, measured, expected = [], [], []
+    counts = {}
+    for position, name in enumerate(names):
+        times, values, duplicates, lost = sample_times(signals[name][0], align, time_step, sequence_origin, tau)
+        # Mezzo passo di tolleranza agli estremi: i tempi del CSV sono arrotondati
+        margin = time_step/2
+        inside = (times >= time[0] - margin) & (times <= time[-1] + margin) if len(time) else np.zeros(len(times), dtype=bool)
+        counts[name] = {'duplicates': duplicates, 'lost': lost, 'out_of_range': int((~inside).sum())}
+        times = times[inside]
+        index.append(np.full(len(times), position))
+        measured.append(values[inside])
+        expected.append(np.interp(times, time, expected_all[:, position].real)
+                        + 1j*np.interp(times, time, expected_all[:, position].imag))
+
+    # Riduzioni per segnale su tutti i campioni concatenati
+    index = np.concatenate(index)
+    measured = np.concatenate(measured)
+    expected = np.concatenate(expected)
+    error_magnitude = (np.abs(measured) - np.abs(expected))*RMS_SCALE
+    error_phase = np.degrees(np.angle(measured*np.conj(expected)))
+    samples = np.bincount(index, minlength=len(names))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rmse_magnitude = np.sqrt(np.bincount(index, error_magnitude**2, minlength=len(names))/samples)
+        rmse_phase = np.sqrt(np.bincount(index, error_phase**2, minlength=len(names))/samples)
+    max_magnitude = np.full(len(names), np.nan)
+    max_phase = np.full(len(names), np.nan)
+    max_magnitude[samples > 0] = 0.0
+    max_phase[samples > 0] = 0.0
+    np.maximum.at(max_magnitude, index, np.abs(error_magnitude))
+    np.maximum.at(max_phase, index, np.abs(error_phase))
+
+    return {
+        name: dict(
+            counts[name],
+            samples=int(samples[position]),
+            rmse_magnitude=float(rmse_magnitude[position]),
+            max_error_magnitude=float(max_magnitude[position]),
+            rmse_phase=float(rmse_phase[position]),
+            max_error_phase=float(max_phase[position])
+        )
+        for position, name in enumerate(names)
+    }
+
+def log_metrics(results):
+    """
+    Riporta la tabella delle metriche per segnale.
+    """
+    logger.info(f"{'Segnale':<10}" + ''.join(f"{metric:>21}" for metric in METRICS))
+    for name, result in results.items():
+        cells = ''.join(
+            f"{result[metric]:>21}" if isinstance(result[metric], int) else f"{result[metric]:>21.6g}"
+            for metric in METRICS
+        )
+        logger.info(f"{name:<10}{cells}")
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    csv_file = most_recent(args.dpsim_dir, r'.*\.csv$')
+    logs = {name: most_recent(args.desf_dir, rf"{signal['log']}.*\.log$") for name, signal in SIGNALS.items()}
+    if csv_file is None or None in logs.values():
+        logger.error(f"File non trovati: riferimento in {args.dpsim_dir}, log VILLAS in {args.desf_dir}")
+        sys.exit(1)
+    logger.info(f"File CSV DPSim: {csv_file}")
+    for name, path in logs.items():
+        logger.info(f"File {name} DESF: {path}")
+
+    try:
+        results = compare(
+            {name: (load_columns(path, 'villas'), SIGNALS[name]['reference']) for name, path in logs.items()},
+            load_columns(csv_file, 'csv'),
+            align=args.align,
+            sequence_origin=args.sequence_origin,
+            tau=args.tau_millis/1000
+        )
+    except (KeyError, ValueError) as e:
+        logger.error(f"Metriche non calcolabili: {str(e)}")
+        sys.exit(1)
+    log_metrics(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'align': args.align, 'reference': csv_file, 'logs': logs, 'signals': results}, f, indent=2)
+        logger.info(f"Metriche salvate in {args.output}")
+
+if __name__ == "__main__":
+    main()
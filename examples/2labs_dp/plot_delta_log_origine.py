@@ -1,10 +1,7 @@
-import re
 import matplotlib.pyplot as plt
 import numpy as np
 import seaborn as sns
 from scipy.stats import gaussian_kde
-import time
-from datetime import datetime
 
 
 # Seleziona automaticamente il file di log più recente
@@ -12,6 +9,7 @@ from datetime import datetime
 # --- Nuova versione: delay tra lab_a e lab_b usando timestamp_ns ---
 import glob
 import os
+from log_cache import load_columns, MISSING
 
 log_files_a = glob.glob('lab_a/app/logs/dpsim_log_lab_a_*.log')
 log_files_b = glob.glob('lab_b/app/logs/dpsim_log_lab_b_*.log')
@@ -22,71 +20,60 @@ log_file_a = max(log_files_a, key=os.path.getmtime)
 log_file_b = max(log_files_b, key=os.path.getmtime)
 print(f"Analizzo: {log_file_a} e {log_file_b}")
 
-import ast
-# Regex per estrarre sequence, timestamp_ns e ts
-pattern_a = re.compile(r"Campione:? ?(\d+)[ -]*\| trasmesso.*timestamp_ns=(\d+)")
-pattern_b = re.compile(r"Campione:? ?(\d+)[ -]*\| ricevuto.*timestamp_ns=(\d+).*ts=([^\n]+)")
-
-# Estrai {sequence: timestamp_ns} da lab_a
-seq2ns_a = {}
-with open(log_file_a, 'r') as f:
-    for line in f:
-        match = pattern_a.search(line)
-        if match:
-            sequence = int(match.group(1))
-            ts_ns = int(match.group(2))
-            seq2ns_a[sequence] = ts_ns
-
-# Estrai {sequence: (timestamp_ns, ts)} da lab_b
-seq2ns_b = {}
-seq2ts_b = {}
-with open(log_file_b, 'r') as f:
-    for line in f:
-        match = pattern_b.search(line)
-        if match:
-            sequence = int(match.group(1))
-            ts_ns = int(match.group(2))
-            ts_str = match.group(3).strip()
-            # ts_str è qualcosa come: {'origin': [1767534673, 277241046]}
-            try:
-                ts_dict = ast.literal_eval(ts_str)
-                if isinstance(ts_dict, dict) and 'origin' in ts_dict:
-                    sec, nsec = ts_dict['origin']
-                    ts_origin_ns = sec * 1_000_000_000 + nsec
-                    seq2ts_b[sequence] = ts_origin_ns
-            except Exception as e:
-                pass
-            seq2ns_b[sequence] = ts_ns
+# I log vengono analizzati una sola volta (lettura a blocchi con una regex per blocco,
+# valori direttamente in array NumPy) e conservati in log_cache: le esecuzioni
+# successive sugli stessi file aprono le colonne in memory-map
+tx = load_columns(log_file_a, 'dpsim_tx')
+rx = load_columns(log_file_b, 'dpsim_rx')
+
+def join_on_sequence(seqs_a, seqs_b):
+    """
+    Join vettoriale sulle sequence presenti in entrambi i log (ordinate e senza duplicati).
+
+    Returns:
+        tuple: (sequence comuni, indici in seqs_a, indici in seqs_b)
+    """
+    return np.intersect1d(seqs_a, seqs_b, assume_unique=True, return_indices=True)
 
 # Diagnostica: mostra i primi/ultimi 10 sequence
-seqs_a = sorted(seq2ns_a.keys())
-seqs_b = sorted(seq2ns_b.keys())
-print(f"Sequence in lab_a: {seqs_a[:10]} ... {seqs_a[-10:] if len(seqs_a)>10 else ''}")
-print(f"Sequence in lab_b: {seqs_b[:10]} ... {seqs_b[-10:] if len(seqs_b)>10 else ''}")
-seqs_common = sorted(set(seq2ns_a.keys()) & set(seq2ns_b.keys()))
-print(f"Sequence in comune: {seqs_common[:10]} ... {seqs_common[-10:] if len(seqs_common)>10 else ''}")
+seqs_a = tx['sequence']
+seqs_b = rx['sequence']
+print(f"Sequence in lab_a: {seqs_a[:10].tolist()} ... {seqs_a[-10:].tolist() if len(seqs_a)>10 else ''}")
+print(f"Sequence in lab_b: {seqs_b[:10].tolist()} ... {seqs_b[-10:].tolist() if len(seqs_b)>10 else ''}")
+seqs_common, index_a, index_b = join_on_sequence(seqs_a, seqs_b)
+print(f"Sequence in comune: {seqs_common[:10].tolist()} ... {seqs_common[-10:].tolist() if len(seqs_common)>10 else ''}")
+sent_a = tx['timestamp_ns'][index_a]
+received_b = rx['timestamp_ns'][index_b]
+kernel_b = rx['kernel_ns'][index_b]
 
 
 # Calcola il delay tra lab_a e lab_b (in ms)
-deltas = []
-for seq in seqs_common:
-    delay_ms = (seq2ns_b[seq] - seq2ns_a[seq]) / 1_000_000
-    deltas.append(delay_ms)
+deltas = (received_b - sent_a) / 1_000_000
 
 # Calcola il delay tra ricezione e ts origin (in ms)
-deltas_ts = []
-seqs_common_ts = sorted(set(seq2ts_b.keys()) & set(seq2ns_b.keys()))
-for seq in seqs_common_ts:
-    delay_ms = (seq2ns_b[seq] - seq2ts_b[seq]) / 1_000_000
-    deltas_ts.append(delay_ms)
+with_origin = rx['origin_ns'] != MISSING
+deltas_ts = (rx['timestamp_ns'][with_origin] - rx['origin_ns'][with_origin]) / 1_000_000
 
-if not deltas:
+if not deltas.size:
     print("Nessun delay calcolato tra lab_a e lab_b.")
     exit(1)
 
+# Con i timestamp del kernel il delay End-to-End si separa in:
+#   rete         -> dall'invio del lab_a alla ricezione nel kernel del lab_b
+#   elaborazione -> dalla ricezione nel kernel al timestamp applicativo del lab_b (parsing, scheduling)
+with_kernel = kernel_b != MISSING
+deltas_net = (kernel_b[with_kernel] - sent_a[with_kernel]) / 1_000_000
+deltas_proc = (received_b[with_kernel] - kernel_b[with_kernel]) / 1_000_000
+
+for label, values in (('End-to-End', deltas), ('Rete (kernel)', deltas_net), ('Elaborazione', deltas_proc)):
+    if values.size:
+        print(f"Delay {label}: media={np.mean(values):.3f} ms | p50={np.percentile(values, 50):.3f} ms | "
+              f"p99={np.percentile(values, 99):.3f} ms | max={np.max(values):.3f} ms")
+
 
 # 4 subplot: 2 istogrammi (conteggio), 2 PDF (KDE)
-fig, axs = plt.subplots(2, 2, figsize=(16, 12))
+# con i timestamp del kernel si aggiunge una riga con la separazione rete/elaborazione
+fig, axs = plt.subplots(3 if deltas_net.size else 2, 2, figsize=(16, 18 if deltas_net.size else 12))
 
 
 
@@ -103,7 +90,7 @@ axs[0,0].grid(True)
 if len(deltas) > 1:
     # Calcolo KDE manuale per avere x/y e massimo
     kde = gaussian_kde(deltas)
-    x_grid = np.linspace(min(deltas), max(deltas), 500)
+    x_grid = np.linspace(deltas.min(), deltas.max(), 500)
     y_grid = kde(x_grid)
     axs[0,1].plot(x_grid, y_grid, color='red', linewidth=2, label='PDF (KDE)')
     axs[0,1].fill_between(x_grid, y_grid, color='red', alpha=0.2)
@@ -123,7 +110,7 @@ else:
 
 
 # Terzo plot: delay tra ricezione e ts origin (conteggio)
-if deltas_ts:
+if deltas_ts.size:
     sns.histplot(deltas_ts, bins=50, color='orange', edgecolor='black', stat='count', label='Istogramma', ax=axs[1,0])
     axs[1,0].set_title('Analisi delay Villas nodes')
     axs[1,0].set_xlabel('delay [ms]')
@@ -133,7 +120,7 @@ if deltas_ts:
     # Quarto plot: PDF delay tra ricezione e ts origin
     if len(deltas_ts) > 1:
         kde2 = gaussian_kde(deltas_ts)
-        x2_grid = np.linspace(min(deltas_ts), max(deltas_ts), 500)
+        x2_grid = np.linspace(deltas_ts.min(), deltas_ts.max(), 500)
         y2_grid = kde2(x2_grid)
         axs[1,1].plot(x2_grid, y2_grid, color='blue', linewidth=2, label='PDF (KDE)')
         axs[1,1].fill_between(x2_grid, y2_grid, color='blue', alpha=0.2)
@@ -153,9 +140,21 @@ else:
     axs[1,0].set_title('Nessun dato ts origin trovato')
     axs[1,1].set_title('Nessun dato ts origin trovato')
 
+# Quinto e sesto plot: delay di rete e di elaborazione dai timestamp del kernel
+if deltas_net.size:
+    sns.histplot(deltas_net, bins=50, color='seagreen', edgecolor='black', stat='count', label='Istogramma', ax=axs[2,0])
+    axs[2,0].set_title('Delay di rete (invio lab_a - ricezione kernel lab_b)')
+    axs[2,0].set_xlabel('delay [ms]')
+    axs[2,0].set_ylabel('Occorrenze')
+    axs[2,0].legend()
+    axs[2,0].grid(True)
+    sns.histplot(deltas_proc, bins=50, color='purple', edgecolor='black', stat='count', label='Istogramma', ax=axs[2,1])
+    axs[2,1].set_title('Delay di elaborazione (ricezione kernel - timestamp applicativo lab_b)')
+    axs[2,1].set_xlabel('delay [ms]')
+    axs[2,1].set_ylabel('Occorrenze')
+    axs[2,1].legend()
+    axs[2,1].grid(True)
+
 plt.tight_layout()
 plt.show()
 
-now = datetime.now()
-timestamp_ns = time.time_ns()
-logger.info(f"Campione: {sequence} - | trasmesso | timestamp_ns={timestamp_ns}")
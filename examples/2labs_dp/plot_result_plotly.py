@@ -1,4 +1,3 @@
-import json
 import pandas as pd
 import numpy as np
 import math
@@ -9,29 +8,17 @@ import re
 from datetime import datetime
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
+from log_cache import load_columns
 
 def parse_log_file(filepath):
-    magnitudes = []
-    phases = []
-    
-    with open(filepath, 'r') as file:
-        for line in file:
-            try:
-                data = json.loads(line)
-                if isinstance(data['data'][0], dict):
-                    real = data['data'][0]['real']
-                    imag = data['data'][0]['imag']
-                    magnitude = (real**2 + imag**2)**0.5
-                    phase = np.angle(complex(real, imag))
-                else:
-                    magnitude = data['data'][0]
-                    phase = 0  # Se non è un numero complesso, la fase è 0
-                magnitudes.append(magnitude)
-                phases.append(phase)
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Errore durante l'elaborazione della riga: {line.strip()}")
-                print(f"Errore: {e}")
-    
+    """
+    Modulo e fase (in radianti) del primo valore di ogni campione di un log VILLAS.
+    Il file viene analizzato una sola volta e conservato in log_cache.
+    """
+    columns = load_columns(filepath, 'villas')
+    magnitudes = np.where(columns['complex'], np.hypot(columns['real'], columns['imag']), columns['real'])
+    # Se non è un numero complesso, la fase è 0
+    phases = np.where(columns['complex'], np.arctan2(columns['imag'], columns['real']), 0.0)
     return magnitudes, phases
 
 def get_most_recent_file(directory, pattern):
@@ -119,23 +106,20 @@ def main():
     voltage_dp_magnitudes, voltage_dp_phases = parse_log_file(voltage_file)
     
     # Dividi il modulo DP per sqrt(2)
-    current_dp_magnitudes = [magnitude / math.sqrt(2) for magnitude in current_dp_magnitudes]
-    voltage_dp_magnitudes = [magnitude / math.sqrt(2) for magnitude in voltage_dp_magnitudes]
+    current_dp_magnitudes = current_dp_magnitudes / math.sqrt(2)
+    voltage_dp_magnitudes = voltage_dp_magnitudes / math.sqrt(2)
     
     # Converti la fase da radianti a gradi
     current_dp_phases = np.degrees(current_dp_phases)
     voltage_dp_phases = np.degrees(voltage_dp_phases)
     
-    # Leggi il file CSV
+    # Leggi il file CSV (colonne dalla cache, nomi già senza spazi extra)
     try:
-        data = pd.read_csv(csv_file)
+        data = pd.DataFrame(load_columns(csv_file, 'csv'))
     except Exception as e:
         print(f"Errore durante la lettura del file CSV: {e}")
         return
 
-    # Rimuovi eventuali spazi extra dai nomi delle colonne
-    data.columns = data.columns.str.strip()
-
     # Calcola il modulo e la fase della tensione per n3.v.im e n3.v.re
     data['n3.v.magnitude'] = (data['n3.v.im']**2 + data['n3.v.re']**2)**0.5 / math.sqrt(2)
     data['n3.v.phase'] = np.degrees(np.angle(data['n3.v.re'] + 1j * data['n3.v.im']))
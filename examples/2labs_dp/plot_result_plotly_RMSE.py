@@ -1,4 +1,3 @@
-import json
 import pandas as pd
 import numpy as np
 import math
@@ -9,30 +8,18 @@ import re
 from datetime import datetime
 from plotly.subplots import make_subplots
 import plotly.graph_objects as go
-import matplotlib.pyplot as plt
+from log_cache import load_columns
+from metrics import compare, SIGNALS
 
 def parse_log_file(filepath):
-    magnitudes = []
-    phases = []
-    
-    with open(filepath, 'r') as file:
-        for line in file:
-            try:
-                data = json.loads(line)
-                if isinstance(data['data'][0], dict):
-                    real = data['data'][0]['real']
-                    imag = data['data'][0]['imag']
-                    magnitude = (real**2 + imag**2)**0.5
-                    phase = np.angle(complex(real, imag))
-                else:
-                    magnitude = data['data'][0]
-                    phase = 0  # Se non è un numero complesso, la fase è 0
-                magnitudes.append(magnitude)
-                phases.append(phase)
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Errore durante l'elaborazione della riga: {line.strip()}")
-                print(f"Errore: {e}")
-    
+    """
+    Modulo e fase (in radianti) del primo valore di ogni campione di un log VILLAS.
+    Il file viene analizzato una sola volta e conservato in log_cache.
+    """
+    columns = load_columns(filepath, 'villas')
+    magnitudes = np.where(columns['complex'], np.hypot(columns['real'], columns['imag']), columns['real'])
+    # Se non è un numero complesso, la fase è 0
+    phases = np.where(columns['complex'], np.arctan2(columns['imag'], columns['real']), 0.0)
     return magnitudes, phases
 
 def get_most_recent_file(directory, pattern):
@@ -94,27 +81,11 @@ def parse_arguments():
                         help='Titolo del grafico')
     parser.add_argument('--output', '-o', 
                         help='Percorso dove salvare il grafico come file HTML')
+    parser.add_argument('--align', choices=['sequence', 'time'], default='sequence',
+                        help='Allineamento dei campioni al riferimento: numero di sequenza o ts origin (default: sequence)')
     
     return parser.parse_args()
 
-def rmse(a, b):
-    a = np.array(a)
-    b = np.array(b)
-    min_len = min(len(a), len(b))
-    # Allineamento: considera solo la parte comune
-    a = a[:min_len]
-    b = b[:min_len]
-    # Eventuale rimozione di NaN
-    mask = ~np.isnan(a) & ~np.isnan(b)
-    print(np.mean(a), np.mean(b))
-    print(np.std(a), np.std(b))
-    #plt.plot(np.array(a)[:min_len] - np.array(b)[:min_len])
-    #plt.title("Differenza punto-punto")
-    #plt.show()
-    a_norm = (a - np.mean(a)) / np.std(a)
-    b_norm = (b - np.mean(b)) / np.std(b)
-    return np.sqrt(np.mean((a_norm[mask] - b_norm[mask]) ** 2))
-
 def main():
     # Analizza gli argomenti da riga di comando
     args = parse_arguments()
@@ -138,23 +109,21 @@ def main():
     voltage_dp_magnitudes, voltage_dp_phases = parse_log_file(voltage_file)
     
     # Dividi il modulo DP per sqrt(2)
-    current_dp_magnitudes = [magnitude / math.sqrt(2) for magnitude in current_dp_magnitudes]
-    voltage_dp_magnitudes = [magnitude / math.sqrt(2) for magnitude in voltage_dp_magnitudes]
+    current_dp_magnitudes = current_dp_magnitudes / math.sqrt(2)
+    voltage_dp_magnitudes = voltage_dp_magnitudes / math.sqrt(2)
     
     # Converti la fase da radianti a gradi
     current_dp_phases = np.degrees(current_dp_phases)
     voltage_dp_phases = np.degrees(voltage_dp_phases)
     
-    # Leggi il file CSV
+    # Leggi il file CSV (colonne dalla cache, nomi già senza spazi extra)
     try:
-        data = pd.read_csv(csv_file)
+        reference = load_columns(csv_file, 'csv')
+        data = pd.DataFrame(reference)
     except Exception as e:
         print(f"Errore durante la lettura del file CSV: {e}")
         return
 
-    # Rimuovi eventuali spazi extra dai nomi delle colonne
-    data.columns = data.columns.str.strip()
-
     # Calcola il modulo e la fase della tensione per n3.v.im e n3.v.re
     data['n3.v.magnitude'] = (data['n3.v.im']**2 + data['n3.v.re']**2)**0.5 / math.sqrt(2)
     data['n3.v.phase'] = np.degrees(np.angle(data['n3.v.re'] + 1j * data['n3.v.im']))
@@ -163,11 +132,19 @@ def main():
     data['r1.i.magnitude'] = (data['r1.i_intf.im']**2 + data['r1.i_intf.re']**2)**0.5 / math.sqrt(2)
     data['r1.i.phase'] = np.degrees(np.angle(data['r1.i_intf.re'] + 1j * data['r1.i_intf.im']))
 
-    # Calcola il RMSE DOPO aver ottenuto i dati
-    rmse_corrente_modulo = rmse(current_dp_magnitudes, data['r1.i.magnitude'])
-    rmse_corrente_fase = rmse(current_dp_phases, data['r1.i.phase'])
-    rmse_tensione_modulo = rmse(voltage_dp_magnitudes, data['n3.v.magnitude'])
-    rmse_tensione_fase = rmse(voltage_dp_phases, data['n3.v.phase'])
+    # Calcola il RMSE con i campioni allineati al riferimento (sequence o tempo), non riga per riga
+    errors = compare({
+        'current': (load_columns(current_file, 'villas'), SIGNALS['current']['reference']),
+        'voltage': (load_columns(voltage_file, 'villas'), SIGNALS['voltage']['reference'])
+    }, reference, align=args.align)
+    for signal, result in errors.items():
+        print(f"Errori {signal}: campioni={result['samples']} duplicati={result['duplicates']} persi={result['lost']} "
+              f"fuori intervallo={result['out_of_range']} | modulo max={result['max_error_magnitude']:.4f} | "
+              f"fase max={result['max_error_phase']:.4f} deg")
+    rmse_corrente_modulo = errors['current']['rmse_magnitude']
+    rmse_corrente_fase = errors['current']['rmse_phase']
+    rmse_tensione_modulo = errors['voltage']['rmse_magnitude']
+    rmse_tensione_fase = errors['voltage']['rmse_phase']
 
     # Creazione di una figura con più subplot
     fig = make_subplots(
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Client del pool di container DESF
+
+Con POOL_MODE=true i compute node restano in esecuzione tra una simulazione e
+l'altra e ricevono gli scenari da un canale di controllo TCP. Questo client
+legge l'elenco degli scenari, li invia a tutte le lab, attende che ciascuna
+abbia ricostruito la simulazione (READY), fa partire le lab nello stesso istante
+(START) e raccoglie l'esito di ogni scenario (COMPLETED) in un file JSONL.
+"""
+
+import os
+import sys
+import time
+import json
+import asyncio
+import logging
+from datetime import datetime
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('pool_client')
+
+# Configurazione
+POOL_LABS = [lab.strip() for lab in os.getenv('POOL_LABS', 'dpsim_lab_a:12020,dpsim_lab_b:12020').split(',') if lab.strip()]
+POOL_SCENARIOS = os.getenv('POOL_SCENARIOS', '/app/scenarios/scenarios.json')
+POOL_RESULTS_DIR = os.getenv('POOL_RESULTS_DIR', '/app/results')
+POOL_SHUTDOWN = os.getenv('POOL_SHUTDOWN', 'true').lower() == 'true'  # Chiude le lab al termine
+CONNECT_TIMEOUT = float(os.getenv('CONNECT_TIMEOUT', '60'))
+SETUP_TIMEOUT = float(os.getenv('SETUP_TIMEOUT', '30'))
+SCENARIO_TIMEOUT = float(os.getenv('SCENARIO_TIMEOUT', '120'))
+START_DELAY_MILLIS = float(os.getenv('START_DELAY_MILLIS', '200'))
+
+class ScenarioError(Exception):
+    """
+    Una lab ha rifiutato lo scenario o il comando ricevuto.
+    """
+
+async def connect_lab(address):
+    """
+    Si connette al canale di controllo di una lab, riprovando finché il
+    container non è in ascolto o fino a CONNECT_TIMEOUT.
+
+    Args:
+        address: Indirizzo "host:porta" della lab
+
+    Returns:
+        tuple: (reader, writer)
+    """
+    host, _, port = address.rpartition(':')
+    deadline = time.monotonic() + CONNECT_TIMEOUT
+    while True:
+        try:
+            reader, writer = await asyncio.open_connection(host, int(port))
+            logger.info(f"Connesso al pool su {address}")
+            return reader, writer
+        except OSError as e:
+            if time.monotonic() >= deadline:
+                raise ConnectionError(f"Lab {address} non raggiungibile entro {CONNECT_TIMEOUT} s: {str(e)}")
+            await asyncio.sleep(0.5)
+
+async def send_command(lab, command):
+    """
+    Invia un comando a una lab.
+    """
+    _, writer = lab
+    writer.write(json.dumps(command).encode() + b'\n')
+    await writer.drain()
+
+async def receive_reply(lab, address, expected):
+    """
+    Attende la risposta di una lab.
+
+    Args:
+        lab: Connessione (reader, writer)
+        address: Indirizzo della lab, per i messaggi
+        expected: Tipo di risposta atteso ('ready', 'completed', 'bye')
+
+    Returns:
+        dict: Risposta della lab
+
+    Raises:
+        ScenarioError: Se la lab risponde con un errore
+        ConnectionError: Se la lab chiude il canale di controllo
+    """
+    reader, _ = lab
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError(f"Canale di controllo di {address} chiuso")
+    reply = json.loads(line)
+    if reply.get('type') != expected:
+        raise ScenarioError(f"{address}: {reply.get('message', reply)}")
+    return reply
+
+async def exchange(labs, commands, expected, timeout):
+    """
+    Invia un comando a tutte le lab e ne attende le risposte in parallelo.
+
+    Args:
+        labs: Connessioni per indirizzo
+        commands: Comando per indirizzo
+        expected: Tipo di risposta atteso
+        timeout: Secondi entro cui devono rispondere tutte le lab
+
+    Returns:
+        dict: Risposte per indirizzo
+
+    Raises:
+        ScenarioError: Se almeno una lab risponde con un errore, dopo aver letto
+                       le risposte di tutte le altre (i canali restano allineati)
+    """
+    for address, lab in labs.items():
+        await send_command(lab, commands[address])
+    replies = await asyncio.wait_for(
+        asyncio.gather(*(receive_reply(lab, address, expected) for address, lab in labs.items()), return_exceptions=True),
+        timeout
+    )
+    for reply in replies:
+        if isinstance(reply, Exception):
+            raise reply
+    return dict(zip(labs, replies))
+
+def scenario_env(scenario, address):
+    """
+    Parametri di uno scenario per una lab: quelli comuni, sovrascritti da quelli
+    specifici della lab (chiave "labs", per host o indirizzo completo).
+    """
+    env = dict(scenario.get('env', {}))
+    host = address.rpartition(':')[0]
+    overrides = scenario.get('labs', {})
+    env.update(overrides.get(host, {}))
+    env.update(overrides.get(address, {}))
+    return env
+
+async def run_scenario(labs, scenario):
+    """
+    Esegue uno scenario su tutte le lab del pool.
+
+    Returns:
+        dict: Esito dello scenario (stato, tempi di preparazione ed esecuzione, risposte delle lab)
+    """
+    result = {'id': scenario['id'], 'env': scenario.get('env', {}), 'status': 'completed'}
+    inizio = time.monotonic()
+    try:
+        commands = {
+            address: {'type': 'scenario', 'id': scenario['id'], 'env': scenario_env(scenario, address)}
+            for address in labs
+        }
+        ready = await exchange(labs, commands, 'ready', SETUP_TIMEOUT)
+        result['setup_ms'] = round((time.monotonic() - inizio)*1000, 3)
+
+        start_at = time.time() + START_DELAY_MILLIS/1000
+        commands = {address: {'type': 'start', 'start_at': start_at} for address in labs}
+        completed = await exchange(labs, commands, 'completed', SCENARIO_TIMEOUT + START_DELAY_MILLIS/1000)
+        result['run_s'] = round(max(reply['duration_s'] for reply in completed.values()), 4)
+        result['labs'] = {reply['lab']: dict(reply, setup_ms=ready[address]['setup_ms']) for address, reply in completed.items()}
+        aborted = sorted(reply['lab'] for reply in completed.values() if reply.get('status') == 'aborted')
+        if aborted:
+            # Il watchdog ha interrotto lo scenario: le lab restano comunque sincronizzate
+            result['status'] = 'aborted'
+            result['error'] = f"interrotto dal watchdog su {', '.join(aborted)}"
+    except ScenarioError as e:
+        result['status'] = 'error'
+        result['error'] = str(e)
+    except asyncio.TimeoutError:
+        result['status'] = 'timeout'
+    result['total_s'] = round(time.monotonic() - inizio, 4)
+    return result
+
+def load_scenarios(path):
+    """
+    Legge l'elenco degli scenari: una lista JSON di oggetti {"id", "env", "labs"}.
+    """
+    with open(path) as f:
+        scenarios = json.load(f)
+    for index, scenario in enumerate(scenarios):
+        scenario.setdefault('id', f"scenario_{index + 1}")
+    return scenarios
+
+def log_result(result):
+    """
+    Riporta l'esito di uno scenario.
+    """
+    if result['status'] not in ('completed', 'aborted'):
+        logger.error(f"Scenario {result['id']}: {result['status']} {result.get('error', '')}".rstrip())
+        return
+    details = ' | '.join(
+        f"{lab}: overruns={reply['overruns']} timeouts={reply['timeouts']} lost={reply['lost']}"
+        for lab, reply in sorted(result['labs'].items())
+    )
+    log = logger.info if result['status'] == 'completed' else logger.error
+    log(
+        f"Scenario {result['id']}: {result['status']} | preparazione {result['setup_ms']:.1f} ms | "
+        f"esecuzione {result['run_s']:.3f} s | totale {result['total_s']:.3f} s | {details}"
+    )
+
+async def run_pool():
+    """
+    Ciclo principale del client del pool.
+
+    Returns:
+        int: Codice di uscita (0 se tutti gli scenari sono stati completati)
+    """
+    try:
+        scenarios = load_scenarios(POOL_SCENARIOS)
+    except (OSError, ValueError, AttributeError) as e:
+        logger.error(f"Impossibile leggere gli scenari da {POOL_SCENARIOS}: {str(e)}")
+        return 1
+    logger.info(f"{len(scenarios)} scenari da eseguire su {len(POOL_LABS)} lab: {', '.join(POOL_LABS)}")
+
+    labs = dict(zip(POOL_LABS, await asyncio.gather(*(connect_lab(address) for address in POOL_LABS))))
+
+    os.makedirs(POOL_RESULTS_DIR, exist_ok=True)
+    path = os.path.join(POOL_RESULTS_DIR, f"pool_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl")
+    exit_code = 0
+    synchronized = True
+    inizio = time.monotonic()
+    with open(path, 'w') as output:
+        for scenario in scenarios:
+            result = await run_scenario(labs, scenario)
+            output.write(json.dumps(result) + '\n')
+            output.flush()
+            log_result(result)
+            if result['status'] != 'completed':
+                exit_code = 1
+            if result['status'] == 'timeout':
+                # Una lab è ancora bloccata nello scenario: il pool non è più utilizzabile
+                logger.error("Lab non più sincronizzate con il client, interruzione degli scenari")
+                synchronized = False
+                break
+    logger.info(f"Scenari eseguiti in {time.monotonic() - inizio:.3f} s, risultati in {path}")
+
+    if POOL_SHUTDOWN and synchronized:
+        await exchange(labs, {address: {'type': 'shutdown'} for address in labs}, 'bye', SETUP_TIMEOUT)
+        logger.info("Lab del pool chiuse")
+    for _, writer in labs.values():
+        writer.close()
+    return exit_code
+
+def main():
+    """
+    Funzione principale.
+    """
+    try:
+        sys.exit(asyncio.run(run_pool()))
+    except KeyboardInterrupt:
+        logger.info("Interruzione manuale")
+        sys.exit(130)  # Codice di uscita standard per SIGINT
+    except Exception as e:
+        logger.error(f"Errore nel client del pool: {str(e)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
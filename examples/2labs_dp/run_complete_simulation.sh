@@ -42,8 +42,9 @@ echo
 # 1. Esegui la simulazione DPSim
 echo "===== AVVIO SIMULAZIONE DPSIM ====="
 cd dpsim_local
-# Esegui in background e reindirizza l'output
-sh run_simulation.sh > /tmp/dpsim_output.log 2>&1 &
+# Esegui in background e reindirizza l'output (il risultato viene riutilizzato
+# dalla cache se script, variabili e immagine non sono cambiati)
+python3 reference_cache.py > /tmp/dpsim_output.log 2>&1 &
 pid=$!
 show_spinner $pid "Esecuzione simulazione DPSim in corso..."
 echo "Simulazione DPSim completata"
@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+"""
+Orchestratore della pipeline di simulazione DESF + DPSim
+
+Esegue gli stessi passi di run_complete_simulation.sh modellati come grafo di
+dipendenze: ogni passo parte appena le sue dipendenze sono terminate con
+successo, quindi la simulazione di riferimento DPSim gira in parallelo a quella
+distribuita e i tre script di analisi girano in parallelo tra loro. Per ogni
+passo vengono registrati inizio, durata, codice di uscita e log dedicato.
+"""
+
+import os
+import re
+import sys
+import glob
+import json
+import time
+import asyncio
+import argparse
+import logging
+from datetime import datetime
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('orchestrator')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PYTHON = sys.executable or 'python3'
+
+# Righe dei log dei passi riportate nel riepilogo (file usati dagli script di analisi),
+# sia stampate con print sia emesse dal logger dopo timestamp e livello
+SUMMARY_PATTERN = re.compile(r'^(?:.* - )?File ')
+# Riepiloghi delle metriche scritti dal supervisore (volume ./metrics del compose)
+SUPERVISOR_METRICS_DIR = os.path.join(BASE_DIR, 'metrics')
+
+# Passi della pipeline: comando, directory di lavoro (relativa a BASE_DIR) e dipendenze
+STEPS = {
+    'clean': {
+        'command': ['sh', '-c', 'rm -f lab_a/logs/log_*.log lab_b/logs/log_*.log '
+                                'lab_a/app/logs/dpsim_log_*.log lab_b/app/logs/dpsim_log_*.log'],
+        'cwd': '.',
+        'deps': []
+    },
+    'reference': {
+        # Simulazione di riferimento DPSim, eseguita solo se non è già in cache
+        'command': [PYTHON, 'reference_cache.py'],
+        'cwd': 'dpsim_local',
+        'deps': []
+    },
+    'desf': {
+        # Il comando termina quando il supervisore ha fermato tutti i container, con
+        # codice 0 anche se la simulazione è fallita: l'esito è quello del supervisore
+        'command': ['docker', 'compose', 'up', '--build'],
+        'cwd': '.',
+        'deps': ['clean'],
+        'supervisor_summary': True
+    },
+    'plot_result': {
+        'command': [PYTHON, 'plot_result_plotly.py', '--desf-dir', 'lab_a/logs', '--dpsim-dir', 'dpsim_local/logs'],
+        'cwd': '.',
+        'deps': ['reference', 'desf']
+    },
+    'plot_rmse': {
+        'command': [PYTHON, 'plot_result_plotly_RMSE.py', '--desf-dir', 'lab_a/logs', '--dpsim-dir', 'dpsim_local/logs'],
+        'cwd': '.',
+        'deps': ['reference', 'desf']
+    },
+    'metrics': {
+        # Errori rispetto al riferimento con i campioni allineati per sequence
+        'command': [PYTHON, 'metrics.py', '--desf-dir', 'lab_a/logs', '--dpsim-dir', 'dpsim_local/logs'],
+        'cwd': '.',
+        'deps': ['reference', 'desf']
+    },
+    'plot_delay': {
+        'command': [PYTHON, 'plot_delta_log_origine.py', '--desf-dir', 'lab_b/logs', '--dpsim-dir', 'dpsim_local/logs'],
+        'cwd': '.',
+        'deps': ['desf']
+    },
+}
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Esegue la pipeline DESF + DPSim come grafo di dipendenze')
+    parser.add_argument('--skip', action='append', default=[], choices=list(STEPS),
+                        help='Passo da non eseguire, considerato già completato (ripetibile)')
+    parser.add_argument('--logs-dir', default=os.path.join(BASE_DIR, 'orchestrator_logs'),
+                        help='Directory dei log dei passi e del report')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Mostra il piano di esecuzione senza eseguire i passi')
+    return parser.parse_args()
+
+def execution_order(steps):
+    """
+    Ordina i passi in modo che ciascuno segua le proprie dipendenze.
+
+    Returns:
+        list: Nomi dei passi in ordine topologico
+
+    Raises:
+        ValueError: Se una dipendenza non esiste o il grafo contiene un ciclo
+    """
+    order = []
+    state = {}  # 'visiting' durante la visita, 'done' alla fine
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Ciclo tra i passi: {' -> '.join(path + [name])}")
+        state[name] = 'visiting'
+        for dep in steps[name]['deps']:
+            if dep not in steps:
+                raise ValueError(f"Il passo '{name}' dipende da '{dep}', che non esiste")
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in steps:
+        visit(name, [])
+    return order
+
+def supervisor_summaries():
+    """
+    Riepiloghi delle metriche del supervisore presenti su disco.
+    """
+    return set(glob.glob(os.path.join(SUPERVISOR_METRICS_DIR, 'metrics_summary_*.json')))
+
+def supervisor_outcome(previous):
+    """
+    Esito della simulazione distribuita dal riepilogo delle metriche del supervisore.
+
+    Args:
+        previous: Riepiloghi già presenti all'avvio del passo, ignorati
+
+    Returns:
+        tuple: (codice di uscita del supervisore, motivo), (None, None) se il riepilogo manca
+    """
+    paths = supervisor_summaries() - previous
+    if not paths:
+        return None, None
+    try:
+        with open(max(paths, key=os.path.getmtime)) as f:
+            summary = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+    return summary.get('exit_code'), summary.get('reason')
+
+async def run_command(name, step, logs_dir, results, started):
+    """
+    Esegue il comando di un passo, con stdout e stderr nel log dedicato.
+
+    Args:
+        name: Nome del passo
+        step: Definizione del passo in STEPS
+        logs_dir: Directory dei log
+        results: Esiti dei passi, aggiornato con quello del passo
+        started: Istante (monotonic) di avvio della pipeline
+    """
+    log_path = os.path.join(logs_dir, f"{name}.log")
+    result = results[name] = {'status': 'running', 'log': log_path}
+    inizio = time.monotonic()
+    result['start_s'] = round(inizio - started, 3)
+    previous_summaries = supervisor_summaries() if step.get('supervisor_summary') else set()
+    logger.info(f"Avvio del passo {name}: {' '.join(step['command'])}")
+    with open(log_path, 'w') as log_file:
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *step['command'],
+                cwd=os.path.join(BASE_DIR, step['cwd']),
+                stdout=log_file,
+                stderr=asyncio.subprocess.STDOUT
+            )
+        except OSError as e:
+            result.update(status='failed', exit_code=None, duration_s=0.0, error=str(e))
+            logger.error(f"Passo {name} non avviato: {str(e)}")
+            return
+        try:
+            exit_code = await process.wait()
+        except asyncio.CancelledError:
+            # Interruzione della pipeline: il processo non deve sopravvivere all'orchestratore
+            process.terminate()
+            await process.wait()
+            result.update(status='cancelled', exit_code=process.returncode,
+                          duration_s=round(time.monotonic() - inizio, 3))
+            raise
+    result.update(
+        status='ok' if exit_code == 0 else 'failed',
+        exit_code=exit_code,
+        duration_s=round(time.monotonic() - inizio, 3)
+    )
+    if exit_code == 0 and step.get('supervisor_summary'):
+        supervisor_exit, reason = supervisor_outcome(previous_summaries)
+        result.update(supervisor_exit_code=supervisor_exit, supervisor_reason=reason)
+        if supervisor_exit != 0:
+            result['status'] = 'failed'
+            result['error'] = (f"supervisore terminato con codice {supervisor_exit} ({reason})" if supervisor_exit is not None
+                               else f"riepilogo del supervisore assente in {SUPERVISOR_METRICS_DIR}")
+    if result['status'] == 'ok':
+        logger.info(f"Passo {name} completato in {result['duration_s']:.3f} s")
+    elif 'error' in result:
+        logger.error(f"Passo {name} fallito: {result['error']}, log in {log_path}")
+    else:
+        logger.error(f"Passo {name} fallito (exit code {exit_code}) dopo {result['duration_s']:.3f} s, log in {log_path}")
+
+async def run_graph(steps, skip, logs_dir):
+    """
+    Esegue i passi rispettando le dipendenze, con il massimo parallelismo consentito.
+
+    Un passo fallito non interrompe quelli indipendenti: i passi che ne dipendono
+    vengono saltati con stato 'dependency_failed'.
+
+    Returns:
+        tuple: (esiti per passo, durata complessiva in secondi)
+    """
+    results = {}
+    tasks = {}
+    started = time.monotonic()
+
+    async def execute(name):
+        step = steps[name]
+        if step['deps']:
+            await asyncio.gather(*(tasks[dep] for dep in step['deps']))
+        failed = [dep for dep in step['deps'] if results[dep]['status'] not in ('ok', 'skipped')]
+        if failed:
+            results[name] = {'status': 'dependency_failed', 'failed_deps': failed}
+            logger.warning(f"Passo {name} saltato: dipendenze non riuscite ({', '.join(failed)})")
+        elif name in skip:
+            results[name] = {'status': 'skipped'}
+            logger.info(f"Passo {name} saltato su richiesta")
+        else:
+            await run_command(name, step, logs_dir, results, started)
+
+    order = execution_order(steps)
+    for name in order:
+        tasks[name] = asyncio.ensure_future(execute(name))
+    try:
+        await asyncio.gather(*tasks.values())
+    finally:
+        for task in tasks.values():
+            task.cancel()
+    return {name: results[name] for name in order}, time.monotonic() - started
+
+def log_report(results, elapsed):
+    """
+    Riporta la tabella degli esiti e le righe salienti dei log dei passi.
+    """
+    logger.info(f"{'Passo':<14}{'Stato':<20}{'Exit':>6}{'Inizio s':>10}{'Durata s':>10}")
+    for name, result in results.items():
+        exit_code = result.get('exit_code')
+        start = result.get('start_s')
+        duration = result.get('duration_s')
+        logger.info(
+            f"{name:<14}{result['status']:<20}{'-' if exit_code is None else exit_code:>6}"
+            f"{'-' if start is None else f'{start:.3f}':>10}{'-' if duration is None else f'{duration:.3f}':>10}"
+        )
+    busy = sum(result.get('duration_s', 0.0) for result in results.values())
+    logger.info(f"Tempo totale {elapsed:.3f} s (somma delle durate dei passi {busy:.3f} s)")
+
+    for name, result in results.items():
+        if 'log' not in result or not os.path.isfile(result['log']):
+            continue
+        with open(result['log'], errors='replace') as f:
+            for line in f:
+                if SUMMARY_PATTERN.match(line):
+                    logger.info(f"[{name}] {line.rstrip()}")
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    try:
+        order = execution_order(STEPS)
+    except ValueError as e:
+        logger.error(f"Grafo dei passi non valido: {str(e)}")
+        sys.exit(1)
+
+    if args.dry_run:
+        for name in order:
+            step = STEPS[name]
+            state = ' (saltato)' if name in args.skip else ''
+            deps = ', '.join(step['deps']) or '-'
+            logger.info(f"{name}{state} | dipende da: {deps} | {step['cwd']}$ {' '.join(step['command'])}")
+        sys.exit(0)
+
+    os.makedirs(args.logs_dir, exist_ok=True)
+    logger.info("===== AVVIO SIMULAZIONE COMPLETA DESF + DPSIM =====")
+    try:
+        results, elapsed = asyncio.run(run_graph(STEPS, set(args.skip), args.logs_dir))
+    except KeyboardInterrupt:
+        logger.info("Interruzione manuale, passi in corso terminati")
+        sys.exit(130)  # Codice di uscita standard per SIGINT
+
+    log_report(results, elapsed)
+    report_path = os.path.join(args.logs_dir, f"run_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(report_path, 'w') as f:
+        json.dump({'elapsed_s': round(elapsed, 3), 'steps': results}, f, indent=2)
+    logger.info(f"Report salvato in {report_path}")
+
+    success = all(result['status'] in ('ok', 'skipped') for result in results.values())
+    logger.info("===== SIMULAZIONE COMPLETA TERMINATA =====" if success else "===== SIMULAZIONE TERMINATA CON ERRORI =====")
+    sys.exit(0 if success else 1)
+
+if __name__ == "__main__":
+    main()
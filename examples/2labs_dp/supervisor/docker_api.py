@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Client minimale asincrono per la Docker Engine API
+
+Parla HTTP/1.1 direttamente sul socket unix del demone Docker (nessuna dipendenza
+esterna e nessun processo `docker` da lanciare). Il percorso del socket è
+configurabile, così il supervisore può essere provato contro un server finto
+in ascolto su un socket locale.
+"""
+
+import json
+import struct
+import asyncio
+from urllib.parse import quote, urlencode
+
+# Header dei frame dei log multiplexati (container senza tty): stream, 3 byte nulli, lunghezza
+LOG_FRAME_HEADER = struct.Struct('>BxxxI')
+
+class DockerAPIError(Exception):
+    """
+    Risposta di errore (status HTTP >= 400) della Docker Engine API.
+    """
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+        self.message = message
+
+class DockerAPI:
+    """
+    Client per la Docker Engine API su socket unix.
+
+    Ogni richiesta usa una connessione dedicata (`Connection: close`), così gli
+    stream di lunga durata (eventi) non bloccano le altre richieste.
+    """
+
+    def __init__(self, socket_path='/var/run/docker.sock'):
+        self.socket_path = socket_path
+
+    async def _open(self, method, path, params=None):
+        """
+        Invia la richiesta e legge status e header della risposta.
+
+        Returns:
+            tuple: (reader, writer, status, headers)
+        """
+        reader, writer = await asyncio.open_unix_connection(self.socket_path)
+        query = f"?{urlencode(params)}" if params else ''
+        writer.write(
+            f"{method} {path}{query} HTTP/1.1\r\n"
+            f"Host: docker\r\n"
+            f"Connection: close\r\n"
+            f"Content-Length: 0\r\n\r\n".encode()
+        )
+        await writer.drain()
+
+        status_line = await reader.readline()
+        parts = status_line.split()
+        if len(parts) < 2:
+            writer.close()
+            raise DockerAPIError(0, f"Risposta non valida: {status_line!r}")
+        status = int(parts[1])
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        return reader, writer, status, headers
+
+    @staticmethod
+    async def _body_chunks(reader, headers):
+        """
+        Legge il corpo della risposta (chunked, Content-Length o fino a EOF).
+        """
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await reader.readline()
+                if not size_line:
+                    return
+                size = int(size_line.split(b';')[0].strip() or b'0', 16)
+                if size == 0:
+                    return
+                chunk = await reader.readexactly(size)
+                await reader.readline()  # CRLF di chiusura del chunk
+                yield chunk
+        elif 'content-length' in headers:
+            length = int(headers['content-length'])
+            if length:
+                yield await reader.readexactly(length)
+        else:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    return
+                yield chunk
+
+    async def stream(self, method, path, params=None):
+        """
+        Esegue una richiesta e restituisce il corpo della risposta a blocchi.
+
+        Raises:
+            DockerAPIError: Se il demone risponde con un errore
+        """
+        reader, writer, status, headers = await self._open(method, path, params)
+        try:
+            if status >= 400:
+                body = b''.join([chunk async for chunk in self._body_chunks(reader, headers)])
+                try:
+                    message = json.loads(body).get('message', '')
+                except ValueError:
+                    message = body.decode(errors='replace')
+                raise DockerAPIError(status, message)
+            async for chunk in self._body_chunks(reader, headers):
+                yield chunk
+        finally:
+            writer.close()
+
+    async def request(self, method, path, params=None):
+        """
+        Esegue una richiesta e restituisce il corpo JSON decodificato (None se vuoto).
+        """
+        body = b''.join([chunk async for chunk in self.stream(method, path, params)])
+        return json.loads(body) if body.strip() else None
+
+    async def inspect_container(self, name):
+        """
+        Restituisce il risultato di inspect del container, None se non esiste.
+        """
+        try:
+            return await self.request('GET', f"/containers/{quote(name)}/json")
+        except DockerAPIError as e:
+            if e.status == 404:
+                return None
+            raise
+
+    async def list_containers(self, filters, all=True):
+        """
+        Elenca i container che soddisfano i filtri indicati.
+
+        Args:
+            filters: Filtri dell'API, es. {'name': ['2labs_dp']}
+            all: Include anche i container non in esecuzione
+
+        Returns:
+            list: Riepiloghi dei container (Id, Names, State, Labels, ...)
+        """
+        params = {'all': int(all), 'filters': json.dumps(filters)}
+        return await self.request('GET', '/containers/json', params) or []
+
+    async def stop_container(self, name, timeout):
+        """
+        Ferma un container: SIGTERM e, dopo `timeout` secondi, SIGKILL da parte del demone.
+
+        Returns:
+            bool: False se il container era già fermo
+        """
+        try:
+            await self.request('POST', f"/containers/{quote(name)}/stop", {'t': int(timeout)})
+        except DockerAPIError as e:
+            if e.status == 304:
+                return False
+            raise
+        return True
+
+    async def kill_container(self, name, signal='SIGKILL'):
+        """
+        Invia un segnale al container.
+
+        Returns:
+            bool: False se il container non era in esecuzione
+        """
+        try:
+            await self.request('POST', f"/containers/{quote(name)}/kill", {'signal': signal})
+        except DockerAPIError as e:
+            if e.status == 409:
+                return False
+            raise
+        return True
+
+    async def events(self, filters, since=None):
+        """
+        Si sottoscrive allo stream degli eventi del demone.
+
+        Args:
+            filters: Filtri dell'API, es. {'type': ['container'], 'event': ['die']}
+            since: Timestamp UNIX da cui riprodurre gli eventi già avvenuti
+
+        Yields:
+            dict: Un evento per volta
+        """
+        params = {'filters': json.dumps(filters)}
+        if since is not None:
+            params['since'] = f"{since:.9f}"
+        buffer = b''
+        async for chunk in self.stream('GET', '/events', params):
+            buffer += chunk
+            while b'\n' in buffer:
+                line, buffer = buffer.split(b'\n', 1)
+                if line.strip():
+                    yield json.loads(line)
+
+    async def container_logs(self, name, tty, follow=True, since=None, timestamps=True):
+        """
+        Legge i log di un container riga per riga.
+
+        Senza tty il demone multiplexa stdout e stderr in frame con header di
+        8 byte; con tty lo stream è grezzo. Le righe spezzate tra frame o chunk
+        diversi vengono ricomposte.
+
+        Args:
+            name: Nome o ID del container
+            tty: True se il container è stato creato con tty (Config.Tty)
+            follow: Mantiene lo stream aperto finché il container è in esecuzione
+            since: Timestamp UNIX ("secondi.nanosecondi") da cui leggere i log
+            timestamps: Antepone a ogni riga il timestamp RFC3339Nano del demone
+
+        Yields:
+            tuple: (stream, riga) con stream 1 = stdout, 2 = stderr
+        """
+        params = {'stdout': 1, 'stderr': 1, 'follow': int(follow), 'timestamps': int(timestamps)}
+        if since is not None:
+            params['since'] = since
+        partial_lines = {}
+        pending = b''
+        async for chunk in self.stream('GET', f"/containers/{quote(name)}/logs", params):
+            if tty:
+                frames = [(1, chunk)]
+            else:
+                pending += chunk
+                frames = []
+                while len(pending) >= LOG_FRAME_HEADER.size:
+                    stream_type, size = LOG_FRAME_HEADER.unpack_from(pending)
+                    end = LOG_FRAME_HEADER.size + size
+                    if len(pending) < end:
+                        break
+                    frames.append((stream_type, pending[LOG_FRAME_HEADER.size:end]))
+                    pending = pending[end:]
+            for stream_type, payload in frames:
+                *lines, partial_lines[stream_type] = (partial_lines.get(stream_type, b'') + payload).split(b'\n')
+                for line in lines:
+                    yield stream_type, line.rstrip(b'\r').decode(errors='replace')
+        for stream_type, line in partial_lines.items():
+            if line:
+                yield stream_type, line.rstrip(b'\r').decode(errors='replace')
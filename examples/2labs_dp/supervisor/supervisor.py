@@ -2,18 +2,35 @@
 """
 Supervisore per container Docker DESF
 
-Questo script monitora lo stato dei container specificati e termina tutti
+Questo script monitora lo stato dei container del workbench e termina tutti
 i container quando uno di essi termina l'esecuzione.
+
+I container sono individuati dalle label: quelle di docker compose per il
+progetto del supervisore e quelle DESF (desf.workbench, desf.entity.type)
+per l'appartenenza al workbench e il ruolo di ciascun container.
+
+La terminazione dei container è rilevata dallo stream degli eventi della Docker
+Engine API (die/stop) sul socket del demone, senza polling. Il completamento della
+simulazione è rilevato seguendo in streaming i log di ciascun container, gli stalli
+dei compute node dall'assenza del loro heartbeat UDP; le metriche trasportate dagli
+heartbeat sono confrontate con le regole QoS per interrompere in anticipo le
+esecuzioni che hanno già superato le soglie accettabili.
 """
 
 import os
 import sys
 import time
+import re
 import json
+import math
 import signal
-import subprocess
+import asyncio
 import logging
-from datetime import datetime
+import operator
+from collections import deque
+from datetime import datetime, timezone
+
+from docker_api import DockerAPI, DockerAPIError
 
 # Configurazione logging
 logging.basicConfig(
@@ -26,284 +43,1007 @@ logging.basicConfig(
 logger = logging.getLogger('supervisor')
 
 # Configurazione
-PROJECT_NAME = os.getenv('PROJECT_NAME', '2labs_dp')
-CONTAINERS_TO_MONITOR = os.getenv('CONTAINERS_TO_MONITOR', 'dpsim_lab_a,dpsim_lab_b').split(',')
+PROJECT_NAME = os.getenv('PROJECT_NAME', '2labs_dp')  # Usato se il progetto del supervisore non è rilevabile
+WORKBENCH = os.getenv('WORKBENCH', '')  # Valore di desf.workbench da supervisionare (vuoto: qualsiasi)
+# Tipi di entità la cui terminazione arresta il workbench / i cui log segnalano il completamento
+EXIT_ENTITY_TYPES = [t.strip() for t in os.getenv('EXIT_ENTITY_TYPES', 'ComputeNode,CommunicationNode').split(',') if t.strip()]
+COMPLETION_ENTITY_TYPES = [t.strip() for t in os.getenv('COMPLETION_ENTITY_TYPES', 'ComputeNode').split(',') if t.strip()]
+DISCOVERY_TIMEOUT = float(os.getenv('DISCOVERY_TIMEOUT', '10.0'))
 CHECK_INTERVAL = float(os.getenv('CHECK_INTERVAL', '1.0'))
 GRACE_PERIOD = float(os.getenv('GRACE_PERIOD', '10.0'))
+STOP_TIMEOUT = float(os.getenv('STOP_TIMEOUT', '10.0'))  # Secondi tra SIGTERM e SIGKILL per ciascun container
+KILL_TIMEOUT = float(os.getenv('KILL_TIMEOUT', '5.0'))  # Margine oltre STOP_TIMEOUT prima del SIGKILL diretto
 COMPLETION_MESSAGE = os.getenv('COMPLETION_MESSAGE', 'Simulation completed')
+# Matcher di completamento nel formato "tipo:pattern;tipo:pattern" (default: substring COMPLETION_MESSAGE)
+COMPLETION_MATCHERS = os.getenv('COMPLETION_MATCHERS', '')
+DOCKER_SOCKET = os.getenv('DOCKER_SOCKET', '/var/run/docker.sock')
+# Heartbeat dei compute node: una lab è in stallo se tace per più di HEARTBEAT_TIMEOUT_MILLIS
+HEARTBEAT_PORT = int(os.getenv('HEARTBEAT_PORT', '12100'))
+HEARTBEAT_TIMEOUT_MILLIS = float(os.getenv('HEARTBEAT_TIMEOUT_MILLIS', '250'))
+HEARTBEAT_ACTIONS = ('stop', 'flag')
+HEARTBEAT_ACTION = os.getenv('HEARTBEAT_ACTION', 'stop').lower()
+# Barriera di partenza: START inviato quando tutti i compute node sono pronti
+START_DELAY_MILLIS = float(os.getenv('START_DELAY_MILLIS', '200'))
+START_BARRIER_TIMEOUT = float(os.getenv('START_BARRIER_TIMEOUT', '60'))
+COMPUTE_NODE_TYPE = 'ComputeNode'
+# Metriche aggregate dagli heartbeat (METRICS_DIR vuoto per disabilitarne il salvataggio)
+METRICS_DIR = os.getenv('METRICS_DIR', '/app/metrics')
+METRIC_BUCKETS_PER_OCTAVE = 4  # Deve coincidere con quello dei compute node
+CONTAINER_EVENTS = ['die', 'stop']
+# Regole QoS nel formato "metrica>soglia@finestra;...", es. "rtt_ms_p99>5@1s;timeouts>100"
+QOS_RULES = os.getenv('QOS_RULES', '')
+
+# Label di docker compose e DESF
+PROJECT_LABEL = 'com.docker.compose.project'
+SERVICE_LABEL = 'com.docker.compose.service'
+WORKBENCH_LABEL = 'desf.workbench'
+ENTITY_TYPE_LABEL = 'desf.entity.type'
+LABORATORY_LABEL = 'desf.laboratory'
+
+docker = DockerAPI(DOCKER_SOCKET)
+
+# Progetto compose, container del supervisore e membri del workbench individuati dalle label
+workbench = {
+    'project': PROJECT_NAME,
+    'self_id': None,
+    'members': {}
+}
+
+# Posizione (secondi, nanosecondi) dell'ultima riga di log esaminata per ciascun container
+log_cursors = {}
 
-def get_container_status(container_name):
+# Ultimo heartbeat ricevuto da ciascuna lab
+heartbeats = {}
+
+# Lab pronte (indirizzo a cui inviare START) e istante di partenza comune
+start_barrier = {
+    'ready': {},
+    'expected': 0,
+    'start_at': None,
+    'transport': None
+}
+
+# File della serie temporale delle metriche
+metrics_output = {
+    'series': None,
+    'timestamp': None,
+    'started': None
+}
+
+# Regole QoS, heartbeat recenti di ciascuna lab e prima violazione rilevata
+qos = {
+    'rules': [],
+    'history': {},
+    'breach': None
+}
+
+def substring_matcher(pattern):
+    """
+    Matcher che riconosce le righe contenenti il testo indicato.
     """
-    Ottiene lo stato di un container.
+    return lambda line: pattern in line
+
+def regex_matcher(pattern):
+    """
+    Matcher che riconosce le righe in cui l'espressione regolare trova una corrispondenza.
+    """
+    compiled = re.compile(pattern)
+    return lambda line: compiled.search(line) is not None
+
+MATCHER_TYPES = {
+    'substring': substring_matcher,
+    'regex': regex_matcher,
+}
+
+def build_matchers(spec):
+    """
+    Costruisce i matcher di completamento dalla configurazione.
     
     Args:
-        container_name: Nome del container
+        spec: Matcher nel formato "tipo:pattern;tipo:pattern", con tipo in MATCHER_TYPES
         
     Returns:
-        dict: Stato del container o None se non trovato
-    """
-    try:
-        cmd = ['docker', 'inspect', f"{PROJECT_NAME}-{container_name}-1", '--format', '{{json .State}}']
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.warning(f"Container {container_name} non trovato")
-            return None
+        list: Coppie (descrizione, matcher)
         
-        return json.loads(result.stdout)
-    except Exception as e:
-        logger.error(f"Errore nell'ispezione del container {container_name}: {str(e)}")
-        return None
+    Raises:
+        ValueError: Se un tipo di matcher non è supportato
+    """
+    if not spec.strip():
+        return [(COMPLETION_MESSAGE, substring_matcher(COMPLETION_MESSAGE))]
+    matchers = []
+    for entry in spec.split(';'):
+        if not entry.strip():
+            continue
+        kind, _, pattern = entry.partition(':')
+        kind = kind.strip().lower()
+        if kind not in MATCHER_TYPES:
+            raise ValueError(f"Matcher '{kind}' non supportato, usare uno tra: {', '.join(MATCHER_TYPES)}")
+        matchers.append((pattern, MATCHER_TYPES[kind](pattern)))
+    return matchers
 
-def get_container_logs(container_name, tail=10):
+# Metriche valutabili dalle regole QoS e relativo tipo di aggregazione
+QOS_METRICS = {
+    'step_ms_p50': 'percentile',
+    'step_ms_p90': 'percentile',
+    'step_ms_p99': 'percentile',
+    'rtt_ms_p50': 'percentile',
+    'rtt_ms_p90': 'percentile',
+    'rtt_ms_p99': 'percentile',
+    'step_ms_max': 'max',
+    'rtt_ms_max': 'max',
+    'timeouts': 'counter',
+    'lost': 'counter',
+    'overruns': 'counter',
+    'loss_pct': 'ratio',
+}
+
+QOS_OPERATORS = {
+    '>=': operator.ge,
+    '<=': operator.le,
+    '>': operator.gt,
+    '<': operator.lt,
+}
+
+QOS_RULE_PATTERN = re.compile(r'^([a-z0-9_]+)(>=|<=|>|<)([0-9.]+)(?:@([0-9.]+)(ms|s))?$')
+
+def build_qos_rules(spec):
     """
-    Ottiene gli ultimi log di un container.
+    Costruisce le regole QoS dalla configurazione.
+    
+    Senza finestra una regola è valutata sui valori cumulativi dall'inizio della
+    simulazione; con la finestra (es. "@1s", "@500ms") sugli heartbeat ricevuti
+    nell'ultimo intervallo, una volta che gli heartbeat coprono l'intera finestra.
     
     Args:
-        container_name: Nome del container
-        tail: Numero di righe da recuperare
+        spec: Regole nel formato "metrica>soglia@finestra;metrica>soglia", con
+              metrica in QOS_METRICS e operatore tra >, >=, <, <=
+        
+    Returns:
+        list: Regole (testo, metrica, operatore, soglia, finestra in secondi o None)
         
+    Raises:
+        ValueError: Se una regola non è valida
+    """
+    rules = []
+    for entry in spec.split(';'):
+        text = ''.join(entry.split())
+        if not text:
+            continue
+        match = QOS_RULE_PATTERN.match(text)
+        if match is None:
+            raise ValueError(f"Regola '{text}' non valida, formato atteso: metrica>soglia[@finestra(ms|s)]")
+        metric, op, threshold, window, unit = match.groups()
+        if metric not in QOS_METRICS:
+            raise ValueError(f"Metrica '{metric}' non supportata, usare una tra: {', '.join(QOS_METRICS)}")
+        if window is not None:
+            window = float(window)/(1000 if unit == 'ms' else 1)
+            if window <= 0:
+                raise ValueError(f"Finestra della regola '{text}' non valida")
+        rules.append({
+            'rule': text,
+            'metric': metric,
+            'op': op,
+            'threshold': float(threshold),
+            'window': window
+        })
+    return rules
+
+def parse_log_timestamp(timestamp):
+    """
+    Converte il timestamp RFC3339Nano anteposto dal demone alle righe di log.
+    
     Returns:
-        str: Log del container o stringa vuota se non trovato
+        tuple: (secondi UNIX, nanosecondi) o None se il formato non è valido
     """
     try:
-        cmd = ['docker', 'logs', f"{PROJECT_NAME}-{container_name}-1", '--tail', str(tail)]
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.warning(f"Impossibile ottenere i log del container {container_name}")
-            return ""
-        
-        return result.stdout
-    except Exception as e:
-        logger.error(f"Errore nel recupero dei log per {container_name}: {str(e)}")
-        return ""
+        base, _, fraction = timestamp.rstrip('Z').partition('.')
+        seconds = datetime.strptime(base, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+        return int(seconds), int((fraction + '000000000')[:9])
+    except ValueError:
+        return None
 
-def get_all_containers():
+async def get_all_containers():
     """
     Ottiene tutti i container del progetto.
     
     Returns:
-        list: Lista dei nomi dei container
+        list: Coppie (nome, in esecuzione) dei container
     """
     try:
-        cmd = ['docker', 'ps', '-a', '--filter', f"name={PROJECT_NAME}", '--format', '{{.Names}}']
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        
-        if result.returncode != 0:
-            logger.error(f"Errore nell'ottenere la lista dei container: {result.stderr}")
-            return []
+        containers = await docker.list_containers({'label': [f"{PROJECT_LABEL}={workbench['project']}"]})
         
         # Filtra il container supervisore stesso
-        containers = [c.strip() for c in result.stdout.split('\n') if c.strip()]
-        containers = [c for c in containers if 'supervisor' not in c]
-        return containers
+        result = []
+        for container in containers:
+            name = container.get('Names', ['?'])[0].lstrip('/')
+            if workbench['self_id'] is not None:
+                is_self = container.get('Id') == workbench['self_id']
+            else:
+                is_self = 'supervisor' in name
+            if not is_self:
+                result.append((name, container.get('State') == 'running'))
+        return result
     except Exception as e:
         logger.error(f"Errore nell'ottenere la lista dei container: {str(e)}")
         return []
 
-def stop_all_containers():
+async def stop_container(container, running):
+    """
+    Ferma un container entro un tempo limitato.
+    
+    Il demone invia SIGTERM e, dopo STOP_TIMEOUT secondi, SIGKILL. Se la richiesta
+    non si conclude entro ulteriori KILL_TIMEOUT secondi, il supervisore invia
+    direttamente SIGKILL.
+    
+    Args:
+        container: Nome del container
+        running: True se il container era in esecuzione
+        
+    Returns:
+        dict: Esito dell'arresto (container, outcome, seconds, exit_code, error)
+    """
+    inizio = time.monotonic()
+    report = {'container': container, 'outcome': 'already_stopped', 'exit_code': None, 'error': None}
+    if running:
+        logger.info(f"Arresto del container {container}...")
+        try:
+            stopped = await asyncio.wait_for(docker.stop_container(container, STOP_TIMEOUT), STOP_TIMEOUT + KILL_TIMEOUT)
+            report['outcome'] = 'stopped' if stopped else 'already_stopped'
+        except asyncio.TimeoutError:
+            logger.warning(f"Container {container} non arrestato entro {STOP_TIMEOUT + KILL_TIMEOUT} secondi, invio SIGKILL")
+            try:
+                await asyncio.wait_for(docker.kill_container(container), KILL_TIMEOUT)
+                report['outcome'] = 'killed'
+            except (asyncio.TimeoutError, DockerAPIError, OSError) as e:
+                report['outcome'] = 'error'
+                report['error'] = str(e) or type(e).__name__
+        except (DockerAPIError, OSError) as e:
+            report['outcome'] = 'error'
+            report['error'] = str(e)
+    
+    try:
+        info = await asyncio.wait_for(docker.inspect_container(container), KILL_TIMEOUT)
+        if info is not None:
+            report['exit_code'] = info.get('State', {}).get('ExitCode')
+    except (asyncio.TimeoutError, DockerAPIError, OSError):
+        pass
+    # 137 = SIGKILL inviato dal demone allo scadere di STOP_TIMEOUT
+    if report['outcome'] == 'stopped' and report['exit_code'] == 137:
+        report['outcome'] = 'killed'
+    report['seconds'] = time.monotonic() - inizio
+    return report
+
+async def stop_all_containers():
     """
-    Ferma tutti i container del progetto.
+    Ferma in parallelo tutti i container del progetto e riporta l'esito di ciascuno.
+    
+    Returns:
+        list: Esiti restituiti da stop_container()
     """
     try:
-        logger.info(f"Arresto di tutti i container del progetto {PROJECT_NAME}...")
+        logger.info(f"Arresto di tutti i container del progetto {workbench['project']}...")
+        inizio = time.monotonic()
         
         # Ottieni tutti i container del progetto
-        containers = get_all_containers()
+        containers = await get_all_containers()
         
         if not containers:
             logger.warning("Nessun container trovato da arrestare")
-            return
+            return []
         
-        # Arresta ogni container individualmente
-        for container in containers:
-            logger.info(f"Arresto del container {container}...")
-            cmd = ['docker', 'stop', container]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                logger.error(f"Errore nell'arresto del container {container}: {result.stderr}")
-            else:
-                logger.info(f"Container {container} arrestato con successo")
+        reports = await asyncio.gather(*(stop_container(name, running) for name, running in containers))
         
-        logger.info("Tutti i container sono stati arrestati con successo")
+        # Report finale
+        for report in sorted(reports, key=lambda report: report['container']):
+            message = (
+                f"Container {report['container']}: {report['outcome']} in {report['seconds']:.2f} s "
+                f"(exit code {report['exit_code']})"
+            )
+            if report['error']:
+                logger.error(f"{message} - {report['error']}")
+            else:
+                logger.info(message)
+        outcomes = [report['outcome'] for report in reports]
+        logger.info(
+            f"Arresto completato in {time.monotonic() - inizio:.2f} s | stopped={outcomes.count('stopped')} | "
+            f"killed={outcomes.count('killed')} | already_stopped={outcomes.count('already_stopped')} | "
+            f"error={outcomes.count('error')}"
+        )
+        return reports
     except Exception as e:
         logger.error(f"Errore nell'arresto dei container: {str(e)}")
+        return []
 
-def check_simulation_completed(container_name):
+def workbench_filters():
     """
-    Verifica se la simulazione è completata controllando i log.
+    Filtri per label dei container del workbench supervisionato.
+    """
+    workbench_label = f"{WORKBENCH_LABEL}={WORKBENCH}" if WORKBENCH else WORKBENCH_LABEL
+    return [f"{PROJECT_LABEL}={workbench['project']}", workbench_label]
+
+async def discover_project():
+    """
+    Individua il progetto compose del supervisore ispezionando il proprio container
+    (HOSTNAME è l'ID breve del container). Fuori da un container, o se il progetto
+    non è rilevabile, usa PROJECT_NAME.
+    """
+    hostname = os.getenv('HOSTNAME', '')
+    info = None
+    if hostname:
+        try:
+            info = await docker.inspect_container(hostname)
+        except (DockerAPIError, OSError) as e:
+            logger.warning(f"Impossibile ispezionare il container del supervisore: {str(e)}")
+    if info is not None:
+        workbench['self_id'] = info.get('Id')
+        project = (info.get('Config', {}).get('Labels') or {}).get(PROJECT_LABEL)
+        if project:
+            workbench['project'] = project
+            return
+    logger.info(f"Progetto compose del supervisore non rilevato, uso PROJECT_NAME={PROJECT_NAME}")
+
+async def discover_members():
+    """
+    Individua i container del workbench dalle label.
     
-    Args:
-        container_name: Nome del container
-        
     Returns:
-        bool: True se la simulazione è completata, False altrimenti
+        dict: Per ciascun container: servizio, tipo di entità, laboratorio e stato
     """
-    try:
-        logs = get_container_logs(container_name, tail=50)  # Aumentato il numero di righe da controllare
-        if not logs:
-            return False
-            
-        # Cerca il messaggio di completamento nei log
-        if COMPLETION_MESSAGE in logs:
-            logger.info(f"Messaggio '{COMPLETION_MESSAGE}' trovato nei log di {container_name}")
-            return True
-            
-        return False
-    except Exception as e:
-        logger.error(f"Errore nel controllo del completamento per {container_name}: {str(e)}")
-        return False
+    containers = await docker.list_containers({'label': workbench_filters()})
+    members = {}
+    for container in containers:
+        if container.get('Id') == workbench['self_id']:
+            continue
+        name = container.get('Names', ['?'])[0].lstrip('/')
+        labels = container.get('Labels') or {}
+        members[name] = {
+            'service': labels.get(SERVICE_LABEL, name),
+            'type': labels.get(ENTITY_TYPE_LABEL, 'Unknown'),
+            'laboratory': labels.get(LABORATORY_LABEL),
+            'running': container.get('State') == 'running'
+        }
+    return members
 
-def check_containers_status():
+async def wait_for_members():
     """
-    Verifica lo stato di tutti i container monitorati.
+    Ripete la discovery finché non compare almeno un container da monitorare,
+    per al più DISCOVERY_TIMEOUT secondi (compose può creare i container dopo il supervisore).
     
     Returns:
-        dict: Dizionario con lo stato di ciascun container
-    """
-    status = {}
-    for container_name in CONTAINERS_TO_MONITOR:
-        state = get_container_status(container_name)
-        if state is None:
-            # Container non trovato, potrebbe essere già terminato
-            status[container_name] = {
-                'running': False,
-                'exists': False
-            }
+        dict: Membri del workbench restituiti da discover_members()
+    """
+    deadline = time.monotonic() + DISCOVERY_TIMEOUT
+    while True:
+        members = await discover_members()
+        if any(member['type'] in EXIT_ENTITY_TYPES for member in members.values()):
+            return members
+        if time.monotonic() >= deadline:
+            return members
+        await asyncio.sleep(CHECK_INTERVAL)
+
+def members_of_type(entity_types):
+    """
+    Nomi dei container del workbench con uno dei tipi di entità indicati.
+    """
+    return sorted(name for name, member in workbench['members'].items() if member['type'] in entity_types)
+
+class HeartbeatProtocol(asyncio.DatagramProtocol):
+    """
+    Riceve gli heartbeat UDP e i messaggi READY della barriera inviati dai compute node.
+    """
+    
+    def connection_made(self, transport):
+        start_barrier['transport'] = transport
+    
+    def datagram_received(self, data, addr):
+        try:
+            payload = json.loads(data)
+            lab = payload['lab']
+        except (ValueError, KeyError, TypeError):
+            logger.warning(f"Heartbeat non valido da {addr[0]}: {data[:80]!r}")
+            return
+        if payload.get('type') == 'ready':
+            record_ready(lab, addr)
         else:
-            status[container_name] = {
-                'running': state.get('Running', False),
-                'exists': True,
-                'exit_code': state.get('ExitCode', None)
-            }
+            record_heartbeat(lab, payload)
+
+def record_ready(lab, addr):
+    """
+    Registra una lab pronta e sblocca la barriera quando lo sono tutti i compute node.
     
-    return status
+    Il READY viene ripetuto dalla lab finché non riceve START: dopo lo sblocco
+    ogni READY riceve di nuovo lo stesso istante di partenza.
+    """
+    ready = start_barrier['ready']
+    if lab not in ready:
+        logger.info(f"{lab} pronta ({len(ready) + 1}/{start_barrier['expected']})")
+    ready[lab] = addr
+    if start_barrier['start_at'] is not None:
+        send_start(addr)
+    elif len(ready) >= start_barrier['expected']:
+        release_start_barrier()
+
+def release_start_barrier():
+    """
+    Fissa l'istante di partenza comune e lo invia a tutte le lab pronte.
+    """
+    start_barrier['start_at'] = time.time() + START_DELAY_MILLIS/1000
+    logger.info(
+        f"Barriera di partenza sbloccata: {len(start_barrier['ready'])} lab partono tra {START_DELAY_MILLIS} ms "
+        f"({', '.join(sorted(start_barrier['ready']))})"
+    )
+    for addr in start_barrier['ready'].values():
+        send_start(addr)
+
+def send_start(addr):
+    """
+    Invia a una lab l'istante di partenza comune (timestamp UNIX).
+    """
+    message = json.dumps({'type': 'start', 'start_at': start_barrier['start_at']}).encode()
+    start_barrier['transport'].sendto(message, addr)
+
+async def watch_start_barrier():
+    """
+    Sblocca la barriera con le sole lab pronte se le altre non si presentano
+    entro START_BARRIER_TIMEOUT secondi.
+    """
+    await asyncio.sleep(START_BARRIER_TIMEOUT)
+    if start_barrier['start_at'] is None and start_barrier['ready']:
+        missing = start_barrier['expected'] - len(start_barrier['ready'])
+        logger.warning(f"Barriera di partenza: {missing} compute node non pronti entro {START_BARRIER_TIMEOUT} s")
+        release_start_barrier()
 
-def are_all_containers_stopped():
+def record_heartbeat(lab, payload):
     """
-    Verifica se tutti i container monitorati sono terminati.
+    Registra l'heartbeat di una lab.
+    
+    Args:
+        lab: Nome della lab che ha inviato l'heartbeat
+        payload: Contenuto dell'heartbeat (seq, state, sim_seq, sim_time, overruns)
+    """
+    entry = heartbeats.get(lab)
+    if entry is None:
+        logger.info(f"Primo heartbeat da {lab}")
+        entry = heartbeats[lab] = {'stalls': 0, 'stalled': False}
+    elif entry['stalled']:
+        logger.info(f"Heartbeat di {lab} ripreso dopo {time.monotonic() - entry['last']:.3f} s di silenzio")
+    entry['last'] = time.monotonic()
+    entry['payload'] = payload
+    entry['stalled'] = False
+    record_metrics(lab, entry, payload)
+    check_qos(lab, entry, payload)
+
+def merge_histogram(total, window):
+    """
+    Somma l'istogramma di una finestra (chiavi JSON stringa) a quello cumulativo.
+    """
+    for bucket, count in window.items():
+        total[int(bucket)] = total.get(int(bucket), 0) + count
+
+def histogram_percentile(histogram, p):
+    """
+    Percentile di un istogramma a bucket logaritmici.
     
     Returns:
-        bool: True se tutti i container sono terminati, False altrimenti
+        float: Limite superiore (ms) del bucket che contiene il percentile, None se vuoto
+    """
+    total = sum(histogram.values())
+    if not total:
+        return None
+    rank = math.ceil(p/100*total)
+    running = 0
+    for bucket in sorted(histogram):
+        running += histogram[bucket]
+        if running >= rank:
+            return round(2**((int(bucket) + 1)/METRIC_BUCKETS_PER_OCTAVE)/1000, 4)
+
+def open_metrics():
+    """
+    Apre il file della serie temporale delle metriche in METRICS_DIR.
+    """
+    metrics_output['started'] = datetime.now(timezone.utc)
+    if not METRICS_DIR:
+        return
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        metrics_output['timestamp'] = datetime.now().strftime("%Y%m%d_%H%M%S")
+        path = os.path.join(METRICS_DIR, f"metrics_{metrics_output['timestamp']}.jsonl")
+        metrics_output['series'] = open(path, 'w')
+        logger.info(f"Serie temporale delle metriche in {path}")
+    except OSError as e:
+        logger.error(f"Impossibile creare il file delle metriche: {str(e)}")
+
+def record_metrics(lab, entry, payload):
     """
-    status = check_containers_status()
+    Aggiorna le metriche cumulative di una lab e aggiunge una riga alla serie temporale.
     
-    # Conta quanti container sono ancora in esecuzione
-    running_containers = [name for name, state in status.items() if state['running']]
+    Args:
+        lab: Nome della lab
+        entry: Stato della lab in heartbeats
+        payload: Heartbeat ricevuto
+    """
+    now = time.monotonic()
+    steps = payload.get('steps', 0)
+    metrics = entry.get('metrics')
+    if metrics is None:
+        metrics = entry['metrics'] = {
+            'step_ms': {},
+            'rtt_ms': {},
+            'step_max_ms': 0.0,
+            'rtt_max_ms': 0.0,
+            'first': (now, steps),
+            'previous': (now, steps)
+        }
+    window_step = payload.get('step_ms', {})
+    window_rtt = payload.get('rtt_ms', {})
+    merge_histogram(metrics['step_ms'], window_step)
+    merge_histogram(metrics['rtt_ms'], window_rtt)
+    metrics['step_max_ms'] = max(metrics['step_max_ms'], payload.get('step_max_ms', 0.0))
+    metrics['rtt_max_ms'] = max(metrics['rtt_max_ms'], payload.get('rtt_max_ms', 0.0))
+    
+    previous_time, previous_steps = metrics['previous']
+    elapsed = now - previous_time
+    metrics['previous'] = (now, steps)
     
-    if not running_containers:
-        logger.info("Tutti i container monitorati sono terminati")
-        return True
-    else:
-        logger.debug(f"Container ancora in esecuzione: {', '.join(running_containers)}")
-        return False
+    if metrics_output['series'] is None:
+        return
+    received = payload.get('received', 0)
+    lost = payload.get('lost', 0)
+    row = {
+        'time': time.time(),
+        'lab': lab,
+        'seq': payload.get('seq'),
+        'state': payload.get('state'),
+        'sim_seq': payload.get('sim_seq'),
+        'sim_time': payload.get('sim_time'),
+        'steps': steps,
+        'step_rate_hz': round((steps - previous_steps)/elapsed, 1) if elapsed > 0 else None,
+        'step_ms_p50': histogram_percentile(window_step, 50),
+        'step_ms_p99': histogram_percentile(window_step, 99),
+        'step_ms_max': round(payload.get('step_max_ms', 0.0), 4),
+        'rtt_ms_p50': histogram_percentile(window_rtt, 50),
+        'rtt_ms_p99': histogram_percentile(window_rtt, 99),
+        'rtt_ms_max': round(payload.get('rtt_max_ms', 0.0), 4),
+        'timeouts': payload.get('timeouts'),
+        'received': received,
+        'lost': lost,
+        'loss_pct': round(100*lost/(received + lost), 3) if received + lost else 0.0,
+        'overruns': payload.get('overruns')
+    }
+    metrics_output['series'].write(json.dumps(row) + '\n')
 
-def is_any_container_stopped():
+def qos_value(rule, entry, history):
     """
-    Verifica se almeno uno dei container monitorati è terminato.
+    Calcola il valore della metrica di una regola QoS.
     
+    Args:
+        rule: Regola restituita da build_qos_rules()
+        entry: Stato della lab in heartbeats
+        history: Heartbeat recenti della lab, coppie (istante, payload)
+        
     Returns:
-        tuple: (terminato, nome_container)
+        float: Valore della metrica, None se non ancora valutabile
     """
-    status = check_containers_status()
+    metric = rule['metric']
+    kind = QOS_METRICS[metric]
+    name, _, aggregate = metric.rpartition('_')
     
-    # Verifica se c'è almeno un container che esiste ma non è in esecuzione
-    for name, state in status.items():
-        if state['exists'] and not state['running']:
-            logger.info(f"Container {name} è terminato")
-            return True, name
+    if rule['window'] is None:
+        # Valori cumulativi dall'inizio della simulazione
+        payload = entry['payload']
+        metrics = entry['metrics']
+        if kind == 'percentile':
+            return histogram_percentile(metrics[name], int(aggregate[1:]))
+        if kind == 'max':
+            return metrics[f"{name}_max_ms"]
+        if kind == 'counter':
+            return payload.get(metric, 0)
+        received, lost = payload.get('received', 0), payload.get('lost', 0)
+        return 100*lost/(received + lost) if received + lost else 0.0
     
-    return False, None
+    # Heartbeat della finestra e ultimo heartbeat precedente, base per i contatori
+    start = history[-1][0] - rule['window']
+    if history[0][0] > start:
+        return None  # Gli heartbeat non coprono ancora l'intera finestra
+    base = 0
+    while base + 1 < len(history) and history[base + 1][0] <= start:
+        base += 1
+    window = [payload for _, payload in list(history)[base + 1:]]
+    if not window:
+        return None
+    if kind == 'percentile':
+        histogram = {}
+        for payload in window:
+            merge_histogram(histogram, payload.get(name, {}))
+        return histogram_percentile(histogram, int(aggregate[1:]))
+    if kind == 'max':
+        return max(payload.get(f"{name}_max_ms", 0.0) for payload in window)
+    first, last = history[base][1], window[-1]
+    if kind == 'counter':
+        return last.get(metric, 0) - first.get(metric, 0)
+    received = last.get('received', 0) - first.get('received', 0)
+    lost = last.get('lost', 0) - first.get('lost', 0)
+    return 100*lost/(received + lost) if received + lost else 0.0
 
-def main():
+def check_qos(lab, entry, payload):
     """
-    Funzione principale.
+    Valuta le regole QoS all'arrivo di un heartbeat e registra la prima violazione.
+    
+    Args:
+        lab: Nome della lab
+        entry: Stato della lab in heartbeats
+        payload: Heartbeat ricevuto
+    """
+    if not qos['rules'] or qos['breach'] is None or qos['breach'].done():
+        return
+    history = qos['history'].setdefault(lab, deque())
+    now = time.monotonic()
+    history.append((now, payload))
+    # Conserva la finestra più lunga più un heartbeat precedente come base
+    longest = max((rule['window'] or 0) for rule in qos['rules'])
+    while len(history) > 1 and history[1][0] <= now - longest:
+        history.popleft()
+    
+    for rule in qos['rules']:
+        value = qos_value(rule, entry, history)
+        if value is None or not QOS_OPERATORS[rule['op']](value, rule['threshold']):
+            continue
+        logger.error(
+            f"Regola QoS '{rule['rule']}' violata da {lab}: valore {value:.4g} "
+            f"(sim_seq={payload.get('sim_seq')}, sim_time={payload.get('sim_time')} s)"
+        )
+        qos['breach'].set_result({
+            'rule': rule['rule'],
+            'lab': lab,
+            'value': round(value, 4),
+            'sim_seq': payload.get('sim_seq'),
+            'sim_time': payload.get('sim_time')
+        })
+        return
+
+def write_metrics_summary(reason, exit_code):
+    """
+    Chiude la serie temporale e scrive il riepilogo delle metriche di tutto il workbench.
+    
+    Args:
+        reason: Motivo della terminazione del workbench
+        exit_code: Codice di uscita del supervisore
+    """
+    if metrics_output['series'] is None:
+        return
+    metrics_output['series'].close()
+    
+    labs = {}
+    for lab, entry in sorted(heartbeats.items()):
+        payload = entry['payload']
+        metrics = entry['metrics']
+        first_time, first_steps = metrics['first']
+        duration = entry['last'] - first_time
+        received = payload.get('received', 0)
+        lost = payload.get('lost', 0)
+        labs[lab] = {
+            'state': payload.get('state'),
+            'sim_seq': payload.get('sim_seq'),
+            'sim_time': payload.get('sim_time'),
+            'steps': payload.get('steps'),
+            'duration_s': round(duration, 3),
+            'step_rate_hz': round((payload.get('steps', 0) - first_steps)/duration, 1) if duration > 0 else None,
+            'step_ms': {
+                'p50': histogram_percentile(metrics['step_ms'], 50),
+                'p90': histogram_percentile(metrics['step_ms'], 90),
+                'p99': histogram_percentile(metrics['step_ms'], 99),
+                'max': round(metrics['step_max_ms'], 4)
+            },
+            'rtt_ms': {
+                'p50': histogram_percentile(metrics['rtt_ms'], 50),
+                'p90': histogram_percentile(metrics['rtt_ms'], 90),
+                'p99': histogram_percentile(metrics['rtt_ms'], 99),
+                'max': round(metrics['rtt_max_ms'], 4)
+            },
+            'timeouts': payload.get('timeouts'),
+            'received': received,
+            'lost': lost,
+            'loss_pct': round(100*lost/(received + lost), 3) if received + lost else 0.0,
+            'overruns': payload.get('overruns'),
+            'stalls': entry['stalls'],
+            'heartbeats': payload.get('seq')
+        }
+    summary = {
+        'project': workbench['project'],
+        'started': metrics_output['started'].isoformat(),
+        'finished': datetime.now(timezone.utc).isoformat(),
+        'reason': reason,
+        'exit_code': exit_code,
+        'qos': {
+            'rules': [rule['rule'] for rule in qos['rules']],
+            'breach': qos['breach'].result() if qos['breach'] is not None and qos['breach'].done() else None
+        },
+        'labs': labs
+    }
+    path = os.path.join(METRICS_DIR, f"metrics_summary_{metrics_output['timestamp']}.json")
+    try:
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        logger.info(f"Riepilogo delle metriche salvato in {path}")
+    except OSError as e:
+        logger.error(f"Impossibile salvare il riepilogo delle metriche: {str(e)}")
+
+async def watch_heartbeats():
+    """
+    Rileva le lab in stallo: una lab è sorvegliata dal primo heartbeat fino a quello
+    con stato finale, e va in stallo se tace per più di HEARTBEAT_TIMEOUT_MILLIS.
+    
+    Returns:
+        str: Nome della lab in stallo (solo con HEARTBEAT_ACTION=stop)
+    """
+    timeout = HEARTBEAT_TIMEOUT_MILLIS/1000
+    while True:
+        await asyncio.sleep(timeout/4)
+        now = time.monotonic()
+        for lab, entry in heartbeats.items():
+            if entry['stalled'] or entry['payload'].get('state') != 'running':
+                continue
+            silence = now - entry['last']
+            if silence > timeout:
+                entry['stalled'] = True
+                entry['stalls'] += 1
+                payload = entry['payload']
+                logger.warning(
+                    f"Stallo di {lab}: nessun heartbeat da {silence*1000:.0f} ms "
+                    f"(sim_seq={payload.get('sim_seq')}, sim_time={payload.get('sim_time')} s, "
+                    f"overruns={payload.get('overruns')})"
+                )
+                if HEARTBEAT_ACTION == 'stop':
+                    return lab
+
+def log_heartbeat_summary():
+    """
+    Riporta gli stalli rilevati durante l'esecuzione.
+    """
+    for lab, entry in sorted(heartbeats.items()):
+        payload = entry['payload']
+        logger.info(
+            f"Heartbeat {lab} | stato={payload.get('state')} | sim_seq={payload.get('sim_seq')} | "
+            f"sim_time={payload.get('sim_time')} s | overruns={payload.get('overruns')} | stalli={entry['stalls']}"
+        )
+
+async def wait_for_container_exit(since):
+    """
+    Attende la terminazione di uno dei container monitorati dallo stream degli eventi.
+    
+    Args:
+        since: Timestamp UNIX da cui considerare gli eventi, così da non perdere
+               le terminazioni avvenute durante la verifica iniziale
+        
+    Returns:
+        str: Nome del container terminato
+    """
+    watched = set(members_of_type(EXIT_ENTITY_TYPES))
+    filters = {'type': ['container'], 'event': CONTAINER_EVENTS, 'label': workbench_filters()}
+    async for event in docker.events(filters, since=since):
+        attributes = event.get('Actor', {}).get('Attributes', {})
+        container_name = attributes.get('name')
+        if container_name not in watched:
+            continue
+        entity_type = workbench['members'][container_name]['type']
+        action = event.get('Action', event.get('status'))
+        exit_code = attributes.get('exitCode')
+        if exit_code is not None:
+            logger.info(f"Container {container_name} ({entity_type}) è terminato (evento {action}, exit code {exit_code})")
+        else:
+            logger.info(f"Container {container_name} ({entity_type}) è terminato (evento {action})")
+        return container_name
+    raise ConnectionError("Stream degli eventi Docker interrotto")
+
+async def follow_container_logs(container_name, matchers):
     """
-    logger.info(f"Avvio del supervisore per il progetto {PROJECT_NAME}")
-    logger.info(f"Monitoraggio dei container: {', '.join(CONTAINERS_TO_MONITOR)}")
-    logger.info(f"Il supervisore terminerà tutti i container quando uno di essi termina")
+    Segue in streaming i log di un container finché un matcher non riconosce una riga.
+    
+    Ogni riga viene esaminata una sola volta: se lo stream si chiude (container
+    terminato o riavviato) la lettura riprende dal cursore, saltando le righe
+    già esaminate.
+    
+    Args:
+        container_name: Nome del container
+        matchers: Coppie (descrizione, matcher) restituite da build_matchers()
+        
+    Returns:
+        str: Nome del container che ha completato la simulazione
+    """
+    while True:
+        try:
+            info = await docker.inspect_container(container_name)
+            if info is not None:
+                tty = info.get('Config', {}).get('Tty', False)
+                resume_from = log_cursors.get(container_name)
+                since = f"{resume_from[0]}.{resume_from[1]:09d}" if resume_from else None
+                async for _, line in docker.container_logs(container_name, tty, since=since):
+                    timestamp, _, text = line.partition(' ')
+                    position = parse_log_timestamp(timestamp)
+                    if position is not None:
+                        if resume_from is not None and position <= resume_from:
+                            continue  # Riga già esaminata prima della riconnessione
+                        log_cursors[container_name] = position
+                    for description, matcher in matchers:
+                        if matcher(text):
+                            logger.info(f"Messaggio '{description}' trovato nei log di {container_name}")
+                            return container_name
+        except (DockerAPIError, OSError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Lettura dei log di {container_name} interrotta: {str(e)}")
+        
+        # Stream chiuso: nuovo tentativo dal cursore dopo CHECK_INTERVAL
+        await asyncio.sleep(CHECK_INTERVAL)
+
+async def wait_for_simulation_completed(matchers):
+    """
+    Attende il messaggio di completamento nei log di uno dei container monitorati.
+    
+    Args:
+        matchers: Coppie (descrizione, matcher) restituite da build_matchers()
+        
+    Returns:
+        str: Nome del container che ha completato la simulazione
+    """
+    names = members_of_type(COMPLETION_ENTITY_TYPES)
+    if not names:
+        # Nessun container da seguire: il completamento non verrà mai segnalato dai log
+        await asyncio.Future()
+    followers = [asyncio.ensure_future(follow_container_logs(name, matchers)) for name in names]
+    try:
+        done, _ = await asyncio.wait(followers, return_when=asyncio.FIRST_COMPLETED)
+        return done.pop().result()
+    finally:
+        for follower in followers:
+            follower.cancel()
+
+async def shutdown(reason):
+    """
+    Attende il periodo di grazia e ferma tutti i container del progetto.
+    """
+    logger.info(f"{reason}. Arresto di tutti i container...")
+    logger.info(f"Attesa di {GRACE_PERIOD} secondi prima di arrestare i container...")
+    await asyncio.sleep(GRACE_PERIOD)
+    await stop_all_containers()
+    logger.info("Tutti i container sono stati arrestati. Il supervisore terminerà.")
+
+async def supervise():
+    """
+    Ciclo principale del supervisore.
+    
+    Returns:
+        int: Codice di uscita
+    """
+    logger.info("Avvio del supervisore")
+    
+    try:
+        matchers = build_matchers(COMPLETION_MATCHERS)
+    except (ValueError, re.error) as e:
+        logger.error(f"Configurazione COMPLETION_MATCHERS non valida: {str(e)}")
+        return 1
+    if HEARTBEAT_ACTION not in HEARTBEAT_ACTIONS:
+        logger.error(f"HEARTBEAT_ACTION '{HEARTBEAT_ACTION}' non valida, usare uno tra: {', '.join(HEARTBEAT_ACTIONS)}")
+        return 1
+    try:
+        qos['rules'] = build_qos_rules(QOS_RULES)
+    except ValueError as e:
+        logger.error(f"Configurazione QOS_RULES non valida: {str(e)}")
+        return 1
     
     # Gestione dei segnali
-    def handle_signal(sig, frame):
-        logger.info("Segnale di interruzione ricevuto, arresto in corso...")
-        stop_all_containers()
-        sys.exit(0)
+    loop = asyncio.get_running_loop()
+    interrupted = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, interrupted.set)
     
-    signal.signal(signal.SIGINT, handle_signal)
-    signal.signal(signal.SIGTERM, handle_signal)
+    await discover_project()
     
-    # Verifica iniziale per assicurarsi che i container esistano
-    initial_status = check_containers_status()
+    # Gli eventi vengono letti a partire da questo istante: una terminazione
+    # avvenuta durante la discovery non va persa
+    since = time.time()
     
-    # Verifica se tutti i container sono già terminati all'avvio
-    if are_all_containers_stopped():
-        logger.info("Tutti i container monitorati sono già terminati. Il supervisore terminerà immediatamente.")
-        sys.exit(0)  # Termina con codice di uscita 0 (successo)
+    # Discovery dei container del workbench
+    members = workbench['members'] = await wait_for_members()
+    logger.info(f"Workbench del progetto {workbench['project']}: {len(members)} container")
+    for name, member in sorted(members.items()):
+        state = 'running' if member['running'] else 'exited'
+        logger.info(f"  {name} | {member['type']} | {member['laboratory'] or '-'} | {state}")
+    watched = members_of_type(EXIT_ENTITY_TYPES)
+    logger.info(f"Il supervisore terminerà tutti i container quando uno tra {', '.join(EXIT_ENTITY_TYPES)} termina")
     
     # Verifica se nessun container esiste
-    if not any(status['exists'] for status in initial_status.values()):
+    if not watched:
         logger.warning("Nessuno dei container monitorati è stato trovato. Uscita.")
-        sys.exit(1)  # Termina con codice di uscita 1 (errore)
+        return 1  # Termina con codice di uscita 1 (errore)
     
     # Memorizza i container inizialmente in esecuzione
-    running_initially = [name for name, state in initial_status.items() if state['running']]
+    running_initially = [name for name in watched if members[name]['running']]
+    
+    # Verifica se tutti i container sono già terminati all'avvio
     if not running_initially:
-        logger.warning("Nessun container monitorato è in esecuzione. Il supervisore terminerà.")
-        sys.exit(0)  # Termina con codice di uscita 0 (successo)
-        
-    logger.info(f"Container inizialmente in esecuzione: {', '.join(running_initially)}")
+        logger.info("Tutti i container monitorati sono già terminati. Il supervisore terminerà immediatamente.")
+        return 0  # Termina con codice di uscita 0 (successo)
     
-    # Loop principale
-    try:
-        while True:
-            # Verifica se tutti i container sono terminati
-            if are_all_containers_stopped():
-                logger.info("Tutti i container monitorati sono terminati. Il supervisore terminerà.")
-                sys.exit(0)  # Termina con codice di uscita 0 (successo)
-            
-            # Verifica se almeno un container è terminato
-            stopped, container_name = is_any_container_stopped()
-            if stopped:
-                logger.info(f"Container {container_name} è terminato. Arresto di tutti gli altri container...")
-                
-                # Attendi un periodo di grazia
-                logger.info(f"Attesa di {GRACE_PERIOD} secondi prima di arrestare gli altri container...")
-                time.sleep(GRACE_PERIOD)
-                
-                # Ferma tutti gli altri container
-                stop_all_containers()
-                logger.info("Tutti i container sono stati arrestati. Il supervisore terminerà.")
-                sys.exit(0)  # Termina con codice di uscita 0 (successo)
-            
-            # Verifica anche se la simulazione è completata in uno dei container
-            for container_name in CONTAINERS_TO_MONITOR:
-                if check_simulation_completed(container_name):
-                    logger.info(f"Rilevato messaggio di completamento nei log di {container_name}")
-                    logger.info(f"Arresto di tutti i container...")
-                    
-                    # Attendi un periodo di grazia
-                    logger.info(f"Attesa di {GRACE_PERIOD} secondi prima di arrestare tutti i container...")
-                    time.sleep(GRACE_PERIOD)
-                    
-                    # Ferma tutti i container
-                    stop_all_containers()
-                    logger.info("Tutti i container sono stati arrestati. Il supervisore terminerà.")
-                    sys.exit(0)  # Termina con codice di uscita 0 (successo)
-            
-            # Attendi prima del prossimo controllo
-            time.sleep(CHECK_INTERVAL)
+    logger.info(f"Container monitorati inizialmente in esecuzione: {len(running_initially)}/{len(watched)}")
+    
+    # Un container monitorato esiste ma è già terminato
+    stopped = [name for name in watched if not members[name]['running']]
+    if stopped:
+        await shutdown(f"Container {stopped[0]} è terminato")
+        return 0
     
+    start_barrier['expected'] = len(members_of_type([COMPUTE_NODE_TYPE]))
+    transport, _ = await loop.create_datagram_endpoint(HeartbeatProtocol, local_addr=('0.0.0.0', HEARTBEAT_PORT))
+    logger.info(f"In ascolto degli heartbeat sulla porta UDP {HEARTBEAT_PORT} (timeout {HEARTBEAT_TIMEOUT_MILLIS} ms, azione {HEARTBEAT_ACTION})")
+    
+    if qos['rules']:
+        logger.info(f"Regole QoS: {'; '.join(rule['rule'] for rule in qos['rules'])}")
+    qos['breach'] = loop.create_future()
+    
+    open_metrics()
+    
+    exited = asyncio.ensure_future(wait_for_container_exit(since))
+    completed = asyncio.ensure_future(wait_for_simulation_completed(matchers))
+    stalled = asyncio.ensure_future(watch_heartbeats())
+    signalled = asyncio.ensure_future(interrupted.wait())
+    breached = asyncio.ensure_future(asyncio.shield(qos['breach']))
+    barrier = asyncio.ensure_future(watch_start_barrier())
+    tasks = [exited, completed, stalled, breached, signalled]
+    # Gli heartbeat restano in ascolto durante il periodo di grazia, così da
+    # registrare anche quelli finali delle altre lab
+    try:
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+        
+        exit_code = 0
+        if signalled in done:
+            reason = "signal"
+            logger.info("Segnale di interruzione ricevuto, arresto in corso...")
+            await stop_all_containers()
+        elif stalled in done:
+            # Una lab in stallo non completerà la simulazione: nessun periodo di grazia
+            reason = f"stall:{stalled.result()}"
+            exit_code = 1
+            logger.error(f"Lab {stalled.result()} in stallo, arresto del workbench")
+            await stop_all_containers()
+        elif breached in done:
+            # Esecuzione già fuori dalle soglie accettabili: nessun periodo di grazia
+            breach = breached.result()
+            reason = f"qos:{breach['rule']}"
+            exit_code = 1
+            logger.error(f"Regola QoS '{breach['rule']}' violata da {breach['lab']}, arresto anticipato del workbench")
+            await stop_all_containers()
+        elif exited in done:
+            container_name = exited.result()  # Propaga eventuali errori dello stream degli eventi
+            reason = f"exited:{container_name}"
+            await shutdown(f"Container {container_name} è terminato")
+        else:
+            reason = f"completed:{completed.result()}"
+            await shutdown("Simulazione completata")
+    finally:
+        barrier.cancel()
+        transport.close()
+    log_heartbeat_summary()
+    write_metrics_summary(reason, exit_code)
+    return exit_code
+
+def main():
+    """
+    Funzione principale.
+    """
+    try:
+        sys.exit(asyncio.run(supervise()))
     except KeyboardInterrupt:
         logger.info("Interruzione manuale, arresto in corso...")
-        stop_all_containers()
+        asyncio.run(stop_all_containers())
         sys.exit(130)  # Codice di uscita standard per SIGINT
     except Exception as e:
         logger.error(f"Errore nel supervisore: {str(e)}")
         # Ferma i container anche in caso di errore
         logger.info("Arresto di tutti i container a causa di un errore...")
-        stop_all_containers()
+        asyncio.run(stop_all_containers())
         sys.exit(1)  # Termina con codice di uscita 1 (errore)
 
 if __name__ == "__main__":
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test del client della Docker Engine API contro un demone finto
+
+Il demone finto ascolta su un socket unix temporaneo, il cui percorso viene
+passato direttamente a DockerAPI, e risponde con corpi chunked i cui chunk sono
+scelti per spezzare eventi, frame e righe nei punti critici.
+
+Utilizzo (dalla directory supervisor): python3 -m unittest test_docker_api
+"""
+
+import os
+import json
+import shutil
+import asyncio
+import tempfile
+import unittest
+from urllib.parse import urlsplit, parse_qs
+
+from docker_api import DockerAPI, DockerAPIError, LOG_FRAME_HEADER
+
+def log_frame(stream_type, payload):
+    """
+    Frame di un log multiplexato: header di 8 byte seguito dal payload.
+    """
+    return LOG_FRAME_HEADER.pack(stream_type, len(payload)) + payload
+
+class FakeDockerDaemon:
+    """
+    Demone Docker finto: a ogni percorso associa status e chunk del corpo della risposta.
+    """
+
+    def __init__(self, socket_path):
+        self.socket_path = socket_path
+        self.routes = {}
+        self.requests = []
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        method, target, _ = request_line.decode().split(' ', 2)
+        url = urlsplit(target)
+        self.requests.append((method, url.path, parse_qs(url.query)))
+
+        status, chunks = self.routes.get(url.path, (404, [b'{"message": "not found"}']))
+        writer.write(
+            f"HTTP/1.1 {status} X\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Transfer-Encoding: chunked\r\n\r\n".encode()
+        )
+        for chunk in chunks:
+            writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+            await writer.drain()
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        writer.close()
+
+class DockerAPITest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.directory = tempfile.mkdtemp()
+        socket_path = os.path.join(self.directory, 'docker.sock')
+        self.daemon = FakeDockerDaemon(socket_path)
+        await self.daemon.start()
+        self.docker = DockerAPI(socket_path)
+
+    async def asyncTearDown(self):
+        await self.daemon.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    async def test_events_across_chunks(self):
+        events = [
+            {'Type': 'container', 'Action': 'die', 'Actor': {'ID': 'a'}},
+            {'Type': 'container', 'Action': 'stop', 'Actor': {'ID': 'b'}},
+            {'Type': 'container', 'Action': 'die', 'Actor': {'ID': 'c'}}
+        ]
+        body = b''.join(json.dumps(event).encode() + b'\n' for event in events)
+        split = body.index(b'\n') + 5
+        # Primo evento e inizio del secondo, resto del secondo spezzato a metà, terzo evento con riga vuota
+        self.daemon.routes['/events'] = (200, [body[:split], body[split:split + 10], body[split + 10:], b'\n'])
+
+        filters = {'type': ['container'], 'event': ['die', 'stop']}
+        received = [event async for event in self.docker.events(filters, since=12.5)]
+
+        self.assertEqual(received, events)
+        method, path, query = self.daemon.requests[0]
+        self.assertEqual((method, path), ('GET', '/events'))
+        self.assertEqual(json.loads(query['filters'][0]), filters)
+        self.assertEqual(query['since'], ['12.500000000'])
+
+    async def test_multiplexed_logs(self):
+        stream = (
+            log_frame(1, b'2024-01-01T00:00:00Z start\n2024-01-01T00:00:01Z ste')
+            + log_frame(2, b'2024-01-01T00:00:01Z warn\r\n')
+            + log_frame(1, b'p 1\n')
+            + log_frame(2, b'partial')
+            + log_frame(1, b'Simulation completed')
+        )
+        # Chunk che spezzano sia un header sia un payload
+        self.daemon.routes['/containers/lab_a/logs'] = (200, [stream[:5], stream[5:40], stream[40:]])
+
+        lines = [line async for line in self.docker.container_logs('lab_a', tty=False, since='12.000000000')]
+
+        self.assertEqual(lines, [
+            (1, '2024-01-01T00:00:00Z start'),
+            (2, '2024-01-01T00:00:01Z warn'),
+            (1, '2024-01-01T00:00:01Z step 1'),
+            (1, 'Simulation completed'),
+            (2, 'partial')
+        ])
+        _, path, query = self.daemon.requests[0]
+        self.assertEqual(path, '/containers/lab_a/logs')
+        self.assertEqual(query['follow'], ['1'])
+        self.assertEqual(query['since'], ['12.000000000'])
+
+    async def test_tty_logs(self):
+        # Con tty lo stream è grezzo: un eventuale header non va interpretato
+        self.daemon.routes['/containers/lab_b/logs'] = (200, [b'first li', b'ne\r\nsecond\n\x01\x00', b'\x00\x00last'])
+
+        lines = [line async for line in self.docker.container_logs('lab_b', tty=True, follow=False)]
+
+        self.assertEqual(lines, [(1, 'first line'), (1, 'second'), (1, '\x01\x00\x00\x00last')])
+        self.assertEqual(self.daemon.requests[0][2]['follow'], ['0'])
+
+    async def test_error_response(self):
+        with self.assertRaises(DockerAPIError) as context:
+            [line async for line in self.docker.container_logs('missing', tty=False)]
+        self.assertEqual(context.exception.status, 404)
+        self.assertEqual(context.exception.message, 'not found')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,527 @@
+#!/usr/bin/env python3
+"""
+Sweep parallelo su impairment di rete e parametri della simulazione
+
+Espande una griglia di parametri netem (applicati al collegamento tra le due
+VILLASnode) e di variabili di ambiente (es. TAU_MILLIS) in punti di misura.
+Ogni punto viene eseguito come workbench isolato: copia dei file del workbench
+in una directory dedicata e progetto compose distinto, quindi rete, container e
+log non collidono tra punti eseguiti in parallelo. Al termine di ogni punto
+vengono raccolti latenza e perdite dal riepilogo delle metriche del supervisore
+e l'RMSE rispetto alla simulazione di riferimento DPSim.
+
+Utilizzo: python3 sweep_runner.py sweeps/example_sweep.json [--parallel 2]
+"""
+
+import os
+import re
+import sys
+import csv
+import json
+import glob
+import time
+import shutil
+import asyncio
+import argparse
+import itertools
+import logging
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'dpsim_local'))
+from reference_cache import load_env_file, ensure_reference
+from cpu_planner import read_topology, plan_placement, render_override, format_cpulist, OVERRIDE_NAME
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('sweep_runner')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# File del workbench copiati nella directory di ogni punto
+WORKBENCH_FILES = ['docker-compose.yaml', '.env', 'lab_a', 'lab_b', 'supervisor', 'pool']
+WORKBENCH_IGNORE = shutil.ignore_patterns('logs', 'metrics', 'results', '__pycache__', '*.log', '*.pyc')
+
+# Nodo VILLAS che trasmette verso l'altra lab: il suo netem impaira il collegamento tra i lab
+NETEM_NODES = {
+    'lab_a': 'nodo_villas_lab_a',
+    'lab_b': 'nodo_villas_lab_b'
+}
+# Parametri netem di VILLASnode (delay e jitter in microsecondi, percentuali per le altre)
+NETEM_DEFAULTS = {
+    'delay': 0,
+    'jitter': 0,
+    'distribution': 'normal',
+    'loss': 0,
+    'duplicate': 0,
+    'corrupt': 0
+}
+NETEM_BLOCK = re.compile(r'([ \t]*)netem = \{[^{}]*\}')
+
+# Colonne della tabella dei risultati dopo i parametri del punto
+RESULT_COLUMNS = [
+    'status', 'exit_code', 'reason', 'duration_s',
+    'rtt_ms_p50', 'rtt_ms_p99', 'rtt_ms_max', 'step_ms_p99',
+    'loss_pct', 'timeouts', 'overruns',
+    'rmse_current_magnitude', 'rmse_current_phase', 'rmse_voltage_magnitude', 'rmse_voltage_phase',
+    'max_error_current_magnitude', 'max_error_current_phase', 'max_error_voltage_magnitude', 'max_error_voltage_phase'
+]
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Sweep parallelo su impairment di rete e parametri della simulazione')
+    parser.add_argument('grid', help='File JSON con la griglia dello sweep')
+    parser.add_argument('--parallel', '-j', type=int,
+                        help='Punti eseguiti contemporaneamente (default: valore "parallel" della griglia o 1)')
+    parser.add_argument('--output-dir', '-o',
+                        help='Directory dei risultati (default: sweeps/runs/<timestamp>)')
+    parser.add_argument('--timeout', type=float, default=600,
+                        help='Secondi oltre i quali un punto viene interrotto (default: 600)')
+    parser.add_argument('--pin-cpus', action='store_true',
+                        help='Assegna core dedicati ai laboratori di ogni slot parallelo (cpu_planner.py)')
+    parser.add_argument('--keep', action='store_true',
+                        help='Conserva i container fermati di ogni punto (nessun docker compose down)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Mostra i punti della griglia senza eseguirli')
+    return parser.parse_args()
+
+def expand_grid(grid):
+    """
+    Espande la griglia nel prodotto cartesiano dei valori in lista.
+
+    Args:
+        grid: {"netem": {...}, "env": {...}}; i valori scalari sono fissi, le
+              liste sono assi della griglia
+
+    Returns:
+        list: Punti {'netem': {...}, 'env': {...}}
+    """
+    axes = []
+    for section in ('netem', 'env'):
+        for name, values in grid.get(section, {}).items():
+            if section == 'netem' and name not in NETEM_DEFAULTS and name != 'enabled':
+                raise ValueError(f"Parametro netem '{name}' non supportato, usare uno tra: {', '.join(NETEM_DEFAULTS)}")
+            axes.append((section, name, values if isinstance(values, list) else [values]))
+    points = []
+    for combination in itertools.product(*(values for _, _, values in axes)):
+        point = {'netem': {}, 'env': {}}
+        for (section, name, _), value in zip(axes, combination):
+            point[section][name] = value
+        points.append(point)
+    return points
+
+def render_netem(netem, indent):
+    """
+    Genera il blocco netem di VILLASnode per un punto.
+
+    Il netem viene abilitato se almeno un impairment è diverso da zero, salvo
+    "enabled" indicato esplicitamente nella griglia.
+    """
+    values = dict(NETEM_DEFAULTS, **{k: v for k, v in netem.items() if k != 'enabled'})
+    enabled = netem.get('enabled', any(values[k] for k in ('delay', 'jitter', 'loss', 'duplicate', 'corrupt')))
+    lines = [f"{indent}netem = {{", f"{indent}    enabled = {'true' if enabled else 'false'},"]
+    names = list(values)
+    for name in names:
+        value = values[name]
+        rendered = f'"{value}"' if isinstance(value, str) else value
+        separator = ',' if name != names[-1] else ''
+        lines.append(f"{indent}    {name} = {rendered}{separator}")
+    lines.append(f"{indent}}}")
+    return '\n'.join(lines), enabled
+
+def apply_netem(conf_text, node_name, netem):
+    """
+    Sostituisce il blocco netem nella sezione out del nodo indicato.
+
+    Returns:
+        tuple: (configurazione modificata, netem abilitato)
+
+    Raises:
+        ValueError: Se il nodo o il suo blocco netem non esistono
+    """
+    start = conf_text.find(f"{node_name} = {{")
+    if start < 0:
+        raise ValueError(f"Nodo {node_name} non trovato")
+    out_at = conf_text.find("out = {", start)
+    match = NETEM_BLOCK.search(conf_text, out_at) if out_at >= 0 else None
+    if match is None:
+        raise ValueError(f"Blocco netem del nodo {node_name} non trovato")
+    block, enabled = render_netem(netem, match.group(1))
+    return conf_text[:match.start()] + block + conf_text[match.end():], enabled
+
+def update_env_file(path, env):
+    """
+    Imposta nel file .env del punto i valori delle variabili della griglia.
+    """
+    with open(path) as f:
+        lines = f.read().splitlines()
+    pending = dict(env)
+    for index, line in enumerate(lines):
+        key = line.split('=', 1)[0].strip()
+        if '=' in line and not line.lstrip().startswith('#') and key in pending:
+            lines[index] = f"{key}={pending.pop(key)}"
+    lines.extend(f"{key}={value}" for key, value in pending.items())
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+def prepare_point(point, workdir, cpu_plan=None):
+    """
+    Crea la directory del punto: copia del workbench, .env e node.conf modificati
+    e, se il netem è abilitato, override compose con NET_ADMIN per le VILLASnode.
+    Con cpu_plan scrive anche l'override con cpuset e affinità dello slot.
+
+    Returns:
+        list: File compose da passare a docker compose
+    """
+    os.makedirs(workdir, exist_ok=True)
+    for name in WORKBENCH_FILES:
+        source = os.path.join(BASE_DIR, name)
+        target = os.path.join(workdir, name)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, ignore=WORKBENCH_IGNORE, dirs_exist_ok=True)
+        elif os.path.isfile(source):
+            shutil.copy2(source, target)
+    update_env_file(os.path.join(workdir, '.env'), point['env'])
+
+    netem_enabled = False
+    for lab, node_name in NETEM_NODES.items():
+        conf_path = os.path.join(workdir, lab, 'config', 'node.conf')
+        with open(conf_path) as f:
+            conf_text, enabled = apply_netem(f.read(), node_name, point['netem'])
+        with open(conf_path, 'w') as f:
+            f.write(conf_text)
+        netem_enabled = netem_enabled or enabled
+
+    compose_files = ['docker-compose.yaml']
+    if netem_enabled:
+        # netem configura la coda di uscita dell'interfaccia: serve CAP_NET_ADMIN
+        with open(os.path.join(workdir, 'sweep.override.yaml'), 'w') as f:
+            f.write("services:\n")
+            for service in ('villas_lab_a', 'villas_lab_b'):
+                f.write(f"  {service}:\n    cap_add:\n      - NET_ADMIN\n")
+        compose_files.append('sweep.override.yaml')
+    if cpu_plan is not None:
+        with open(os.path.join(workdir, OVERRIDE_NAME), 'w') as f:
+            f.write(render_override(cpu_plan))
+        compose_files.append(OVERRIDE_NAME)
+    return compose_files
+
+async def run_process(command, cwd, log_file, timeout=None):
+    """
+    Esegue un comando con l'output nel log del punto.
+
+    Returns:
+        int: Codice di uscita, None se interrotto per timeout
+    """
+    process = await asyncio.create_subprocess_exec(*command, cwd=cwd, stdout=log_file, stderr=asyncio.subprocess.STDOUT)
+    try:
+        return await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return None
+    except asyncio.CancelledError:
+        # Sweep interrotto (Ctrl-C): il comando non deve sopravvivere al runner
+        process.kill()
+        await process.wait()
+        raise
+
+def load_metrics_summary(workdir):
+    """
+    Legge il riepilogo delle metriche scritto dal supervisore del punto.
+
+    Returns:
+        dict: Riepilogo, None se assente
+    """
+    paths = sorted(glob.glob(os.path.join(workdir, 'metrics', 'metrics_summary_*.json')))
+    if not paths:
+        return None
+    with open(paths[-1]) as f:
+        return json.load(f)
+
+def summarize_metrics(summary):
+    """
+    Riduce il riepilogo del supervisore a una riga: caso peggiore tra le lab per
+    latenze e perdite, somma per timeout e overrun.
+    """
+    labs = list(summary.get('labs', {}).values())
+
+    def worst(section, key):
+        values = [lab[section][key] for lab in labs if lab.get(section, {}).get(key) is not None]
+        return max(values) if values else None
+
+    return {
+        'reason': summary.get('reason'),
+        'rtt_ms_p50': worst('rtt_ms', 'p50'),
+        'rtt_ms_p99': worst('rtt_ms', 'p99'),
+        'rtt_ms_max': worst('rtt_ms', 'max'),
+        'step_ms_p99': worst('step_ms', 'p99'),
+        'loss_pct': max((lab.get('loss_pct') or 0.0 for lab in labs), default=None),
+        'timeouts': sum(lab.get('timeouts') or 0 for lab in labs),
+        'overruns': sum(lab.get('overruns') or 0 for lab in labs)
+    }
+
+def most_recent(directory, prefix):
+    """
+    File di log VILLAS più recente con il prefisso indicato, None se assente.
+    """
+    paths = glob.glob(os.path.join(directory, f"{prefix}*.log"))
+    return max(paths, key=os.path.getmtime) if paths else None
+
+def compute_rmse(workdir, env):
+    """
+    Errori di modulo e fase di corrente e tensione del LAB A rispetto al riferimento DPSim.
+
+    Il riferimento viene preso dalla cache (eseguito una sola volta per
+    configurazione anche con più punti in parallelo). I campioni vengono
+    allineati al riferimento per numero di sequenza con metrics.compare, quindi
+    i pacchetti persi dalla rete del punto non spostano il confronto.
+
+    Returns:
+        dict: RMSE ed errore massimo per colonna
+    """
+    from log_cache import load_columns
+    from metrics import compare, SIGNALS
+
+    logs_dir = os.path.join(workdir, 'lab_a', 'logs')
+    logs = {name: most_recent(logs_dir, signal['log']) for name, signal in SIGNALS.items()}
+    if None in logs.values():
+        raise FileNotFoundError(f"Log VILLAS non trovati in {logs_dir}")
+
+    errors = compare(
+        {name: (load_columns(path, 'villas'), SIGNALS[name]['reference']) for name, path in logs.items()},
+        load_columns(ensure_reference(env)['path'], 'csv'),
+        tau=float(env.get('TAU_MILLIS', '1'))/1000
+    )
+    return {
+        f"{metric}_{name}_{quantity}": result[f"{metric}_{quantity}"]
+        for name, result in errors.items()
+        for metric in ('rmse', 'max_error')
+        for quantity in ('magnitude', 'phase')
+    }
+
+def plan_slots(parallel):
+    """
+    Piani di posizionamento sulle CPU degli slot paralleli: i laboratori di slot
+    diversi ricevono core diversi, i supervisori restano sui core di sistema.
+
+    Returns:
+        list: Piano per slot, nel formato di plan_placement
+
+    Raises:
+        ValueError: Se l'host non ha core dedicati sufficienti
+    """
+    labs = [f"s{slot}_{lab}" for slot in range(parallel) for lab in NETEM_NODES]
+    plan = plan_placement(read_topology('/sys'), labs)
+    for warning in plan['warnings']:
+        logger.warning(warning)
+    plans = []
+    for slot in range(parallel):
+        prefix = f"s{slot}_"
+        services = {'supervisor': plan['services']['supervisor']}
+        for service, placement in plan['services'].items():
+            kind, _, lab = service.partition('_')
+            if lab.startswith(prefix):
+                services[f"{kind}_{lab[len(prefix):]}"] = placement
+        plans.append({'services': services, 'warnings': []})
+    return plans
+
+def point_row(index, point, output_dir):
+    """
+    Riga iniziale della tabella dei risultati: identificativo, progetto compose e parametri del punto.
+    """
+    point_id = f"p{index:03d}"
+    project = f"{os.path.basename(output_dir)}_{point_id}".lower()
+    row = {'id': point_id, 'project': re.sub(r'[^a-z0-9_-]', '_', project)}
+    row.update({f"netem_{name}": value for name, value in point['netem'].items()})
+    row.update(point['env'])
+    return row
+
+def failed_row(row, error):
+    """
+    Chiude la riga di un punto che non è stato possibile eseguire o valutare.
+    """
+    row['status'] = 'failed'
+    row['reason'] = f"{type(error).__name__}: {str(error)}"
+    logger.error(f"Punto {row['id']} fallito: {row['reason']}")
+    return row
+
+async def run_point(index, point, args, output_dir, slots, cpu_plans):
+    """
+    Esegue un punto della griglia come workbench isolato e ne raccoglie i risultati.
+
+    Il punto occupa uno degli slot paralleli per tutta l'esecuzione; con
+    --pin-cpus lo slot determina i core assegnati ai suoi laboratori. Un errore
+    nella preparazione, nell'esecuzione o nella lettura dei risultati produce una
+    riga 'failed' con il motivo, senza interrompere gli altri punti; i container
+    del punto vengono rimossi anche se lo sweep viene interrotto.
+
+    Returns:
+        dict: Riga della tabella dei risultati
+    """
+    row = point_row(index, point, output_dir)
+    point_id, project = row['id'], row['project']
+    workdir = os.path.join(output_dir, 'points', point_id)
+
+    slot = await slots.get()
+    try:
+        compose_files = prepare_point(point, workdir, cpu_plans[slot] if cpu_plans else None)
+        compose = ['docker', 'compose', '-p', project, '--env-file', '.env']
+        for compose_file in compose_files:
+            compose += ['-f', compose_file]
+        logger.info(f"Punto {point_id} avviato: netem={point['netem']} env={point['env']}")
+        inizio = time.monotonic()
+        with open(os.path.join(workdir, 'point.log'), 'w') as log_file:
+            exit_code = None
+            try:
+                exit_code = await run_process(compose + ['up', '--build'], workdir, log_file, args.timeout)
+            finally:
+                row['duration_s'] = round(time.monotonic() - inizio, 3)
+                if not args.keep or exit_code is None:
+                    # Con timeout, errore o interruzione i container vanno comunque rimossi
+                    await run_process(compose + ['down', '--remove-orphans'], workdir, log_file)
+    except Exception as e:
+        return failed_row(row, e)
+    finally:
+        slots.put_nowait(slot)
+
+    try:
+        summary = load_metrics_summary(workdir)
+        if exit_code is None:
+            row['status'] = 'timeout'
+        elif exit_code != 0 or summary is None:
+            row['status'] = 'failed'
+            row['reason'] = f"docker compose up terminato con codice {exit_code}" if exit_code else "riepilogo delle metriche assente"
+        else:
+            row['status'] = 'ok' if summary.get('exit_code') == 0 else 'aborted'
+        row['exit_code'] = summary.get('exit_code') if summary else exit_code
+        if summary is not None:
+            row.update(summarize_metrics(summary))
+    except Exception as e:
+        return failed_row(row, e)
+
+    if row['status'] in ('ok', 'aborted'):
+        try:
+            env = load_env_file(os.path.join(workdir, '.env'))
+            row.update(await asyncio.get_running_loop().run_in_executor(None, compute_rmse, workdir, env))
+        except Exception as e:
+            logger.warning(f"RMSE del punto {point_id} non calcolato: {str(e)}")
+    logger.info(
+        f"Punto {point_id} {row['status']} in {row['duration_s']:.1f} s | "
+        f"rtt_p99={row.get('rtt_ms_p99')} ms | loss={row.get('loss_pct')} % | "
+        f"rmse_i={row.get('rmse_current_magnitude')}"
+    )
+    return row
+
+def write_results(rows, parameters, output_dir):
+    """
+    Scrive la tabella dei risultati in CSV e JSONL.
+
+    Returns:
+        str: Percorso del CSV
+    """
+    columns = ['id'] + parameters + RESULT_COLUMNS
+    csv_path = os.path.join(output_dir, 'results.csv')
+    with open(csv_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns, extrasaction='ignore')
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({column: row.get(column) for column in columns})
+    with open(os.path.join(output_dir, 'results.jsonl'), 'w') as f:
+        for row in rows:
+            f.write(json.dumps(row, default=float) + '\n')
+    return csv_path
+
+def log_table(rows, parameters):
+    """
+    Riporta la tabella dei risultati nel log.
+    """
+    columns = ['id'] + parameters + ['status', 'rtt_ms_p99', 'loss_pct', 'timeouts', 'rmse_current_magnitude', 'rmse_voltage_magnitude']
+
+    def cell(value):
+        if isinstance(value, float):
+            return f"{value:.4g}"
+        return '-' if value is None else str(value)
+
+    widths = [max(len(column), *(len(cell(row.get(column))) for row in rows)) for column in columns]
+    logger.info('  '.join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        logger.info('  '.join(cell(row.get(column)).ljust(width) for column, width in zip(columns, widths)))
+
+async def run_sweep(points, args, output_dir, parallel, cpu_plans=None):
+    """
+    Esegue tutti i punti con al più `parallel` workbench contemporanei.
+
+    Returns:
+        list: Righe dei risultati, nell'ordine dei punti; un punto terminato con
+              un'eccezione non prevista diventa una riga 'failed'
+    """
+    slots = asyncio.Queue()
+    for slot in range(parallel):
+        slots.put_nowait(slot)
+    results = await asyncio.gather(*(run_point(index, point, args, output_dir, slots, cpu_plans)
+                                     for index, point in enumerate(points, 1)), return_exceptions=True)
+    return [
+        failed_row(point_row(index, point, output_dir), result) if isinstance(result, Exception) else result
+        for index, (point, result) in enumerate(zip(points, results), 1)
+    ]
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    try:
+        with open(args.grid) as f:
+            grid = json.load(f)
+        points = expand_grid(grid)
+    except (OSError, ValueError) as e:
+        logger.error(f"Griglia {args.grid} non valida: {str(e)}")
+        sys.exit(1)
+    parameters = [f"netem_{name}" for name in grid.get('netem', {})] + list(grid.get('env', {}))
+    parallel = max(1, args.parallel or int(grid.get('parallel', 1)))
+    logger.info(f"{len(points)} punti nella griglia, {parallel} in parallelo")
+    cpu_plans = None
+    if args.pin_cpus:
+        try:
+            cpu_plans = plan_slots(parallel)
+        except (OSError, ValueError) as e:
+            logger.error(f"Core non assegnabili a {parallel} slot paralleli: {str(e)}")
+            sys.exit(1)
+        for slot, plan in enumerate(cpu_plans):
+            logger.info(f"Slot {slot}: " + ', '.join(
+                f"{service}={format_cpulist(placement['cpuset'])}" for service, placement in plan['services'].items()))
+
+    if args.dry_run:
+        for index, point in enumerate(points, 1):
+            logger.info(f"p{index:03d} | netem={point['netem']} | env={point['env']}")
+        return
+
+    output_dir = os.path.abspath(args.output_dir or os.path.join(
+        BASE_DIR, 'sweeps', 'runs', f"sweep_{datetime.now().strftime('%Y%m%d_%H%M%S')}"))
+    os.makedirs(output_dir, exist_ok=True)
+    shutil.copy2(args.grid, os.path.join(output_dir, 'grid.json'))
+
+    inizio = time.monotonic()
+    try:
+        rows = asyncio.run(run_sweep(points, args, output_dir, parallel, cpu_plans))
+    except KeyboardInterrupt:
+        logger.info("Interruzione manuale dello sweep")
+        sys.exit(130)  # Codice di uscita standard per SIGINT
+    csv_path = write_results(rows, parameters, output_dir)
+    log_table(rows, parameters)
+    logger.info(f"Sweep completato in {time.monotonic() - inizio:.1f} s, risultati in {csv_path}")
+    sys.exit(0 if all(row['status'] in ('ok', 'aborted') for row in rows) else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,647 @@
+#!/usr/bin/env python3
+"""
+Generatore di workbench DESF a coppie di laboratori
+
+Legge la descrizione di un workbench (laboratori, coppie o collegamenti
+espliciti, segnali e formato) e genera una directory pronta per docker compose:
+compose del workbench e dei laboratori, node.conf e path.conf di VILLASnode,
+variabili di ambiente di ogni laboratorio e mappa delle porte. Le porte vengono
+assegnate in blocchi di quattro per collegamento, come nel workbench a due
+laboratori (12000-12003), saltando quelle riservate; la mappa viene validata
+prima di scrivere i file.
+
+Gli script dei compute node scambiano con un solo laboratorio (PORT_SOURCE e
+PORT_DEST): ogni laboratorio ha quindi esattamente un collegamento e il workbench
+è formato da coppie indipendenti che condividono host, rete e supervisore, ad
+esempio per provare più coppie in parallelo. Anelli, stelle e maglie
+richiederebbero uno script che serve più collegamenti e non vengono generati.
+
+Utilizzo: python3 topology_generator.py topologies/2labs.json [--output-dir generated/2labs]
+"""
+
+import os
+import re
+import sys
+import json
+import shutil
+import argparse
+import logging
+
+# Configurazione logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.StreamHandler(sys.stdout)
+    ]
+)
+logger = logging.getLogger('topology_generator')
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TOPOLOGIES = ('pairs',)
+LAB_ID_PATTERN = re.compile(r'^[a-z][a-z0-9_]*$')
+BASE_PORT = 12000
+PORTS_PER_LINK = 4
+
+# Porte già usate dal workbench: non vengono assegnate ai collegamenti
+RESERVED_PORTS = {
+    12010: 'WR_PORT',
+    12020: 'POOL_CONTROL_PORT',
+    12100: 'HEARTBEAT_PORT'
+}
+
+DPSIM_IMAGE = 'antoniopicone/dpsim-arm64-dev:1.0.3'
+VILLAS_IMAGE = 'registry.git.rwth-aachen.de/acs/public/villas/node'
+
+# Formato dei campioni scambiati, come nei node.conf del workbench a due laboratori
+DEFAULT_FORMAT = {
+    'type': 'json',
+    'indent': 0,
+    'compact': False,
+    'ts_received': True,
+    'ts_origin': True,
+    'offset': True,
+    'real_precision': 6,
+    'sequence': True
+}
+DEFAULT_SIGNALS = [{'name': 'V', 'unit': 'Volt', 'type': 'complex'}]
+DEFAULT_NETEM = {
+    'enabled': False,
+    'delay': 100000,
+    'jitter': 30000,
+    'distribution': 'normal',
+    'loss': 2,
+    'duplicate': 0,
+    'corrupt': 0
+}
+
+def parse_arguments():
+    """
+    Analizza gli argomenti della riga di comando.
+
+    Returns:
+        argparse.Namespace: Gli argomenti analizzati
+    """
+    parser = argparse.ArgumentParser(description='Genera un workbench DESF a coppie di laboratori da una descrizione JSON')
+    parser.add_argument('description', help='File JSON con la descrizione del workbench')
+    parser.add_argument('--output-dir', '-o',
+                        help='Directory del workbench generato (default: generated/<name>)')
+    parser.add_argument('--force', action='store_true',
+                        help='Sovrascrive una directory di output già esistente')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Valida la descrizione e mostra la mappa delle porte senza scrivere file')
+    return parser.parse_args()
+
+def load_description(path):
+    """
+    Legge e valida la descrizione del workbench.
+
+    Returns:
+        dict: Descrizione con i valori predefiniti applicati
+
+    Raises:
+        ValueError: Se la descrizione non è valida
+    """
+    with open(path) as f:
+        description = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    labs = description.get('labs', [])
+    if len(labs) < 2:
+        raise ValueError("Servono almeno due laboratori")
+    ids = [lab.get('id') for lab in labs]
+    for lab_id in ids:
+        if not isinstance(lab_id, str) or not LAB_ID_PATTERN.match(lab_id):
+            raise ValueError(f"Id di laboratorio '{lab_id}' non valido (minuscole, cifre e _)")
+    duplicates = sorted({lab_id for lab_id in ids if ids.count(lab_id) > 1})
+    if duplicates:
+        raise ValueError(f"Id di laboratorio duplicati: {', '.join(duplicates)}")
+
+    description.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    description.setdefault('base_port', BASE_PORT)
+    description['reserved_ports'] = {int(port): name for port, name in
+                                     description.get('reserved_ports', RESERVED_PORTS).items()}
+    description['format'] = dict(DEFAULT_FORMAT, **description.get('format', {}))
+    description.setdefault('signals', DEFAULT_SIGNALS)
+    description['netem'] = dict(DEFAULT_NETEM, **description.get('netem', {}))
+    for lab in labs:
+        if 'app' not in lab or 'script' not in lab:
+            raise ValueError(f"Il laboratorio {lab['id']} deve indicare 'app' e 'script'")
+        lab['app'] = os.path.normpath(os.path.join(base_dir, lab['app']))
+        if not os.path.isfile(os.path.join(lab['app'], lab['script'])):
+            raise ValueError(f"Script {lab['script']} non trovato in {lab['app']}")
+        lab.setdefault('name', f"Laboratory {lab['id']}")
+        lab.setdefault('cpuset', '0,1')
+        lab.setdefault('env', {})
+        lab.setdefault('log', lab['id'])
+        if not isinstance(lab['log'], str) or not LAB_ID_PATTERN.match(lab['log']):
+            raise ValueError(f"'log' del laboratorio {lab['id']} non valido (minuscole, cifre e _)")
+    return description
+
+def expand_links(description):
+    """
+    Elenca i collegamenti del workbench, dalla topologia o dalla lista esplicita "links".
+    La topologia 'pairs' collega i laboratori a due a due, nell'ordine della descrizione.
+
+    Returns:
+        list: Collegamenti {'labs': (x, y), 'signals': {x: [...], y: [...]}, 'logs': {x: nome, y: nome}, 'netem': {...}}
+
+    Raises:
+        ValueError: Se la topologia non è supportata o un collegamento non è valido
+    """
+    labs = {lab['id']: lab for lab in description['labs']}
+    ids = list(labs)
+    if 'links' in description:
+        pairs = [tuple(link['labs']) for link in description['links']]
+        overrides = description['links']
+    else:
+        topology = description.get('topology', 'pairs')
+        if topology == 'pairs':
+            if len(ids) % 2:
+                raise ValueError(f"La topologia 'pairs' richiede un numero pari di laboratori, non {len(ids)}")
+            pairs = list(zip(ids[0::2], ids[1::2]))
+        else:
+            raise ValueError(f"Topologia '{topology}' non supportata, usare una tra: {', '.join(TOPOLOGIES)} o 'links'")
+        overrides = [{} for _ in pairs]
+
+    links = []
+    seen = set()
+    for (x, y), override in zip(pairs, overrides):
+        if x not in labs or y not in labs or x == y:
+            raise ValueError(f"Collegamento {x}-{y} non valido")
+        if frozenset((x, y)) in seen:
+            raise ValueError(f"Collegamento {x}-{y} duplicato")
+        seen.add(frozenset((x, y)))
+        signals = override.get('signals', {})
+        logs = {lab_id: override.get('log', {}).get(lab_id, labs[lab_id]['log']) for lab_id in (x, y)}
+        if logs[x] == logs[y]:
+            raise ValueError(f"Collegamento {x}-{y}: i due versi usano lo stesso nome di log '{logs[x]}'")
+        links.append({
+            'labs': (x, y),
+            'signals': {lab_id: signals.get(lab_id, labs[lab_id].get('signals', description['signals'])) for lab_id in (x, y)},
+            'logs': logs,
+            'netem': dict(description['netem'], **override.get('netem', {}))
+        })
+    return links
+
+def allocate_ports(links, base_port, reserved):
+    """
+    Assegna a ogni collegamento un blocco di quattro porte consecutive libere.
+
+    Per il collegamento x-y il blocco è [ingresso x, dpsim x, dpsim y, ingresso y]:
+    la VILLASnode di x riceve dall'altra lab sulla porta di ingresso, che è anche
+    la porta su cui il compute node di x riceve dalla propria VILLASnode, e riceve
+    dal compute node sulla porta dpsim. Con due laboratori si ottiene 12000-12003.
+    """
+    port = base_port
+    for link in links:
+        while any(candidate in reserved for candidate in range(port, port + PORTS_PER_LINK)):
+            port += 1
+        x, y = link['labs']
+        link['ports'] = {
+            x: {'ingress': port, 'dpsim': port + 1},
+            y: {'ingress': port + 3, 'dpsim': port + 2}
+        }
+        port += PORTS_PER_LINK
+
+def validate_links(labs, links):
+    """
+    Verifica che ogni laboratorio abbia esattamente un collegamento.
+
+    Lo script del compute node scambia con un solo laboratorio (PORT_SOURCE e
+    PORT_DEST): un collegamento in più resterebbe senza compute node, mentre una
+    lab senza collegamenti attenderebbe per sempre i campioni del peer.
+
+    Raises:
+        ValueError: Con l'elenco dei laboratori non collegati a un solo peer
+    """
+    errors = []
+    for lab in labs:
+        peers = [peer for peer, _ in lab_links(lab['id'], links)]
+        if len(peers) != 1:
+            errors.append(f"{lab['id']} ha {len(peers)} collegamenti ({', '.join(peers) or 'nessuno'}), {lab['script']} ne gestisce uno")
+    if errors:
+        raise ValueError("Ogni laboratorio deve avere un solo collegamento:\n  " + "\n  ".join(errors))
+
+def lab_links(lab_id, links):
+    """
+    Collegamenti di un laboratorio come coppie (peer, collegamento), nell'ordine della descrizione.
+    """
+    return [(link['labs'][1] if link['labs'][0] == lab_id else link['labs'][0], link)
+            for link in links if lab_id in link['labs']]
+
+def build_port_map(labs, links):
+    """
+    Elenca le porte in ascolto di ogni container e gli indirizzi verso cui trasmette.
+
+    Returns:
+        tuple: (binding {'host', 'port', 'node'}, destinazioni {'host', 'port', 'node'})
+    """
+    bindings = []
+    targets = []
+    for lab in labs:
+        for peer, link in lab_links(lab['id'], links):
+            ports = link['ports'][lab['id']]
+            peer_ports = link['ports'][peer]
+            villas = f"villas_{lab['id']}"
+            bindings += [
+                {'host': villas, 'port': ports['ingress'], 'node': f"nodo_villas_{lab['id']}_{peer}"},
+                {'host': villas, 'port': ports['dpsim'], 'node': f"nodo_dpsim_{lab['id']}_{peer}"}
+            ]
+            targets += [
+                {'host': f"villas_{peer}", 'port': peer_ports['ingress'], 'node': f"nodo_villas_{lab['id']}_{peer}"},
+                {'host': f"dpsim_{lab['id']}", 'port': ports['ingress'], 'node': f"nodo_dpsim_{lab['id']}_{peer}"},
+                {'host': villas, 'port': ports['dpsim'], 'node': f"{lab['script']} ({peer})"}
+            ]
+            bindings.append({'host': f"dpsim_{lab['id']}", 'port': ports['ingress'], 'node': f"{lab['script']} ({peer})"})
+    return bindings, targets
+
+def validate_port_map(bindings, targets, reserved):
+    """
+    Verifica la mappa delle porte: nessuna porta contesa sullo stesso container,
+    nessuna porta riservata o fuori intervallo, ogni destinazione in ascolto.
+
+    Raises:
+        ValueError: Con l'elenco di tutti i problemi trovati
+    """
+    errors = []
+    owners = {}
+    for binding in bindings:
+        key = (binding['host'], binding['port'])
+        if key in owners:
+            errors.append(f"{binding['host']}:{binding['port']} usata da {owners[key]} e {binding['node']}")
+        owners[key] = binding['node']
+        if binding['port'] in reserved:
+            errors.append(f"{binding['host']}:{binding['port']} ({binding['node']}) è riservata a {reserved[binding['port']]}")
+        if not 1024 <= binding['port'] <= 65535:
+            errors.append(f"{binding['host']}:{binding['port']} ({binding['node']}) fuori dall'intervallo 1024-65535")
+    for target in targets:
+        if (target['host'], target['port']) not in owners:
+            errors.append(f"{target['node']} trasmette a {target['host']}:{target['port']}, dove nessuno è in ascolto")
+    if errors:
+        raise ValueError("Mappa delle porte non valida:\n  " + "\n  ".join(errors))
+
+def render_value(value):
+    """
+    Valore in sintassi libconfig.
+    """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, str):
+        return f'"{value}"'
+    return str(value)
+
+def render_block(values, indent):
+    """
+    Blocco { chiave = valore, ... } in sintassi libconfig.
+    """
+    inner = ' ' * (indent + 4)
+    lines = [f"{inner}{key} = {render_value(value)}" for key, value in values.items()]
+    return "{\n" + ",\n".join(lines) + f"\n{' ' * indent}}}"
+
+def render_signals(signals, indent):
+    """
+    Lista dei segnali di un nodo in sintassi libconfig.
+    """
+    inner = ' ' * (indent + 4)
+    lines = [f"{inner}{{ " + ", ".join(f"{key} = {render_value(value)}" for key, value in signal.items()) + " }"
+             for signal in signals]
+    return "(\n" + ",\n".join(lines) + f"\n{' ' * indent})"
+
+def render_socket_node(name, fmt, in_address, out_address, in_signals, out_signals, netem, comment):
+    """
+    Nodo socket UDP di VILLASnode.
+    """
+    return f"""    {name} = {{
+        type = "socket",
+        layer = "udp",
+        builtin = true,
+        format = {render_block(fmt, 8)},
+        in = {{
+            address = "{in_address}", # FROM {comment[0]}
+            signals = {render_signals(in_signals, 12)}
+        }},
+        out = {{
+            address = "{out_address}",  # TO {comment[1]}
+            netem = {render_block(netem, 12)},
+            signals = {render_signals(out_signals, 12)}
+        }}
+    }}"""
+
+def render_file_node(name, uri, fmt, signals):
+    """
+    Nodo file di VILLASnode che registra i campioni in /logs.
+    """
+    return f"""    {name} = {{
+        type = "file",
+        uri = "{uri}",
+        format = {render_block(fmt, 8)},
+        out = {{
+            flush = true,
+            buffer_size = 1,
+            signals = {render_signals(signals, 12)}
+        }}
+    }}"""
+
+def render_node_conf(description, lab, links):
+    """
+    node.conf di un laboratorio: per ogni collegamento il nodo verso l'altra lab,
+    il nodo verso il proprio compute node e i log dei campioni ricevuti e inviati.
+
+    Ogni log prende il nome dei segnali che registra (il 'log' della lab che li
+    invia), come log_current_* e log_voltage_* nel workbench a due laboratori:
+    metrics.py e gli script di plot li trovano con gli stessi pattern.
+    """
+    fmt = description['format']
+    nodes = []
+    for peer, link in lab_links(lab['id'], links):
+        ports = link['ports'][lab['id']]
+        received = link['signals'][peer]
+        sent = link['signals'][lab['id']]
+        nodes.append(render_socket_node(
+            f"nodo_villas_{lab['id']}_{peer}", fmt,
+            f"*:{ports['ingress']}", f"villas_{peer}:{link['ports'][peer]['ingress']}",
+            received, sent, link['netem'], (f"VILLAS {peer}", f"VILLAS {peer}")
+        ))
+        nodes.append(render_socket_node(
+            f"nodo_dpsim_{lab['id']}_{peer}", fmt,
+            f"*:{ports['dpsim']}", f"dpsim_{lab['id']}:{ports['ingress']}",
+            sent, received, dict(link['netem'], enabled=False), (f"DPSIM {lab['id']}", f"DPSIM {lab['id']}")
+        ))
+        for log, signals in ((link['logs'][peer], received), (link['logs'][lab['id']], sent)):
+            nodes.append(render_file_node(
+                f"file_{log}", f"/logs/log_{log}_{lab['id']}_%Y-%m-%d_%H-%M-%S.log", fmt, signals))
+    return (
+        f"# Generato da topology_generator.py per {lab['name']} ({description['name']})\n"
+        "hugepages = 100\nstats = 1\n\nnodes = {\n" + ",\n".join(nodes) + "\n}\n"
+    )
+
+def render_path_conf(description, lab, links):
+    """
+    path.conf di un laboratorio: inoltro nei due versi per ogni collegamento.
+    """
+    paths = []
+    for peer, link in lab_links(lab['id'], links):
+        for source, destinations in (
+            (f"nodo_villas_{lab['id']}_{peer}", [f"nodo_dpsim_{lab['id']}_{peer}", f"file_{link['logs'][peer]}"]),
+            (f"nodo_dpsim_{lab['id']}_{peer}", [f"nodo_villas_{lab['id']}_{peer}", f"file_{link['logs'][lab['id']]}"])
+        ):
+            paths.append(f"""    {{
+        in = [ "{source}" ],
+        out = [ {', '.join(f'"{name}"' for name in destinations)} ],
+        reverse = false,
+        enabled = true,
+        original_sequence_no = true
+    }}""")
+    return (
+        f"# Generato da topology_generator.py per {lab['name']} ({description['name']})\n\n"
+        "@include \"node.conf\"\n\npaths = (\n" + ",\n".join(paths) + "\n)\n"
+    )
+
+def lab_env(lab, links):
+    """
+    Variabili di ambiente del compute node di un laboratorio: HOST_DEST,
+    PORT_DEST e PORT_SOURCE del suo unico collegamento e LAB_NAME, con cui il
+    supervisore distingue heartbeat e barriera di partenza delle lab.
+    """
+    (_, link), = lab_links(lab['id'], links)
+    ports = link['ports'][lab['id']]
+    env = {
+        'LAB_NAME': lab['id'],
+        'HOST_DEST': f"villas_{lab['id']}",
+        'HOST_SOURCE': '0.0.0.0',
+        'PORT_DEST': ports['dpsim'],
+        'PORT_SOURCE': ports['ingress']
+    }
+    env.update(lab['env'])
+    return env
+
+def render_lab_compose(lab):
+    """
+    docker-compose.yaml di un laboratorio, con le stesse impostazioni di lab_a.
+    """
+    return f"""# This file represents a Laboratory entity in the DESF framework
+# Generated by topology_generator.py
+x-desf-entity: &desf-laboratory
+  name: "{lab['name']}"
+  type: "Laboratory"
+  description: "Collection of 1 Compute Node, 1 Communication Node for distributed simulation"
+
+services:
+
+  dpsim_{lab['id']}:
+    image: {lab.get('image', DPSIM_IMAGE)}
+    labels:
+      desf.entity.type: "ComputeNode"
+      desf.entity.description: "Docker container running DPSim electric simulation"
+      desf.laboratory: "{lab['name']}"
+    volumes:
+      - ./app:/app
+      - /sys/fs/cgroup:/sys/fs/cgroup:ro
+    working_dir: /app
+    tty: true
+    command: /usr/bin/python3 {lab['script']}
+    environment:
+      - PYTHONUNBUFFERED=1
+    privileged: true
+    cap_add:
+      - SYS_NICE       # Necessary for real-time scheduling
+      - IPC_LOCK       # Optional for memory locking
+    security_opt:
+      - seccomp:unconfined
+    devices:
+      - "/dev/pts:/dev/pts"
+    cpuset: "{lab['cpuset']}"
+
+  villas_{lab['id']}:
+    labels:
+      desf.entity.type: "CommunicationNode"
+      desf.entity.description: "Docker container running Villas Node for network communication"
+      desf.laboratory: "{lab['name']}"
+    environment:
+      TASK: "VILLAS_{lab['id'].upper()}"
+      ITERATIONS: 100000
+    image: {VILLAS_IMAGE}
+    volumes:
+      - ./config:/configs
+      - ./logs:/logs
+    tty: true
+    entrypoint: ["sh"]
+    command: ["-c", "villas-node /configs/path.conf"]
+    cap_add:
+      - SYS_NICE
+    ulimits:
+      rtprio: 99
+      rttime: -1
+      memlock: 8428281856
+    deploy:
+      resources:
+        limits:
+          cpus: '1'
+          memory: 512M
+        reservations:
+          cpus: '0.5'
+          memory: 256M
+
+# Networks are defined in the main docker-compose.yaml
+# This file is meant to be used as a service definition only
+"""
+
+def render_workbench_compose(description):
+    """
+    docker-compose.yaml del workbench: servizi dei laboratori estesi dai compose
+    dei laboratori, supervisore e rete condivisa.
+    """
+    name = description['name']
+    lines = [
+        "# This file represents a Workbench entity in the DESF framework",
+        "# Generated by topology_generator.py",
+        "x-desf-entity: &desf-workbench",
+        f"  name: \"{name}\"",
+        "  type: \"Workbench\"",
+        "  description: \"Group of 2+ Laboratories that need to communicate for distributed simulation\"",
+        "  laboratories:"
+    ]
+    lines += [f"    - \"{lab['name']}\"" for lab in description['labs']]
+    lines += ["", "services:"]
+    for lab in description['labs']:
+        lines += [
+            "",
+            f"  # {lab['name']}",
+            f"  dpsim_{lab['id']}:",
+            "    labels:",
+            f"      desf.workbench: \"{name}\"",
+            "    extends:",
+            f"      file: ./{lab['id']}/docker-compose.yaml",
+            f"      service: dpsim_{lab['id']}",
+            "    env_file:",
+            "      - ./.env",
+            f"      - ./{lab['id']}/lab.env",
+            "    networks:",
+            "      - desf_shared_network",
+            "    depends_on:",
+            "      - supervisor",
+            "",
+            f"  villas_{lab['id']}:",
+            "    labels:",
+            f"      desf.workbench: \"{name}\"",
+            "    extends:",
+            f"      file: ./{lab['id']}/docker-compose.yaml",
+            f"      service: villas_{lab['id']}",
+            "    networks:",
+            "      - desf_shared_network",
+            "    depends_on:",
+            f"      - dpsim_{lab['id']}"
+        ]
+    lines += [
+        "",
+        "  # Supervisore per terminare tutti i container quando uno termina",
+        "  supervisor:",
+        "    build:",
+        "      context: ./supervisor",
+        "    volumes:",
+        "      - /var/run/docker.sock:/var/run/docker.sock",
+        "      - ./metrics:/app/metrics",
+        "    environment:",
+        f"      - PROJECT_NAME={name}",
+        f"      - WORKBENCH={name}",
+        "      - EXIT_ENTITY_TYPES=ComputeNode,CommunicationNode",
+        "      - COMPLETION_ENTITY_TYPES=ComputeNode",
+        "      - CHECK_INTERVAL=1.0",
+        "      - GRACE_PERIOD=5.0",
+        "      - STOP_TIMEOUT=2",
+        "      - KILL_TIMEOUT=5",
+        "      - HEARTBEAT_PORT=12100",
+        "      - HEARTBEAT_TIMEOUT_MILLIS=250",
+        "      - HEARTBEAT_ACTION=stop",
+        "      - METRICS_DIR=/app/metrics",
+        "      - START_DELAY_MILLIS=200",
+        "      - START_BARRIER_TIMEOUT=60",
+        "      - QOS_RULES=${QOS_RULES:-}",
+        "      - COMPLETION_MESSAGE=Simulation completed",
+        "    networks:",
+        "      - desf_shared_network",
+        "",
+        "# Define all networks",
+        "networks:",
+        "  desf_shared_network:",
+        ""
+    ]
+    return '\n'.join(lines)
+
+def log_port_map(description, links):
+    """
+    Riporta la mappa delle porte per collegamento.
+    """
+    logger.info(f"Workbench {description['name']}: {len(description['labs'])} laboratori, {len(links)} collegamenti")
+    for link in links:
+        x, y = link['labs']
+        logger.info(
+            f"{x} <-> {y} | villas_{x}:{link['ports'][x]['ingress']} <- -> villas_{y}:{link['ports'][y]['ingress']} | "
+            f"dpsim {x}: {link['ports'][x]['ingress']}/{link['ports'][x]['dpsim']} | "
+            f"dpsim {y}: {link['ports'][y]['ingress']}/{link['ports'][y]['dpsim']}"
+        )
+
+def write_workbench(description, links, output_dir):
+    """
+    Scrive la directory del workbench generato.
+
+    Ogni laboratorio riceve una copia della propria app, come lab_a e lab_b;
+    supervisore e .env sono copiati dal workbench a due laboratori.
+    """
+    os.makedirs(output_dir)
+    shutil.copytree(os.path.join(BASE_DIR, 'supervisor'), os.path.join(output_dir, 'supervisor'),
+                    ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+    shutil.copy2(os.path.join(BASE_DIR, '.env'), os.path.join(output_dir, '.env'))
+    with open(os.path.join(output_dir, 'docker-compose.yaml'), 'w') as f:
+        f.write(render_workbench_compose(description))
+
+    for lab in description['labs']:
+        lab_dir = os.path.join(output_dir, lab['id'])
+        shutil.copytree(lab['app'], os.path.join(lab_dir, 'app'),
+                        ignore=shutil.ignore_patterns('logs', '__pycache__', '*.pyc'))
+        os.makedirs(os.path.join(lab_dir, 'config'))
+        os.makedirs(os.path.join(lab_dir, 'logs'))
+        with open(os.path.join(lab_dir, 'docker-compose.yaml'), 'w') as f:
+            f.write(render_lab_compose(lab))
+        with open(os.path.join(lab_dir, 'config', 'node.conf'), 'w') as f:
+            f.write(render_node_conf(description, lab, links))
+        with open(os.path.join(lab_dir, 'config', 'path.conf'), 'w') as f:
+            f.write(render_path_conf(description, lab, links))
+        with open(os.path.join(lab_dir, 'lab.env'), 'w') as f:
+            f.write(f"# Variabili del compute node di {lab['name']}\n")
+            f.write(''.join(f"{key}={value}\n" for key, value in lab_env(lab, links).items()))
+
+    with open(os.path.join(output_dir, 'ports.json'), 'w') as f:
+        json.dump([{'labs': list(link['labs']), 'ports': link['ports']} for link in links], f, indent=2)
+
+def main():
+    """
+    Funzione principale.
+    """
+    args = parse_arguments()
+    try:
+        description = load_description(args.description)
+        links = expand_links(description)
+        validate_links(description['labs'], links)
+        allocate_ports(links, description['base_port'], description['reserved_ports'])
+        validate_port_map(*build_port_map(description['labs'], links), description['reserved_ports'])
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logger.error(f"Descrizione {args.description} non valida: {str(e)}")
+        sys.exit(1)
+    log_port_map(description, links)
+    if args.dry_run:
+        return
+
+    output_dir = os.path.abspath(args.output_dir or os.path.join(BASE_DIR, 'generated', description['name']))
+    if os.path.exists(output_dir):
+        if not args.force:
+            logger.error(f"{output_dir} esiste già, usare --force per sovrascriverla")
+            sys.exit(1)
+        shutil.rmtree(output_dir)
+    write_workbench(description, links, output_dir)
+    logger.info(f"Workbench generato in {output_dir}: cd {output_dir} && docker compose up --build")
+
+if __name__ == "__main__":
+    main()